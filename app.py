@@ -1,33 +1,92 @@
-from flask import Flask, request, jsonify
-import os
-import psycopg2
-from models import init_tables
+from flask import Blueprint, Flask, request, jsonify, g, Response, stream_with_context
 import hashlib
 import base64
+import json
 from functools import wraps
-import collector
-import threading
+from dateutil import parser as date_parser
 import time
 import re
-import notificator
-from datetime import datetime
-import pytz
-
-app = Flask(__name__)
-
-# Load DB connection string from environment
-DATABASE_URL = os.getenv("DATABASE_URL")
+import logging
+import collect_jobs
+import config
+import metrics
+import price_cache
+import rollups
+import rules
+import ticker_registry
+import db
+from db import get_db_connection
+
+api = Blueprint("api", __name__)
+
+# Page size limits for /news/search
+NEWS_SEARCH_DEFAULT_LIMIT = 20
+NEWS_SEARCH_MAX_LIMIT = 100
+
+# Max items per POST /campaigns/bulk request
+BULK_CAMPAIGNS_MAX_ITEMS = 1000
 
 # Regex to validate emails
 EMAIL_REGEX = r"^[^@]+@[^@]+\.[^@]+$"
 
+# Yahoo-style symbols (AAPL, BRK.B, ^GSPC, EURUSD=X), limited by campaigns.company_id VARCHAR(10)
+TICKER_REGEX = r"^[A-Z0-9.\-^=]{1,10}$"
+
 
 def is_valid_email(email):
     return re.match(EMAIL_REGEX, email) is not None
 
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
+def parse_alert_fields(data):
+    """
+    Reads and validates the alert part of a campaign request.
+    Returns (fields, None) or (None, error message).
+    """
+    alert_condition = str(data.get("alert_condition", "all")).lower()
+    alert_type = str(data.get("alert_type", "trend_change")).lower()
+    threshold = data.get("threshold")
+    delivery = data.get("delivery")
+
+    error = rules.validate_alert(alert_type, alert_condition, threshold)
+    if error:
+        return None, error
+    if delivery is not None and delivery not in rules.DELIVERY_MODES:
+        return None, f"Invalid delivery. Must be one of: {', '.join(rules.DELIVERY_MODES)}"
+
+    return {
+        "alert_type": alert_type,
+        "alert_condition": alert_condition,
+        "threshold": float(threshold) if alert_type != "trend_change" else None,
+        "news_only": bool(data.get("news_only", False)),
+        "delivery": delivery,
+    }, None
+
+
+@api.before_app_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    price_cache.ensure_listener(price_cache.price_store, get_db_connection)
+    g.query_profile_token = db.start_profile(f"{request.method} {request.path}")
+
+
+@api.teardown_app_request
+def finish_query_profile(exc=None):
+    token = g.pop("query_profile_token", None)
+    if token is not None:
+        # Per-request summaries are debug-level; N+1 suspects still surface as warnings
+        db.finish_profile(token, logging.DEBUG)
+
+
+@api.after_app_request
+def record_request_latency(response):
+    start = g.pop("request_start", None)
+    if start is not None:
+        # Label by route template (e.g. /trends/<ticker>) to keep cardinality bounded
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.API_REQUEST_SECONDS.labels(
+            request.method, route, response.status_code
+        ).observe(time.perf_counter() - start)
+    return response
 
 
 # Authentication decorator for protected routes
@@ -61,7 +120,20 @@ def token_required(f):
     return decorated_function
 
 
-@app.route("/")
+# Admin-only routes (config.ADMIN_USERS); use together with token_required
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = request.headers.get("Authorization")
+        username = base64.b64decode(token.split(" ")[1]).decode("utf-8").split(":")[0]
+        if username not in config.ADMIN_USERS:
+            return jsonify({"message": "Admin access required"}), 403
+        return f(*args, **kwargs)
+
+    return decorated_function
+
+
+@api.route("/")
 def hello():
     try:
         get_db_connection()
@@ -70,12 +142,18 @@ def hello():
         return f"Database connection failed: {str(e)}"
 
 
-@app.route("/test")
+@api.route("/metrics")
+def get_metrics():
+    body, content_type = metrics.render()
+    return Response(body, headers={"Content-Type": content_type})
+
+
+@api.route("/test")
 def test():
     return "This is a test route!"
 
 
-@app.route("/tables")
+@api.route("/tables")
 @token_required
 def get_tables():
     try:
@@ -92,57 +170,7 @@ def get_tables():
         return f"Failed to get tables: {str(e)}"
 
 
-def create_tables():
-    try:
-        conn = get_db_connection()
-        print(init_tables(conn))
-    except Exception as e:
-        print(f"Table initialization failed: {str(e)}")
-
-
-# Run collector and notificator every 10 minutes in background
-def is_market_open():
-    # Задаємо часову зону ринку — Нью-Йорк
-    eastern = pytz.timezone('US/Eastern')
-    now = datetime.now(eastern)
-    
-    # Перевірка чи це будній день (0=Пн, 6=Нд)
-    if now.weekday() >= 5:
-        return False
-    
-    # Перевірка чи в межах робочих годин (9:30 – 16:00)
-    market_open = now.replace(hour=9, minute=30, second=0, microsecond=0)
-    market_close = now.replace(hour=16, minute=0, second=0, microsecond=0)
-
-    return market_open <= now <= market_close
-
-def start_background_loop():
-    print("[BG] Starting background loop")
-    if getattr(start_background_loop, "_started", False):
-        return  # prevent multiple threads
-    start_background_loop._started = True
-
-    def run_collect_and_notify():
-        while True:
-            if is_market_open():
-                try:
-                    print("[BG] ▶️ Market is OPEN. Running collector...")
-                    collector.main()
-                    print("[BG] ✅ Collector done")
-                    print("[BG] ▶️ Sending notifications...")
-                    notificator.check_and_notify()
-                    print("[BG] ✅ Notifications sent")
-                except Exception as e:
-                    print(f"[BG] ❌ Error: {e}")
-            else:
-                print("[BG] ⏸️ Market is CLOSED. Skipping this run.")
-            time.sleep(1800)  # чекати 30 хвилин
-
-    thread = threading.Thread(target=run_collect_and_notify, daemon=True)
-    thread.start()
-
-
-@app.route("/user/email", methods=["POST"])
+@api.route("/user/email", methods=["POST"])
 @token_required
 def update_email():
     try:
@@ -177,7 +205,48 @@ def update_email():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/register", methods=["POST"])
+@api.route("/user/notifications", methods=["PATCH"])
+@token_required
+def update_notification_settings():
+    """
+    Sets how the user's alerts are delivered: "immediate" (one email per price event)
+    or "digest" (matches coalesced into one email per digest_window_minutes, 0 = per run).
+    """
+    try:
+        data = request.json
+        delivery = data.get("delivery")
+        window = data.get("digest_window_minutes")
+
+        if delivery is not None and delivery not in rules.DELIVERY_MODES:
+            return jsonify({"message": f"Invalid delivery. Must be one of: {', '.join(rules.DELIVERY_MODES)}"}), 400
+        if window is not None and (not isinstance(window, int) or window < 0):
+            return jsonify({"message": "digest_window_minutes must be a non-negative integer"}), 400
+
+        token = request.headers.get("Authorization")
+        decoded_token = base64.b64decode(token.split(" ")[1]).decode("utf-8")
+        username, _ = decoded_token.split(":")
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            UPDATE users
+            SET delivery = COALESCE(%s, delivery),
+                digest_window_minutes = COALESCE(%s, digest_window_minutes)
+            WHERE username = %s
+            RETURNING delivery, digest_window_minutes
+        """, (delivery, window, username))
+        delivery, window = cursor.fetchone()
+
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        return jsonify({"delivery": delivery, "digest_window_minutes": window})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/register", methods=["POST"])
 def register():
     try:
         data = request.json
@@ -214,7 +283,7 @@ def register():
         return jsonify({"message": f"Registration failed: {str(e)}"}), 500
 
 
-@app.route("/login", methods=["POST"])
+@api.route("/login", methods=["POST"])
 def login():
     try:
         data = request.json
@@ -242,19 +311,108 @@ def login():
     except Exception as e:
         return jsonify({"message": f"Login failed: {str(e)}"}), 500
 
-@app.route("/collect", methods=["POST"])
+@api.route("/collect", methods=["POST"])
 @token_required
 def run_collector():
+    """
+    Queues a collection of all active tickers for the pipeline, or joins the job
+    already queued or running. Poll GET /collect/<job_id> for its progress.
+    """
     try:
-        collector.main()
-        return jsonify({"message": "Data collection complete"}), 200
+        token = request.headers.get("Authorization")
+        username = base64.b64decode(token.split(" ")[1]).decode("utf-8").split(":")[0]
+
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        job_id, status, created = collect_jobs.enqueue(cursor, username)
+        conn.commit()
+        cursor.close()
+        conn.close()
+
+        return jsonify({
+            "message": "Data collection queued" if created else "Joined the pending data collection",
+            "job_id": job_id,
+            "status": status,
+            "coalesced": not created
+        }), 202, {"Location": f"/collect/{job_id}"}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/collect/<int:job_id>", methods=["GET"])
+@token_required
+def get_collect_job(job_id):
+    """
+    Status and progress of a collection job.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        job = collect_jobs.get(cursor, job_id)
+        cursor.close()
+        conn.close()
+
+        if job is None:
+            return jsonify({"message": f"Collection job {job_id} not found"}), 404
+        return jsonify(job), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/trends/<ticker>", methods=["GET"])
+@api.route("/tickers/<symbol>", methods=["GET"])
+@token_required
+def get_ticker(symbol):
+    """
+    Registry entry of a symbol: validation status and cached quote metadata.
+    """
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT symbol, status, name, exchange, currency, quote_type,
+                   validated_at, failure_count, last_error, retry_after
+            FROM tickers
+            WHERE symbol = %s
+        """, (symbol.upper(),))
+        row = cursor.fetchone()
+        cursor.close()
+        conn.close()
+
+        if not row:
+            return jsonify({"message": f"{symbol.upper()} is not registered"}), 404
+
+        return jsonify({
+            "symbol": row[0],
+            "status": row[1],
+            "name": row[2],
+            "exchange": row[3],
+            "currency": row[4],
+            "quote_type": row[5],
+            "validated_at": row[6].isoformat() if row[6] else None,
+            "failure_count": row[7],
+            "last_error": row[8],
+            "retry_after": row[9].isoformat() if row[9] else None
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/trends/<ticker>", methods=["GET"])
 @token_required
 def get_latest_trend(ticker):
+    cached = price_cache.price_store.latest(ticker.upper())
+    if cached is not None:
+        return jsonify({
+            "company_id": ticker.upper(),
+            "price": cached.price,
+            "time": cached.time.isoformat(),
+            "trend": cached.trend,
+            "change_percent": cached.change_percent,
+            "is_trend_change": cached.is_trend_change,
+            "news_related": cached.news_related
+        })
+
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -285,19 +443,163 @@ def get_latest_trend(ticker):
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/campaigns", methods=["POST"])
+@api.route("/trends/<ticker>/ohlcv", methods=["GET"])
+@token_required
+def get_ohlcv(ticker):
+    """
+    Hourly or daily OHLCV summaries from the rollup tables.
+    Query params: interval (hour | day, default day), from, to (ISO dates).
+    """
+    table = {"hour": "prices_hourly", "day": "prices_daily"}.get(request.args.get("interval", "day"))
+    if not table:
+        return jsonify({"message": "Invalid interval. Must be one of: hour, day"}), 400
+    try:
+        time_from = date_parser.isoparse(request.args["from"]) if request.args.get("from") else None
+        time_to = date_parser.isoparse(request.args["to"]) if request.args.get("to") else None
+    except Exception:
+        return jsonify({"message": "Invalid from or to"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT bucket, open, high, low, close, volume, samples, trend_changes, news_related_count
+            FROM {table}
+            WHERE company_id = %s
+              AND (%s::timestamptz IS NULL OR bucket >= %s)
+              AND (%s::timestamptz IS NULL OR bucket < %s)
+            ORDER BY bucket
+        """, (ticker.upper(), time_from, time_from, time_to, time_to))
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        return jsonify({
+            "company_id": ticker.upper(),
+            "interval": request.args.get("interval", "day"),
+            "buckets": [{
+                "time": row[0].isoformat(),
+                "open": row[1],
+                "high": row[2],
+                "low": row[3],
+                "close": row[4],
+                "volume": row[5],
+                "samples": row[6],
+                "trend_changes": row[7],
+                "news_related": row[8]
+            } for row in rows]
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+
+
+@api.route("/news/search", methods=["GET"])
+@token_required
+def search_news():
+    """
+    Full-text search over news titles and summaries, ranked by relevance.
+    Query params: q (required), ticker, from, to (ISO dates), limit, cursor.
+    Pages are keyset-paginated on (rank, id); pass next_cursor to get the next page.
+    """
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"message": "Missing search query 'q'"}), 400
+
+    try:
+        ticker = request.args.get("ticker")
+        ticker = ticker.upper() if ticker else None
+        time_from = date_parser.isoparse(request.args["from"]) if request.args.get("from") else None
+        time_to = date_parser.isoparse(request.args["to"]) if request.args.get("to") else None
+        limit = min(int(request.args.get("limit", NEWS_SEARCH_DEFAULT_LIMIT)), NEWS_SEARCH_MAX_LIMIT)
+        after_rank, after_id = decode_cursor(request.args["cursor"]) if request.args.get("cursor") else (None, None)
+    except Exception:
+        return jsonify({"message": "Invalid ticker, from, to, limit or cursor"}), 400
+    if limit < 1:
+        return jsonify({"message": "limit must be positive"}), 400
+
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("""
+            WITH q AS (SELECT websearch_to_tsquery('english', %s) AS query),
+            hits AS (
+                SELECT n.id, n.news_text, n.summary, n.url, n.provider, n.time,
+                       ts_rank_cd(n.search_tsv, q.query)::float8 AS rank
+                FROM news_data n, q
+                WHERE n.search_tsv @@ q.query
+                  AND (%s::text IS NULL OR EXISTS (
+                      SELECT 1 FROM news_tickers nt
+                      WHERE nt.news_id = n.id AND nt.company_id = %s
+                  ))
+                  AND (%s::timestamptz IS NULL OR n.time >= %s)
+                  AND (%s::timestamptz IS NULL OR n.time < %s)
+            ),
+            page AS (
+                SELECT * FROM hits
+                WHERE %s::float8 IS NULL OR (rank, id) < (%s::float8, %s::text)
+                ORDER BY rank DESC, id DESC
+                LIMIT %s
+            )
+            SELECT page.id, page.news_text, page.summary, page.url, page.provider, page.time, page.rank,
+                   ARRAY(SELECT nt.company_id FROM news_tickers nt WHERE nt.news_id = page.id ORDER BY 1)
+            FROM page
+            ORDER BY page.rank DESC, page.id DESC
+        """, (
+            q,
+            ticker, ticker,
+            time_from, time_from,
+            time_to, time_to,
+            after_rank, after_rank, after_id,
+            limit
+        ))
+        rows = cursor.fetchall()
+        cursor.close()
+        conn.close()
+
+        results = [{
+            "id": row[0],
+            "title": row[1],
+            "summary": row[2],
+            "url": row[3],
+            "provider": row[4],
+            "time": row[5].isoformat() if row[5] else None,
+            "rank": row[6],
+            "tickers": row[7]
+        } for row in rows]
+        next_cursor = encode_cursor([rows[-1][6], rows[-1][0]]) if len(rows) == limit else None
+
+        return jsonify({"results": results, "next_cursor": next_cursor}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/campaigns", methods=["POST"])
 @token_required
 def create_campaign():
     try:
         data = request.json
-        company_id = data.get("company_id")
-        alert_condition = data.get("alert_condition", "all").lower()
+        company_id = str(data.get("company_id") or "").strip().upper()
 
         if not company_id:
             return jsonify({"message": "Missing company_id"}), 400
+        if not re.match(TICKER_REGEX, company_id):
+            return jsonify({"message": "Invalid company_id"}), 400
 
-        if alert_condition not in ["all", "up", "down"]:
-            return jsonify({"message": "Invalid alert_condition"}), 400
+        fields, error = parse_alert_fields(data)
+        if error:
+            return jsonify({"message": error}), 400
+        alert_type = fields["alert_type"]
+        alert_condition = fields["alert_condition"]
 
         # Get user from token
         token = request.headers.get("Authorization")
@@ -307,6 +609,13 @@ def create_campaign():
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        # Reject symbols the quote source is known not to have; new ones are validated
+        # by the collector before their first collection
+        rejected = ticker_registry.admit(cursor, [company_id.upper()])
+        if rejected:
+            conn.commit()
+            return jsonify({"message": rejected[company_id.upper()]}), 400
+
         # Avoid creating duplicate campaign
         cursor.execute("""
             SELECT id FROM campaigns 
@@ -328,23 +637,143 @@ def create_campaign():
 
         # Create alert
         cursor.execute("""
-            INSERT INTO alerts (campaign_id, user_id, alert_type, alert_condition)
-            VALUES (%s, %s, 'trend_change', %s)
-        """, (campaign_id, user_id, alert_condition))
+            INSERT INTO alerts (campaign_id, user_id, alert_type, alert_condition, threshold, news_only, delivery)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, (
+            campaign_id, user_id, alert_type, alert_condition,
+            fields["threshold"], fields["news_only"], fields["delivery"]
+        ))
 
         conn.commit()
         cursor.close()
         conn.close()
 
         return jsonify({
-            "message": f"Started tracking {company_id.upper()} with alert condition: {alert_condition}"
+            "message": f"Started tracking {company_id.upper()} with alert: {alert_type} ({alert_condition})"
         }), 201
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/campaigns/<int:campaign_id>/archive", methods=["POST"])
+@api.route("/campaigns/bulk", methods=["POST"])
+@token_required
+def create_campaigns_bulk():
+    """
+    Creates campaigns + alerts for a list of tickers in one transaction:
+
+        {"items": [{"company_id": "AAPL", "alert_condition": "up"}, ...]}
+
+    Each item takes the same fields as POST /campaigns. Duplicate detection and
+    both inserts are single set-based statements. Returns a result per item
+    (created / exists / invalid / duplicate), in request order.
+    """
+    try:
+        data = request.json or {}
+        items = data.get("items")
+        if not isinstance(items, list) or not items:
+            return jsonify({"message": "items must be a non-empty list"}), 400
+        if len(items) > BULK_CAMPAIGNS_MAX_ITEMS:
+            return jsonify({"message": f"At most {BULK_CAMPAIGNS_MAX_ITEMS} items per request"}), 400
+
+        token = request.headers.get("Authorization")
+        decoded_token = base64.b64decode(token.split(" ")[1]).decode("utf-8")
+        username, _ = decoded_token.split(":")
+
+        conn = None
+        results = []
+        valid = []  # (index, ticker, fields)
+        seen = set()
+        for index, item in enumerate(items):
+            company_id = str(item.get("company_id") or "").strip().upper() if isinstance(item, dict) else ""
+            result = {"company_id": company_id or None}
+            results.append(result)
+            if not re.match(TICKER_REGEX, company_id):
+                result.update(status="invalid", message="Missing or invalid company_id")
+                continue
+            if company_id in seen:
+                result.update(status="duplicate", message="Ticker repeated in this request")
+                continue
+            fields, error = parse_alert_fields(item)
+            if error:
+                result.update(status="invalid", message=error)
+                continue
+            seen.add(company_id)
+            valid.append((index, company_id, fields))
+
+        if valid:
+            conn = get_db_connection()
+            cursor = conn.cursor()
+
+            rejected = ticker_registry.admit(cursor, [ticker for _, ticker, _ in valid])
+            for index, ticker, _ in valid:
+                if ticker in rejected:
+                    results[index].update(status="invalid", message=rejected[ticker])
+            valid = [item for item in valid if item[1] not in rejected]
+
+        if valid:
+            cursor.execute("""
+                WITH input AS (
+                    SELECT * FROM unnest(
+                        %s::int[], %s::text[], %s::text[], %s::text[], %s::float8[], %s::boolean[], %s::text[]
+                    ) AS i(idx, company_id, alert_type, alert_condition, threshold, news_only, delivery)
+                ),
+                existing AS (
+                    SELECT i.idx, min(c.id) AS campaign_id
+                    FROM input i
+                    JOIN campaigns c ON c.company_id = i.company_id AND c.created_by = %s AND c.is_active = TRUE
+                    GROUP BY i.idx
+                ),
+                new_campaigns AS (
+                    INSERT INTO campaigns (company_id, created_by, date_created)
+                    SELECT i.company_id, %s, NOW()
+                    FROM input i
+                    WHERE NOT EXISTS (SELECT 1 FROM existing e WHERE e.idx = i.idx)
+                    ORDER BY i.idx
+                    RETURNING id, company_id
+                ),
+                new_alerts AS (
+                    INSERT INTO alerts (campaign_id, user_id, alert_type, alert_condition, threshold, news_only, delivery)
+                    SELECT nc.id, u.id, i.alert_type, i.alert_condition, i.threshold, i.news_only, i.delivery
+                    FROM new_campaigns nc
+                    JOIN input i ON i.company_id = nc.company_id
+                    CROSS JOIN (SELECT id FROM users WHERE username = %s) u
+                    RETURNING id, campaign_id
+                )
+                SELECT i.idx, COALESCE(nc.id, e.campaign_id), na.id, e.idx IS NOT NULL
+                FROM input i
+                LEFT JOIN existing e ON e.idx = i.idx
+                LEFT JOIN new_campaigns nc ON nc.company_id = i.company_id
+                LEFT JOIN new_alerts na ON na.campaign_id = nc.id
+            """, (
+                [index for index, _, _ in valid],
+                [ticker for _, ticker, _ in valid],
+                [fields["alert_type"] for _, _, fields in valid],
+                [fields["alert_condition"] for _, _, fields in valid],
+                [fields["threshold"] for _, _, fields in valid],
+                [fields["news_only"] for _, _, fields in valid],
+                [fields["delivery"] for _, _, fields in valid],
+                username, username, username,
+            ))
+            for index, campaign_id, alert_id, exists in cursor.fetchall():
+                if exists:
+                    results[index].update(status="exists", campaign_id=campaign_id, message="Campaign already exists")
+                else:
+                    results[index].update(status="created", campaign_id=campaign_id, alert_id=alert_id)
+
+        if conn is not None:
+            conn.commit()
+            cursor.close()
+            conn.close()
+
+        created = sum(1 for result in results if result["status"] == "created")
+        return jsonify({"created": created, "results": results}), 201 if created else 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@api.route("/campaigns/<int:campaign_id>/archive", methods=["POST"])
 @token_required
 def archive_campaign(campaign_id):
     try:
@@ -377,20 +806,16 @@ def archive_campaign(campaign_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route("/alerts/<int:alert_id>", methods=["PATCH"])
+@api.route("/alerts/<int:alert_id>", methods=["PATCH"])
 @token_required
 def update_alert_condition(alert_id):
     """
-    Allows user to update the condition of their alert (e.g. all, up, down).
+    Allows user to update their alert: alert_condition (all, up, down),
+    alert_type, threshold, news_only and delivery (immediate, digest, or null for
+    the user's setting). Omitted fields keep their values.
     """
     try:
         data = request.json
-        new_condition = data.get("alert_condition", "").lower()
-
-        if new_condition not in ["all", "up", "down"]:
-            return jsonify({
-                "message": "Invalid alert_condition. Must be one of: all, up, down"
-            }), 400
 
         # Verify ownership of the alert
         token = request.headers.get("Authorization")
@@ -400,7 +825,7 @@ def update_alert_condition(alert_id):
         conn = get_db_connection()
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT a.id
+            SELECT a.alert_type, a.alert_condition, a.threshold, a.news_only, a.delivery
             FROM alerts a
             JOIN users u ON a.user_id = u.id
             WHERE a.id = %s AND u.username = %s
@@ -410,24 +835,39 @@ def update_alert_condition(alert_id):
         if not alert:
             return jsonify({"message": "Alert not found or access denied"}), 403
 
+        alert_type = data.get("alert_type", alert[0] or "trend_change").lower()
+        new_condition = data.get("alert_condition", alert[1] or "all").lower()
+        threshold = data.get("threshold", alert[2])
+        news_only = bool(data.get("news_only", alert[3]))
+        delivery = data.get("delivery", alert[4])
+
+        error = rules.validate_alert(alert_type, new_condition, threshold)
+        if error:
+            return jsonify({"message": error}), 400
+        if delivery is not None and delivery not in rules.DELIVERY_MODES:
+            return jsonify({"message": f"Invalid delivery. Must be one of: {', '.join(rules.DELIVERY_MODES)}"}), 400
+        threshold = float(threshold) if alert_type != "trend_change" else None
+
         # Update condition
         cursor.execute("""
-            UPDATE alerts SET alert_condition = %s WHERE id = %s
-        """, (new_condition, alert_id))
+            UPDATE alerts
+            SET alert_type = %s, alert_condition = %s, threshold = %s, news_only = %s, delivery = %s
+            WHERE id = %s
+        """, (alert_type, new_condition, threshold, news_only, delivery, alert_id))
 
         conn.commit()
         cursor.close()
         conn.close()
 
         return jsonify({
-            "message": f"Alert condition updated to '{new_condition}'"
+            "message": f"Alert updated to {alert_type} ({new_condition})"
         }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/alerts", methods=["GET"])
+@api.route("/alerts", methods=["GET"])
 @token_required
 def get_user_alerts():
     """
@@ -443,7 +883,7 @@ def get_user_alerts():
         cursor.execute("""
             SELECT a.id, a.alert_type, a.alert_condition, a.is_active,
                    c.company_id, c.is_active AS campaign_active,
-                   a.created_at
+                   a.created_at, a.threshold, a.news_only, a.delivery
             FROM alerts a
             JOIN users u ON a.user_id = u.id
             JOIN campaigns c ON a.campaign_id = c.id
@@ -463,7 +903,10 @@ def get_user_alerts():
                 "is_active": row[3],
                 "company_id": row[4],
                 "campaign_active": row[5],
-                "created_at": row[6].isoformat()
+                "created_at": row[6].isoformat(),
+                "threshold": row[7],
+                "news_only": row[8],
+                "delivery": row[9]
             })
 
         return jsonify({"alerts": result}), 200
@@ -472,7 +915,39 @@ def get_user_alerts():
         return jsonify({"error": str(e)}), 500
 
 
-@app.route("/mock_test", methods=["POST"])
+@api.route("/admin/export/<table>", methods=["GET"])
+@token_required
+@admin_required
+def export_table(table):
+    """
+    Streams a slice of prices / news_data as a Parquet file.
+    Query params: from, to (ISO dates), ticker.
+    """
+    import export
+
+    if table not in export.EXPORTS:
+        return jsonify({"message": f"Invalid table. Must be one of: {', '.join(sorted(export.EXPORTS))}"}), 400
+    try:
+        time_from = date_parser.isoparse(request.args["from"]) if request.args.get("from") else None
+        time_to = date_parser.isoparse(request.args["to"]) if request.args.get("to") else None
+    except Exception:
+        return jsonify({"message": "Invalid from or to"}), 400
+    ticker = request.args.get("ticker", "").upper() or None
+
+    filename = "_".join(part for part in (
+        table, ticker, time_from.date().isoformat() if time_from else None,
+        time_to.date().isoformat() if time_to else None,
+    ) if part) + ".parquet"
+    # The connection is closed by the generator once the file is sent
+    chunks = export.stream_table(get_db_connection(), table, time_from, time_to, ticker)
+    return Response(
+        stream_with_context(chunks),
+        mimetype="application/vnd.apache.parquet",
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
+
+
+@api.route("/mock_test", methods=["POST"])
 def mock_test_data():
     """
     Inserts mock data into the system (user, campaign, alert, prices, news).
@@ -536,6 +1011,10 @@ def mock_test_data():
             RETURNING id, time
         """, (company_id, 100.0, trend, change_percent, bool(news_list)))
         price_id, price_time = cursor.fetchone()
+        rollups.record_price(cursor, company_id, price_time, 100.0, None, True, bool(news_list))
+        cursor.execute("""
+            SELECT pg_notify(%s, row_to_json(p)::text) FROM prices p WHERE id = %s
+        """, (price_cache.CHANNEL, price_id))
 
         # 5. Add news (if any)
         for i, news in enumerate(news_list):
@@ -551,6 +1030,16 @@ def mock_test_data():
                 news.get("url", ""),
                 "MockNews"
             ))
+            cursor.execute("""
+                INSERT INTO news_tickers (news_id, company_id, time)
+                VALUES (%s, %s, %s)
+                ON CONFLICT DO NOTHING
+            """, (f"{company_id}_MOCK_{i}_{price_id}", company_id, price_time))
+            cursor.execute("""
+                INSERT INTO price_news (price_id, news_id)
+                VALUES (%s, %s)
+                ON CONFLICT DO NOTHING
+            """, (price_id, f"{company_id}_MOCK_{i}_{price_id}"))
 
         conn.commit()
         cursor.close()
@@ -568,12 +1057,18 @@ def mock_test_data():
         return jsonify({"error": str(e)}), 500
 
 
-# Start the server
+def create_app():
+    """
+    WSGI app factory. Each server worker builds its own app; the collector and
+    notificator run in the separate pipeline process (see pipeline.py).
+    """
+    app = Flask(__name__)
+    app.register_blueprint(api)
+    return app
+
+
+# Start the development server (production: gunicorn -c gunicorn.conf.py wsgi:app).
+# Tables are created by `python manage.py init-db`.
 if __name__ == "__main__":
     print("Starting")
-    with app.app_context():
-        create_tables()
-        print("Tables created")
-        start_background_loop()
-        
-    app.run(debug=False, host="0.0.0.0", port=5001)
+    create_app().run(debug=False, host=config.API_HOST, port=config.API_PORT)
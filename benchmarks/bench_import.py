@@ -0,0 +1,89 @@
+"""
+Import-time benchmark for the API and pipeline entry points.
+
+Each module is imported in a fresh interpreter (`python -X importtime`), so the
+numbers are cold-start costs a new worker pays. Reports the median total import
+time, the slowest imported packages, and fails if the API pulls in any of the
+pipeline-only dependencies.
+
+    python benchmarks/bench_import.py [--runs 5] [--top 10] [module ...]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Must not be imported by API workers
+PIPELINE_ONLY = ("yfinance", "pandas", "numpy", "requests", "smtplib", "collector", "notificator")
+
+CHECK_SNIPPET = "import sys, {module}; print(','.join(m for m in {heavy!r} if m in sys.modules))"
+
+
+def import_times(module, max_depth=2):
+    """
+    (total µs, {package: cumulative µs}) of one cold import of `module`; packages are
+    the imports up to `max_depth` levels below it.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    # Children are printed before their parent, so collect until `module` itself shows up
+    pending = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module:
+                return int(cumulative), pending
+            pending = {}
+        elif depth <= max_depth:
+            pending[name] = int(cumulative)
+    raise RuntimeError(f"{module} not found in -X importtime output")
+
+
+def loaded_heavy_modules(module):
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK_SNIPPET.format(module=module, heavy=PIPELINE_ONLY)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    return [name for name in result.stdout.strip().split(",") if name]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Cold import time of the entry points")
+    arg_parser.add_argument("modules", nargs="*", default=["wsgi", "pipeline"])
+    arg_parser.add_argument("--runs", type=int, default=5)
+    arg_parser.add_argument("--top", type=int, default=10)
+    args = arg_parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        runs = [import_times(module) for _ in range(args.runs)]
+        totals = [total for total, _ in runs]
+        print(f"{module}: median {statistics.median(totals) / 1000:.1f} ms, "
+              f"min {min(totals) / 1000:.1f} ms over {args.runs} runs")
+
+        packages = runs[-1][1]
+        for name, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+            print(f"    {micros / 1000:8.1f} ms  {name}")
+
+        heavy = loaded_heavy_modules(module)
+        if module == "wsgi" and heavy:
+            print(f"    ❌ API imports pipeline-only modules: {', '.join(heavy)}")
+            failed = True
+        elif heavy:
+            print(f"    loads: {', '.join(heavy)}")
+        print()
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
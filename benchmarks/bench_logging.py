@@ -0,0 +1,80 @@
+"""
+Cost of a per-item log call in a hot loop, as seen by the calling thread.
+
+Compares the former setup (basicConfig with a synchronous FileHandler and
+f-string messages) with logs.configure (queue + listener thread, lazy
+%-formatting, per-item records through logs.sampled). Each setup runs in a fresh
+interpreter and writes to a temporary directory.
+
+    python benchmarks/bench_logging.py [--records 100000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SETUPS = {
+    "sync f-string": """
+import logging
+logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s',
+                    handlers=[logging.FileHandler("bench.log", encoding="utf-8")])
+def log(i, price):
+    logger.info(f"Price for T{i % 500:04d}: {price}")
+""",
+    "queue lazy": """
+import logging, logs
+logs.configure("bench.log")
+def log(i, price):
+    logger.info("Price for T%04d: %s", i % 500, price)
+""",
+    "queue sampled": """
+import logging, logs
+logs.configure("bench.log")
+def log(i, price):
+    logs.sampled(logger, logging.INFO, "Price for T%04d: %s", i % 500, price)
+""",
+}
+
+LOOP = """
+import time
+logger = logging.getLogger("collector")
+# Console output is not part of the comparison
+for handler in logging.getLogger().handlers:
+    if type(handler) is logging.StreamHandler:
+        logging.getLogger().removeHandler(handler)
+price = {{"company_id": "AAPL", "price": 189.3, "volume": 51234567, "previous_close": 188.1, "open_price": 188.4}}
+start = time.perf_counter()
+for i in range({records}):
+    log(i, price)
+elapsed = time.perf_counter() - start
+print(elapsed)
+"""
+
+
+def run(setup, records, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT, LOG_SAMPLE_EVERY="50")
+    result = subprocess.run(
+        [sys.executable, "-c", SETUPS[setup] + LOOP.format(records=records)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Hot-loop logging cost")
+    arg_parser.add_argument("--records", type=int, default=100_000)
+    args = arg_parser.parse_args()
+
+    baseline = None
+    for setup in SETUPS:
+        with tempfile.TemporaryDirectory() as workdir:
+            elapsed = run(setup, args.records, workdir)
+        baseline = baseline or elapsed
+        print(f"{setup:<14} {elapsed / args.records * 1e6:7.2f} µs/call   {baseline / elapsed:5.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Collection latency tail with and without hedged provider requests.
+
+Two simulated providers answer in ~--fast-ms, except for a --slow-share of
+requests that take --slow-ms (a stalled connection, a throttled response).
+Without hedging every stall is paid in full; with hedging the next provider
+is asked once the first one exceeds its rolling p95.
+
+    python benchmarks/bench_providers.py [--requests 500] [--slow-share 0.03]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import providers  # noqa: E402
+
+
+class SimulatedProvider(providers.Provider):
+    def __init__(self, name, fast, slow, slow_share):
+        super().__init__()
+        self.name = name
+        self.fast = fast
+        self.slow = slow
+        self.slow_share = slow_share
+
+    def quote(self, ticker):
+        if random.random() < self.slow_share:
+            time.sleep(self.slow)
+        else:
+            time.sleep(self.fast * random.uniform(0.5, 1.5))
+        return {"price": 100.0}
+
+
+def run(hedging, args):
+    chain = providers.ProviderChain(
+        [SimulatedProvider(name, args.fast_ms / 1000, args.slow_ms / 1000, args.slow_share)
+         for name in ("primary", "secondary")],
+        hedging=hedging,
+    )
+    latencies = []
+    for i in range(args.requests):
+        start = time.perf_counter()
+        chain.quote(f"T{i:04d}")
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return [latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000 for p in (0.5, 0.95, 0.99)] + [max(latencies) * 1000]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Hedged provider requests")
+    arg_parser.add_argument("--requests", type=int, default=500)
+    arg_parser.add_argument("--fast-ms", type=float, default=20)
+    arg_parser.add_argument("--slow-ms", type=float, default=1000)
+    arg_parser.add_argument("--slow-share", type=float, default=0.03)
+    args = arg_parser.parse_args()
+
+    random.seed(1)
+    print(f"{'':<12} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+    for hedging in (False, True):
+        p50, p95, p99, worst = run(hedging, args)
+        print(f"{'hedged' if hedging else 'no hedging':<12} {p50:8.1f} {p95:8.1f} {p99:8.1f} {worst:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Microbenchmark: evaluating one price event against many alert rules.
+
+Compares the indexed RuleIndex.match with evaluating every compiled predicate,
+and checks that both return the same rules.
+
+    python benchmarks/bench_rules.py --rules 100000 --tickers 500 --events 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rules  # noqa: E402
+
+
+def make_rules(n, tickers, rng):
+    result = []
+    for i in range(n):
+        alert_type = rng.choice(rules.ALERT_TYPES)
+        if alert_type == "change_threshold":
+            threshold = round(rng.uniform(0.5, 10), 1)
+        elif alert_type == "volume_spike":
+            threshold = round(rng.uniform(1.1, 5), 1)
+        elif alert_type == "price_cross":
+            threshold = round(rng.uniform(50, 150), 2)
+        else:
+            threshold = None
+        result.append(rules.Rule(
+            alert_id=i, user_id=i, email=f"user{i}@example.com", company_id=rng.choice(tickers),
+            alert_type=alert_type, direction=rng.choice(rules.DIRECTIONS), threshold=threshold,
+            news_only=rng.random() < 0.2,
+        ))
+    return result
+
+
+def make_event(i, tickers, rng):
+    prev_price = rng.uniform(50, 150)
+    price = prev_price * (1 + rng.gauss(0, 0.02))
+    prev_change = rng.gauss(0, 3)
+    change = prev_change + rng.gauss(0, 1.5)
+    return rules.PriceEvent(
+        price_id=i, company_id=rng.choice(tickers), time=None, price=price,
+        trend="up" if price > prev_price else "down", change_percent=change,
+        volume=rng.randint(1, 5_000_000), is_trend_change=rng.random() < 0.3,
+        news_related=rng.random() < 0.3, prev_price=prev_price, prev_change_percent=prev_change,
+        avg_volume=rng.randint(500_000, 2_000_000),
+    )
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+def timed(fn, events):
+    timings = []
+    results = []
+    for event in events:
+        start = time.perf_counter()
+        results.append(fn(event))
+        timings.append(time.perf_counter() - start)
+    return timings, results
+
+
+def report(name, timings):
+    print(f"{name:<12} median {statistics.median(timings) * 1e6:10.1f} µs   "
+          f"p99 {percentile(timings, 0.99) * 1e6:10.1f} µs")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Alert rule evaluation benchmark")
+    arg_parser.add_argument("--rules", type=int, default=100_000)
+    arg_parser.add_argument("--tickers", type=int, default=500)
+    arg_parser.add_argument("--events", type=int, default=2000)
+    arg_parser.add_argument("--seed", type=int, default=42)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+    all_rules = make_rules(args.rules, tickers, rng)
+    events = [make_event(i, tickers, rng) for i in range(args.events)]
+
+    start = time.perf_counter()
+    index = rules.RuleIndex(all_rules)
+    index.match(events[0])  # sorts the buckets
+    print(f"{args.rules} rules on {args.tickers} tickers, {args.events} events")
+    print(f"index build  {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    indexed_timings, indexed = timed(index.match, events)
+    scan_timings, scanned = timed(lambda event: [rule for rule in all_rules if rule.matches(event)], events)
+
+    report("indexed", indexed_timings)
+    report("full scan", scan_timings)
+    print(f"speedup      {statistics.median(scan_timings) / statistics.median(indexed_timings):.0f}x (median)")
+
+    matched = 0
+    for event, a, b in zip(events, indexed, scanned):
+        if sorted(rule.alert_id for rule in a) != sorted(rule.alert_id for rule in b):
+            print(f"MISMATCH for event {event.price_id}")
+            sys.exit(1)
+        matched += len(a)
+    print(f"results match ({matched} rule hits)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,155 @@
+"""
+Memory-mapped Bloom filter of news already stored per ticker.
+
+The collector checks it before any DB work, so articles it has already seen
+never reach Postgres. The file survives restarts and can be rebuilt from the
+database at any time:
+
+    python bloom.py rebuild
+"""
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+
+logger = logging.getLogger("bloom")
+
+_MAGIC = b"NEWSBLM1"
+# magic, number of bits, number of hash functions, capacity, items added
+_HEADER = struct.Struct("<8sQQQQ")
+
+
+def optimal_parameters(capacity, error_rate):
+    """
+    Number of bits and hash functions for the given capacity and false-positive rate.
+    """
+    num_bits = math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))
+    num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+    return num_bits, num_hashes
+
+
+class BloomFilter:
+    """
+    Bloom filter stored in a file and accessed through mmap.
+    Keys are strings; positions come from double hashing of a BLAKE2b digest.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "r+b")
+        self._mm = mmap.mmap(self._file.fileno(), 0)
+        magic, self.num_bits, self.num_hashes, self.capacity, self.count = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a news Bloom filter")
+
+    @classmethod
+    def create(cls, path, capacity, error_rate):
+        num_bits, num_hashes = optimal_parameters(capacity, error_rate)
+        with open(path, "wb") as f:
+            f.write(_HEADER.pack(_MAGIC, num_bits, num_hashes, capacity, 0))
+            f.truncate(_HEADER.size + (num_bits + 7) // 8)
+        return cls(path)
+
+    @classmethod
+    def open(cls, path, capacity, error_rate):
+        """
+        Opens an existing filter file or creates an empty one.
+        """
+        if os.path.exists(path):
+            return cls(path)
+        return cls.create(path, capacity, error_rate)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def __contains__(self, key):
+        mm = self._mm
+        offset = _HEADER.size
+        for pos in self._positions(key):
+            if not mm[offset + (pos >> 3)] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def add(self, key):
+        """
+        Adds a key. Returns True if it was (probably) not present before.
+        """
+        mm = self._mm
+        offset = _HEADER.size
+        added = False
+        for pos in self._positions(key):
+            index = offset + (pos >> 3)
+            bit = 1 << (pos & 7)
+            if not mm[index] & bit:
+                mm[index] |= bit
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    @property
+    def saturated(self):
+        return self.count > self.capacity
+
+    def flush(self):
+        _HEADER.pack_into(self._mm, 0, _MAGIC, self.num_bits, self.num_hashes, self.capacity, self.count)
+        self._mm.flush()
+
+    def close(self):
+        if not self._mm.closed:
+            self._mm.close()
+        self._file.close()
+
+
+def news_key(company_id, news_id):
+    return f"{company_id}:{news_id}"
+
+
+def rebuild(conn, path, capacity, error_rate):
+    """
+    Rebuilds the filter from news_tickers into a temporary file and atomically
+    swaps it in. Capacity grows to keep room for twice the current number of links.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM news_tickers")
+    total = cursor.fetchone()[0]
+    cursor.close()
+
+    tmp_path = f"{path}.tmp"
+    bloom = BloomFilter.create(tmp_path, max(capacity, total * 2), error_rate)
+    try:
+        # Server-side cursor: the link table is streamed, not loaded into memory
+        cursor = conn.cursor(name="bloom_rebuild")
+        cursor.itersize = 10000
+        cursor.execute("SELECT company_id, news_id FROM news_tickers")
+        for company_id, news_id in cursor:
+            bloom.add(news_key(company_id, news_id))
+        cursor.close()
+        bloom.flush()
+    finally:
+        bloom.close()
+    os.replace(tmp_path, path)
+    logger.info("Rebuilt news Bloom filter %s with %d links", path, total)
+    return BloomFilter(path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    import config
+    from db import get_db_connection
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+    if sys.argv[1:] != ["rebuild"]:
+        print("Usage: python bloom.py rebuild")
+        sys.exit(1)
+    conn = get_db_connection()
+    rebuild(conn, config.NEWS_BLOOM_PATH, config.NEWS_BLOOM_CAPACITY, config.NEWS_BLOOM_ERROR_RATE).close()
+    conn.close()
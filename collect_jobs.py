@@ -0,0 +1,155 @@
+"""
+On-demand collection jobs (`collect_jobs` table).
+
+POST /collect only enqueues a job; the pipeline process runs it between its
+regular ticks, so a manual trigger never collects at the same time as the
+background loop. A trigger while a job is queued or running is coalesced into
+that job (its `triggers` count grows): a partial unique index allows at most
+one queued and one running job.
+
+    queued -> running -> done | failed
+
+A running job reports progress (tickers done / failed) every
+COLLECT_JOB_PROGRESS_SECONDS; one whose progress is older than
+COLLECT_JOB_STALE_SECONDS (its pipeline died) is marked failed.
+
+This module is imported by the API and must not load collector dependencies.
+"""
+import json
+import time as time_module
+
+import config
+
+JOB_COLUMNS = """
+    id, status, requested_by, triggers, created_at, started_at, updated_at, finished_at,
+    tickers_total, tickers_done, tickers_failed, failures, error
+"""
+
+
+def enqueue(cursor, requested_by):
+    """
+    Queues a collection job, or coalesces into the queued / running one.
+    Returns (job id, status, created).
+    """
+    cursor.execute("""
+        WITH active AS (
+            UPDATE collect_jobs SET triggers = triggers + 1
+            WHERE id = (
+                SELECT id FROM collect_jobs
+                WHERE status IN ('queued', 'running')
+                ORDER BY id DESC
+                LIMIT 1
+            )
+            RETURNING id, status, FALSE AS created
+        ),
+        queued AS (
+            INSERT INTO collect_jobs (requested_by)
+            SELECT %s WHERE NOT EXISTS (SELECT 1 FROM active)
+            -- Lost a race with another trigger: join its job
+            ON CONFLICT (status) WHERE status IN ('queued', 'running')
+            DO UPDATE SET triggers = collect_jobs.triggers + 1
+            RETURNING id, status, (xmax = 0) AS created
+        )
+        SELECT * FROM active
+        UNION ALL
+        SELECT * FROM queued
+    """, (requested_by,))
+    return cursor.fetchone()
+
+
+def get(cursor, job_id):
+    """
+    The job as a JSON-ready dict, or None.
+    """
+    cursor.execute(f"SELECT {JOB_COLUMNS} FROM collect_jobs WHERE id = %s", (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    (job_id, status, requested_by, triggers, created_at, started_at, updated_at, finished_at,
+     total, done, failed, failures, error) = row
+    if started_at:
+        duration = ((finished_at or updated_at) - started_at).total_seconds()
+    else:
+        duration = None
+    return {
+        "job_id": job_id,
+        "status": status,
+        "requested_by": requested_by,
+        "triggers": triggers,
+        "created_at": created_at.isoformat() if created_at else None,
+        "started_at": started_at.isoformat() if started_at else None,
+        "finished_at": finished_at.isoformat() if finished_at else None,
+        "duration_seconds": round(duration, 1) if duration is not None else None,
+        "tickers_total": total,
+        "tickers_done": done,
+        "tickers_failed": failed,
+        "failures": failures or {},
+        "error": error,
+    }
+
+
+def claim(conn):
+    """
+    Starts the queued job, unless another one is running. Returns its id or None.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        UPDATE collect_jobs
+        SET status = 'failed', error = 'stalled: no progress from the pipeline', finished_at = NOW()
+        WHERE status = 'running' AND updated_at < NOW() - make_interval(secs => %s)
+    """, (config.COLLECT_JOB_STALE_SECONDS,))
+    cursor.execute("""
+        UPDATE collect_jobs
+        SET status = 'running', started_at = NOW(), updated_at = NOW()
+        WHERE status = 'queued'
+          AND NOT EXISTS (SELECT 1 FROM collect_jobs WHERE status = 'running')
+        RETURNING id
+    """)
+    row = cursor.fetchone()
+    conn.commit()
+    cursor.close()
+    return row[0] if row else None
+
+
+class JobProgress:
+    """
+    Progress of a running job, written at most every COLLECT_JOB_PROGRESS_SECONDS.
+    """
+
+    def __init__(self, conn, job_id):
+        self.conn = conn
+        self.job_id = job_id
+        self.total = 0
+        self.done = 0
+        self.failures = {}
+        self._flushed_at = 0.0
+
+    def start(self, total):
+        self.total = total
+        self.flush()
+
+    def advance(self, ticker, error=None):
+        self.done += 1
+        if error:
+            self.failures[ticker] = error
+        if time_module.monotonic() - self._flushed_at >= config.COLLECT_JOB_PROGRESS_SECONDS:
+            self.flush()
+
+    def flush(self, status=None, error=None):
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            UPDATE collect_jobs
+            SET tickers_total = %s, tickers_done = %s, tickers_failed = %s, failures = %s,
+                updated_at = NOW(),
+                status = COALESCE(%s, status),
+                error = COALESCE(%s, error),
+                finished_at = CASE WHEN %s IS NOT NULL THEN NOW() END
+            WHERE id = %s
+        """, (self.total, self.done, len(self.failures), json.dumps(self.failures),
+              status, error, status, self.job_id))
+        self.conn.commit()
+        cursor.close()
+        self._flushed_at = time_module.monotonic()
+
+    def finish(self, error=None):
+        self.flush("failed" if error else "done", error)
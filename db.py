@@ -0,0 +1,258 @@
+import contextvars
+import logging
+import os
+import random
+import re
+import sys
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+import psycopg2
+import psycopg2.extensions
+
+import config
+import metrics
+
+# Statements slower than this are written to the slow-query log
+SLOW_QUERY_MS = config.SLOW_QUERY_MS
+# Share of slow SELECTs for which EXPLAIN (ANALYZE, BUFFERS) is captured (0 disables it)
+EXPLAIN_SAMPLE_RATE = config.EXPLAIN_SAMPLE_RATE
+# Same statement from the same call site this many times in one run looks like N+1
+N_PLUS_ONE_THRESHOLD = config.N_PLUS_ONE_THRESHOLD
+
+# --- Slow-query log ---
+slow_logger = logging.getLogger("slow_query")
+slow_logger.setLevel(logging.INFO)
+slow_logger.propagate = False
+# delay: the file is only created by the first slow query, not by importing this module
+_slow_handler = logging.FileHandler("slow_query.log", encoding="utf-8", delay=True)
+_slow_handler.setFormatter(logging.Formatter('[%(asctime)s] %(message)s'))
+slow_logger.addHandler(_slow_handler)
+
+logger = logging.getLogger("db")
+
+# First table referenced by a statement (FROM / INTO / UPDATE / CREATE TABLE ...)
+_TABLE_RE = re.compile(
+    r"\b(?:FROM|INTO|UPDATE|TABLE(?:\s+IF\s+NOT\s+EXISTS)?)\s+([\w.]+)",
+    re.IGNORECASE,
+)
+_THIS_FILE = __file__
+# SELECTs whose effects survive a rolled back EXPLAIN ANALYZE run (notifications, advisory
+# locks, sequences) or that take row locks; they are never explained
+_EXPLAIN_UNSAFE_RE = re.compile(
+    r"\bpg_notify\b|\bpg_\w*advisory\w*|\b(?:nextval|setval)\b|\bFOR\s+(?:NO\s+KEY\s+|KEY\s+)?(?:UPDATE|SHARE)\b",
+    re.IGNORECASE,
+)
+
+# Profile of the current request / pipeline run, if any
+_current_profile = contextvars.ContextVar("query_profile", default=None)
+
+
+@lru_cache(maxsize=1024)
+def statement_name(query):
+    """
+    Short, low-cardinality name for a SQL statement, e.g. "SELECT prices".
+    Queries in this project are string literals, so the cache is hit after the first call.
+    """
+    words = query.split(None, 1)
+    if not words:
+        return "EMPTY"
+    verb = words[0].upper()
+    match = _TABLE_RE.search(query)
+    return f"{verb} {match.group(1).lower()}" if match else verb
+
+
+@lru_cache(maxsize=1024)
+def explain_safe(query):
+    """
+    Whether EXPLAIN ANALYZE may run the statement a second time (inside a savepoint
+    that is always rolled back): plain SELECTs without side effects.
+    """
+    return statement_name(query).startswith("SELECT") and not _EXPLAIN_UNSAFE_RE.search(query)
+
+
+@lru_cache(maxsize=1024)
+def _format_call_site(filename, lineno, func_name):
+    return f"{os.path.basename(filename)}:{lineno} {func_name}"
+
+
+def call_site():
+    """
+    File, line and function of the first frame outside this module.
+    """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_code.co_filename == _THIS_FILE:
+        frame = frame.f_back
+    if frame is None:
+        return "unknown"
+    return _format_call_site(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+
+
+class QueryProfile:
+    """
+    Per-request / per-run aggregate of executed statements, keyed by (statement, call site).
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.started = time.perf_counter()
+        self.stats = {}
+
+    def record(self, statement, site, duration, rows):
+        entry = self.stats.get((statement, site))
+        if entry is None:
+            self.stats[(statement, site)] = [1, duration, max(rows, 0)]
+        else:
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] += max(rows, 0)
+
+    @property
+    def total_queries(self):
+        return sum(entry[0] for entry in self.stats.values())
+
+    @property
+    def total_seconds(self):
+        return sum(entry[1] for entry in self.stats.values())
+
+    def suspected_n_plus_one(self):
+        """
+        Statements executed repeatedly from the same call site.
+        """
+        return sorted(
+            (
+                (statement, site, count)
+                for (statement, site), (count, _, _) in self.stats.items()
+                if count >= N_PLUS_ONE_THRESHOLD
+            ),
+            key=lambda item: -item[2],
+        )
+
+    def summary(self, top=5):
+        """
+        Human-readable summary: totals, the most expensive statements and N+1 suspects.
+        """
+        elapsed = time.perf_counter() - self.started
+        lines = [
+            f"[{self.name}] {self.total_queries} queries, "
+            f"{self.total_seconds * 1000:.1f} ms in DB, {elapsed * 1000:.1f} ms total"
+        ]
+        by_time = sorted(self.stats.items(), key=lambda item: -item[1][1])[:top]
+        for (statement, site), (count, seconds, rows) in by_time:
+            lines.append(
+                f"    {seconds * 1000:9.1f} ms  x{count:<5} rows={rows:<7} {statement} @ {site}"
+            )
+        for statement, site, count in self.suspected_n_plus_one():
+            lines.append(f"    possible N+1: {statement} @ {site} executed {count} times")
+        return "\n".join(lines)
+
+
+def start_profile(name):
+    """
+    Starts collecting statements for the current context. Returns a token for finish_profile.
+    """
+    return _current_profile.set(QueryProfile(name))
+
+
+def finish_profile(token, log_level=logging.INFO):
+    """
+    Stops the profile started with start_profile and logs its summary.
+    N+1 suspects are always logged as warnings.
+    """
+    profile = _current_profile.get()
+    _current_profile.reset(token)
+    if profile is None or not profile.stats:
+        return profile
+    level = logging.WARNING if profile.suspected_n_plus_one() else log_level
+    if logger.isEnabledFor(level):
+        logger.log(level, profile.summary())
+    return profile
+
+
+@contextmanager
+def profile(name, log_level=logging.INFO):
+    token = start_profile(name)
+    try:
+        yield _current_profile.get()
+    finally:
+        finish_profile(token, log_level)
+
+
+def _explain(connection, query, vars):
+    """
+    Runs EXPLAIN (ANALYZE, BUFFERS) for a read-only statement on a plain cursor,
+    so the EXPLAIN itself is not profiled. The second execution is always rolled
+    back to a savepoint, so callers must not use it on autocommit connections.
+    """
+    cursor = psycopg2.extensions.cursor(connection)
+    try:
+        cursor.execute("SAVEPOINT explain_capture")
+        try:
+            cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + query, vars)
+            return "\n".join(row[0] for row in cursor.fetchall())
+        except Exception as e:
+            return f"EXPLAIN failed: {e}"
+        finally:
+            cursor.execute("ROLLBACK TO SAVEPOINT explain_capture")
+            cursor.execute("RELEASE SAVEPOINT explain_capture")
+    except Exception as e:
+        return f"EXPLAIN failed: {e}"
+    finally:
+        cursor.close()
+
+
+class ProfilingCursor(psycopg2.extensions.cursor):
+    """
+    Cursor that records duration, row count and call site of every statement.
+    Feeds the db_query_seconds histogram, the active QueryProfile and the slow-query log.
+    """
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            name = statement_name(query) if isinstance(query, str) else "COMPOSED"
+            metrics.DB_QUERY_SECONDS.labels(name).observe(duration)
+
+            site = None
+            active = _current_profile.get()
+            if active is not None:
+                site = call_site()
+                active.record(name, site, duration, self.rowcount)
+
+            if duration * 1000 >= SLOW_QUERY_MS:
+                self._log_slow(query, vars, name, site or call_site(), duration, failed)
+
+    def _log_slow(self, query, vars, name, site, duration, failed):
+        try:
+            sql = self.mogrify(query, vars).decode("utf-8", "replace")
+        except Exception:
+            sql = str(query)
+        message = f"{duration * 1000:.1f} ms rows={self.rowcount} {name} @ {site}\n    {' '.join(sql.split())}"
+
+        # EXPLAIN ANALYZE executes the statement again, so only sample read-only ones, and
+        # only inside a transaction where its savepoint can undo it
+        if (
+            EXPLAIN_SAMPLE_RATE > 0
+            and not failed
+            and self.name is None
+            and not self.connection.autocommit
+            and isinstance(query, str)
+            and explain_safe(query)
+            and random.random() < EXPLAIN_SAMPLE_RATE
+        ):
+            message += "\n" + _explain(self.connection, query, vars)
+        slow_logger.warning(message)
+
+
+def get_db_connection():
+    return psycopg2.connect(
+        config.DATABASE_URL,
+        cursor_factory=ProfilingCursor,
+    )
@@ -0,0 +1,259 @@
+"""
+Parquet export of `prices` and `news_data` for analytics, and the cold-storage
+tier for raw prices.
+
+Rows are streamed from a server-side cursor in chunks of EXPORT_CHUNK_ROWS and
+written as one Parquet row group per chunk, so memory stays bounded whatever
+the size of the slice.
+
+    python export.py export prices --from 2024-01-01 --to 2024-02-01 [--ticker AAPL] [--out prices.parquet]
+    python export.py export news_data --from 2024-01-01 --to 2024-02-01
+    python export.py archive --before 2024-06-01
+
+Archives are written per month as ARCHIVE_DIR/<table>/year=YYYY/month=MM/part.parquet
+(hive-style partitions) and recorded in export_archives. The pipeline archives
+complete months before pruning them (PRICE_RETENTION_DAYS).
+"""
+import argparse
+import logging
+import os
+from datetime import datetime
+
+import pytz
+
+import config
+
+logger = logging.getLogger("export")
+
+# table -> (SELECT over alias t, [(column, arrow type)]); filtered on t.time / t.company_id
+EXPORTS = {
+    "prices": ("""
+        SELECT t.id, t.company_id, t.time, t.price, t.previous_close, t.open_price, t.day_low, t.day_high,
+               t.change_percent, t.volume, t.trend, t.is_trend_change, t.news_related
+        FROM prices t
+    """, [
+        ("id", "int64"), ("company_id", "string"), ("time", "timestamp"), ("price", "float64"),
+        ("previous_close", "float64"), ("open_price", "float64"), ("day_low", "float64"),
+        ("day_high", "float64"), ("change_percent", "float64"), ("volume", "int64"), ("trend", "string"),
+        ("is_trend_change", "bool"), ("news_related", "bool"),
+    ]),
+    "news_data": ("""
+        SELECT t.id, t.company_id, t.news_text, t.time, t.url, t.summary, t.provider, t.simhash,
+               ARRAY(SELECT nt.company_id FROM news_tickers nt WHERE nt.news_id = t.id ORDER BY 1) AS tickers
+        FROM news_data t
+    """, [
+        ("id", "string"), ("company_id", "string"), ("news_text", "string"), ("time", "timestamp"),
+        ("url", "string"), ("summary", "string"), ("provider", "string"), ("simhash", "int64"),
+        ("tickers", "list<string>"),
+    ]),
+}
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    types = {
+        "int64": pa.int64(),
+        "float64": pa.float64(),
+        "string": pa.string(),
+        "bool": pa.bool_(),
+        "timestamp": pa.timestamp("us", tz="UTC"),
+        "list<string>": pa.list_(pa.string()),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+class _StreamSink:
+    """
+    Write-only file object that keeps what ParquetWriter wrote until drained,
+    so a Parquet file can be sent as it is produced.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _batches(conn, table, start=None, end=None, company_id=None, chunk_rows=None):
+    """
+    Yields Arrow record batches of a table slice ([start, end), optionally one ticker),
+    read through a server-side cursor.
+    """
+    import pyarrow as pa
+
+    query, columns = EXPORTS[table]
+    schema = _arrow_schema(columns)
+    chunk_rows = chunk_rows or config.EXPORT_CHUNK_ROWS
+
+    cursor = conn.cursor(name=f"export_{table}")
+    cursor.itersize = chunk_rows
+    cursor.execute(query + """
+        WHERE (%s::timestamptz IS NULL OR t.time >= %s)
+          AND (%s::timestamptz IS NULL OR t.time < %s)
+          AND (%s::text IS NULL OR t.company_id = %s)
+        ORDER BY t.time, t.id
+    """, (start, start, end, end, company_id, company_id))
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield pa.record_batch(
+                [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)],
+                schema=schema,
+            )
+    finally:
+        cursor.close()
+        conn.commit()
+
+
+def export_table(conn, table, path, start=None, end=None, company_id=None, chunk_rows=None):
+    """
+    Writes a table slice to a Parquet file (atomically: temp file + rename).
+    Returns the number of rows written.
+    """
+    import pyarrow.parquet as pq
+
+    _, columns = EXPORTS[table]
+    tmp_path = f"{path}.tmp"
+    rows = 0
+    writer = pq.ParquetWriter(tmp_path, _arrow_schema(columns), compression="zstd")
+    try:
+        for batch in _batches(conn, table, start, end, company_id, chunk_rows):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        writer.close()
+    os.replace(tmp_path, path)
+    logger.info("Exported %d %s rows to %s", rows, table, path)
+    return rows
+
+
+def stream_table(conn, table, start=None, end=None, company_id=None, chunk_rows=None):
+    """
+    Yields a Parquet file of a table slice as byte chunks (one per row group),
+    for streaming HTTP responses. Closes `conn` when done.
+    """
+    import pyarrow.parquet as pq
+
+    _, columns = EXPORTS[table]
+    sink = _StreamSink()
+    writer = pq.ParquetWriter(sink, _arrow_schema(columns), compression="zstd")
+    try:
+        for batch in _batches(conn, table, start, end, company_id, chunk_rows):
+            writer.write_batch(batch)
+            yield sink.drain()
+        writer.close()
+        yield sink.drain()
+    finally:
+        conn.close()
+
+
+def _month_start(dt):
+    dt = dt.astimezone(pytz.UTC)
+    return pytz.UTC.localize(datetime(dt.year, dt.month, 1))
+
+
+def _next_month(month):
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1)
+    return month.replace(month=month.month + 1)
+
+
+def archive_path(archive_dir, table, month):
+    return os.path.join(archive_dir, table, f"year={month.year:04d}", f"month={month.month:02d}", "part.parquet")
+
+
+def archive_months(conn, table, before, archive_dir=None):
+    """
+    Archives every complete UTC month of `table` that ends on or before `before`
+    and is not in export_archives yet. Returns the start of the first month that
+    is not archived: rows older than that are safe to delete.
+    """
+    archive_dir = archive_dir or config.ARCHIVE_DIR
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT min(time) FROM {table}")
+    oldest = cursor.fetchone()[0]
+    cursor.execute("SELECT month FROM export_archives WHERE table_name = %s", (table,))
+    archived = {row[0] for row in cursor.fetchall()}
+    conn.commit()
+
+    if oldest is None:
+        cursor.close()
+        return _month_start(before)
+
+    month = _month_start(oldest)
+    while _next_month(month) <= before:
+        if month.date() not in archived:
+            path = archive_path(archive_dir, table, month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            rows = export_table(conn, table, path, month, _next_month(month))
+            cursor.execute("""
+                INSERT INTO export_archives (table_name, month, path, rows)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (table_name, month) DO UPDATE SET
+                    path = EXCLUDED.path, rows = EXCLUDED.rows, archived_at = NOW()
+            """, (table, month.date(), path, rows))
+            conn.commit()
+        month = _next_month(month)
+    cursor.close()
+    return month
+
+
+if __name__ == "__main__":
+    from dateutil import parser
+
+    from db import get_db_connection
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+
+    def to_utc(value):
+        dt = parser.isoparse(value)
+        return pytz.UTC.localize(dt) if dt.tzinfo is None else dt
+
+    arg_parser = argparse.ArgumentParser(description="Export prices / news to Parquet")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="write a table slice to one Parquet file")
+    export_parser.add_argument("table", choices=sorted(EXPORTS))
+    export_parser.add_argument("--from", dest="start")
+    export_parser.add_argument("--to", dest="end")
+    export_parser.add_argument("--ticker")
+    export_parser.add_argument("--out")
+    archive_parser = commands.add_parser("archive", help="archive complete months of raw prices")
+    archive_parser.add_argument("--before", required=True)
+    archive_parser.add_argument("--table", choices=sorted(EXPORTS), default="prices")
+    args = arg_parser.parse_args()
+
+    conn = get_db_connection()
+    if args.command == "export":
+        out = args.out or f"{args.table}.parquet"
+        export_table(
+            conn, args.table, out,
+            to_utc(args.start) if args.start else None,
+            to_utc(args.end) if args.end else None,
+            args.ticker.upper() if args.ticker else None,
+        )
+    else:
+        until = archive_months(conn, args.table, to_utc(args.before))
+        print(f"{args.table} archived up to {until.date().isoformat()} in {config.ARCHIVE_DIR}")
+    conn.close()
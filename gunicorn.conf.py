@@ -0,0 +1,48 @@
+"""
+Production server config for the API:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+import shutil
+
+import config
+
+bind = f"{config.API_HOST}:{config.API_PORT}"
+
+# Requests are mostly waiting on Postgres, so threads per worker give concurrency cheaply
+workers = config.WEB_CONCURRENCY
+worker_class = "gthread"
+threads = config.WEB_THREADS
+
+# Import the app once in the master and fork workers from it (faster start, shared pages)
+preload_app = True
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+backlog = 2048
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting all at once
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+
+# prometheus_client multiprocess mode: every worker writes its samples to this directory
+# and /metrics aggregates them. Must be set before prometheus_client is imported.
+PROMETHEUS_MULTIPROC_DIR = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", "/tmp/trend_alert_prometheus"
+)
+
+
+def on_starting(server):
+    shutil.rmtree(PROMETHEUS_MULTIPROC_DIR, ignore_errors=True)
+    os.makedirs(PROMETHEUS_MULTIPROC_DIR, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
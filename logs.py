@@ -0,0 +1,132 @@
+"""
+Shared logging setup for the pipeline processes (collector, notificator, notifier workers).
+
+Records are put on an in-memory queue by the logging call and formatted and
+written (console, log file, slow_query.log) by a QueueListener thread, so a
+hot loop pays neither for formatting nor for disk I/O. Messages use lazy
+%-style arguments, which are only rendered for records that are emitted:
+
+    logger.info("%s → %s", ticker, price)
+
+so arguments must not be mutated after the call.
+
+Per-item detail (one line per ticker or email) goes through sampled(), which
+keeps one in LOG_SAMPLE_EVERY calls per message and skips the others before a
+LogRecord is even built; totals are logged once per run. LOG_FORMAT=json writes
+one JSON object per line.
+"""
+import atexit
+import json
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+import config
+
+TEXT_FORMAT = '[%(asctime)s] %(levelname)s - %(message)s'
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_listeners = []
+# message -> calls, for sampled()
+_sample_counts = {}
+
+
+def sampled(logger, level, msg, *args):
+    """
+    Logs the first and then every LOG_SAMPLE_EVERY-th call with this message;
+    the other calls cost a dict update.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    seen = _sample_counts.get(msg, 0)
+    _sample_counts[msg] = seen + 1
+    every = config.LOG_SAMPLE_EVERY
+    if every <= 1:
+        logger.log(level, msg, *args, stacklevel=2)
+    elif seen % every == 0:
+        logger.log(level, msg, *args, extra={"sample_every": every}, stacklevel=2)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update({key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    Enqueues records as they are; the listener thread formats them.
+    (QueueHandler.prepare would render the message in the logging thread.)
+    """
+
+    def prepare(self, record):
+        return record
+
+
+def _formatter():
+    return JsonFormatter() if config.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+
+def _move_behind_queue(logger, handlers):
+    """
+    Makes `logger` enqueue records for a listener thread that passes them to `handlers`.
+    """
+    records = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(records)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    _listeners.append(listener)
+
+
+def configure(log_file=None):
+    """
+    Console (+ log_file) logging at LOG_LEVEL through a listener thread; also moves
+    the slow-query log behind it. Only the first call has an effect.
+    """
+    if _listeners:
+        return
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        handlers.append(logging.FileHandler(log_file, encoding="utf-8"))
+    for handler in handlers:
+        handler.setFormatter(_formatter())
+
+    # Not in the formats; saves a lookup per record
+    logging.logProcesses = False
+    logging.logMultiprocessing = False
+
+    root = logging.getLogger()
+    root.setLevel(config.LOG_LEVEL)
+    _move_behind_queue(root, handlers)
+
+    # db.py's slow-query log has its own file and format
+    slow_logger = logging.getLogger("slow_query")
+    slow_handlers = list(slow_logger.handlers)
+    if slow_handlers:
+        for handler in slow_handlers:
+            if config.LOG_FORMAT == "json":
+                handler.setFormatter(JsonFormatter())
+        _move_behind_queue(slow_logger, slow_handlers)
+
+    atexit.register(shutdown)
+
+
+def shutdown():
+    """
+    Writes out the queued records and stops the listener threads.
+    """
+    while _listeners:
+        _listeners.pop().stop()
@@ -0,0 +1,35 @@
+"""
+One-off management commands, run once per deploy rather than on every start:
+
+    python manage.py init-db    # create / migrate all tables
+"""
+import argparse
+import sys
+
+from db import get_db_connection
+
+
+def init_db():
+    from models import init_tables
+
+    conn = get_db_connection()
+    try:
+        print(init_tables(conn))
+    finally:
+        conn.close()
+
+
+COMMANDS = {
+    "init-db": init_db,
+}
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Trend Alert management commands")
+    arg_parser.add_argument("command", choices=sorted(COMMANDS))
+    args = arg_parser.parse_args()
+    try:
+        COMMANDS[args.command]()
+    except Exception as e:
+        print(f"{args.command} failed: {e}")
+        sys.exit(1)
@@ -0,0 +1,132 @@
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+# Buckets tuned for sub-second work (DB statements, HTTP routes)
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Buckets for network calls to Yahoo / SMTP which can take several seconds
+SLOW_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+
+# --- Collector ---
+COLLECTOR_STAGE_SECONDS = Histogram(
+    "collector_stage_seconds",
+    "Time spent in each collector stage per ticker",
+    ["stage"],
+    buckets=SLOW_BUCKETS,
+)
+YAHOO_REQUEST_SECONDS = Histogram(
+    "yahoo_request_seconds",
+    "Latency of Yahoo Finance requests",
+    ["endpoint"],
+    buckets=SLOW_BUCKETS,
+)
+YAHOO_ERRORS_TOTAL = Counter(
+    "yahoo_errors_total",
+    "Failed Yahoo Finance requests",
+    ["endpoint"],
+)
+
+POLL_PLANNED_REQUESTS_PER_HOUR = Gauge(
+    "poll_planned_requests_per_hour",
+    "Price requests per hour planned by the adaptive per-ticker polling intervals",
+    multiprocess_mode="livemax",
+)
+
+TICKER_VALIDATIONS_TOTAL = Counter(
+    "ticker_validations_total",
+    "Ticker symbols checked against the quote source",
+    ["result"],
+)
+
+PROVIDER_REQUEST_SECONDS = Histogram(
+    "provider_request_seconds",
+    "Latency of successful quote provider requests",
+    ["provider", "kind"],
+    buckets=SLOW_BUCKETS,
+)
+PROVIDER_ERRORS_TOTAL = Counter(
+    "provider_errors_total",
+    "Failed quote provider requests",
+    ["provider", "kind"],
+)
+PROVIDER_HEDGES_TOTAL = Counter(
+    "provider_hedges_total",
+    "Requests sent to the next provider because the current one exceeded its rolling p95",
+    ["kind"],
+)
+PROVIDER_FALLBACK_WINS_TOTAL = Counter(
+    "provider_fallback_wins_total",
+    "Requests answered by a provider other than the primary (hedge or fallback)",
+    ["provider", "kind"],
+)
+PROVIDER_LATENCY_SECONDS = Gauge(
+    "provider_latency_seconds",
+    "Rolling latency percentiles per quote provider, as used for hedging",
+    ["provider", "kind", "quantile"],
+    multiprocess_mode="livemax",
+)
+
+# --- Database ---
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Latency of SQL statements, labelled by statement kind and table",
+    ["statement"],
+    buckets=FAST_BUCKETS,
+)
+
+# --- Notificator ---
+NOTIFICATIONS_EVALUATED_TOTAL = Counter(
+    "notifications_evaluated_total",
+    "Price events evaluated against the alert rules by the notificator",
+)
+NOTIFICATIONS_MATCHED_TOTAL = Counter(
+    "notifications_matched_total",
+    "New (price event, user) matches found by the notificator",
+)
+NOTIFICATIONS_DIGESTED_TOTAL = Counter(
+    "notifications_digested_total",
+    "Matched price events queued for a digest email instead of sent on their own",
+)
+NOTIFICATIONS_SENT_TOTAL = Counter(
+    "notifications_sent_total",
+    "Notification emails handed over to SMTP",
+    ["result"],
+)
+SMTP_SEND_SECONDS = Histogram(
+    "smtp_send_seconds",
+    "Latency of a single SMTP send (connect, login, send)",
+    buckets=SLOW_BUCKETS,
+)
+
+# --- API ---
+API_REQUEST_SECONDS = Histogram(
+    "api_request_seconds",
+    "Latency of API requests per route",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS,
+)
+
+# Pre-bound children for the hot paths, so a labels() lookup is not paid per call
+STAGE_FETCH_PRICE = COLLECTOR_STAGE_SECONDS.labels("fetch_price")
+STAGE_FETCH_NEWS = COLLECTOR_STAGE_SECONDS.labels("fetch_news")
+STAGE_STORE_PRICE = COLLECTOR_STAGE_SECONDS.labels("store_price")
+STAGE_STORE_NEWS = COLLECTOR_STAGE_SECONDS.labels("store_news")
+YAHOO_INFO_SECONDS = YAHOO_REQUEST_SECONDS.labels("info")
+YAHOO_NEWS_SECONDS = YAHOO_REQUEST_SECONDS.labels("news")
+YAHOO_INFO_ERRORS = YAHOO_ERRORS_TOTAL.labels("info")
+YAHOO_NEWS_ERRORS = YAHOO_ERRORS_TOTAL.labels("news")
+NOTIFICATIONS_SENT_OK = NOTIFICATIONS_SENT_TOTAL.labels("ok")
+NOTIFICATIONS_SENT_FAILED = NOTIFICATIONS_SENT_TOTAL.labels("failed")
+
+
+def render():
+    """
+    Returns the Prometheus text exposition of all metrics and its content type.
+    Under a multi-worker server (PROMETHEUS_MULTIPROC_DIR set) samples of all workers are merged.
+    """
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -1,3 +1,7 @@
+import config
+import rollups
+
+
 def init_tables(conn):
     cursor = conn.cursor()
 
@@ -54,6 +58,158 @@ def init_tables(conn):
         );
     """)
 
+    # news_data holds one row per article; tickers are linked through news_tickers.
+    # news_data.company_id is kept as the ticker the article was first seen for.
+    print("[DB]  Migrating 'news_data' to shared articles...")
+    cursor.execute("""
+        ALTER TABLE news_data ADD COLUMN IF NOT EXISTS simhash BIGINT;
+        ALTER TABLE news_data ALTER COLUMN company_id DROP NOT NULL;
+        CREATE INDEX IF NOT EXISTS idx_news_data_time ON news_data (time);
+    """)
+
+    # Full-text search over title (weight A) and summary (weight B), maintained by Postgres
+    print("[DB]  Adding full-text search column to 'news_data'...")
+    cursor.execute("""
+        ALTER TABLE news_data ADD COLUMN IF NOT EXISTS search_tsv tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(news_text, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(summary, '')), 'B')
+            ) STORED;
+        CREATE INDEX IF NOT EXISTS idx_news_data_search ON news_data USING GIN (search_tsv);
+    """)
+
+    cursor.execute("SELECT to_regclass('news_tickers') IS NULL")
+    backfill_news_tickers = cursor.fetchone()[0]
+
+    print("[DB]  Creating 'news_tickers' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS news_tickers (
+            news_id TEXT NOT NULL REFERENCES news_data(id) ON DELETE CASCADE,
+            company_id VARCHAR(10) NOT NULL,
+            time TIMESTAMPTZ,
+            PRIMARY KEY (company_id, news_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_news_tickers_company_time ON news_tickers (company_id, time);
+        CREATE INDEX IF NOT EXISTS idx_news_tickers_news_id ON news_tickers (news_id);
+    """)
+
+    if backfill_news_tickers:
+        print("[DB]  Linking existing news to tickers...")
+        cursor.execute("""
+            INSERT INTO news_tickers (news_id, company_id, time)
+            SELECT id, company_id, time FROM news_data
+            WHERE company_id IS NOT NULL
+            ON CONFLICT DO NOTHING
+        """)
+
+    cursor.execute("SELECT to_regclass('price_news') IS NULL")
+    backfill_price_news = cursor.fetchone()[0]
+
+    # Related news per price sample, computed once at insert time (and for late news)
+    print("[DB]  Creating 'price_news' table...")
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_prices_company_time ON prices (company_id, time);
+        CREATE TABLE IF NOT EXISTS price_news (
+            price_id INTEGER NOT NULL REFERENCES prices(id) ON DELETE CASCADE,
+            news_id TEXT NOT NULL REFERENCES news_data(id) ON DELETE CASCADE,
+            PRIMARY KEY (price_id, news_id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_price_news_news_id ON price_news (news_id);
+        -- Set when late news makes a sample news_related (re-checked by the notificator)
+        ALTER TABLE prices ADD COLUMN IF NOT EXISTS news_linked_at TIMESTAMPTZ;
+        CREATE INDEX IF NOT EXISTS idx_prices_news_linked_at ON prices (news_linked_at)
+            WHERE news_linked_at IS NOT NULL;
+    """)
+
+    if backfill_price_news:
+        print("[DB]  Linking existing prices to news...")
+        cursor.execute("""
+            INSERT INTO price_news (price_id, news_id)
+            SELECT p.id, nt.news_id
+            FROM prices p
+            JOIN news_tickers nt ON nt.company_id = p.company_id
+             AND nt.time BETWEEN p.time - %s * INTERVAL '1 minute' AND p.time + %s * INTERVAL '1 minute'
+            ON CONFLICT DO NOTHING
+        """, (config.NEWS_PROXIMITY_MINUTES, config.NEWS_PROXIMITY_MINUTES))
+
+    # Per-ticker news cursor: newest pubDate seen, fingerprint of the last feed and
+    # when the feed should be polled next
+    print("[DB]  Creating 'news_cursors' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS news_cursors (
+            company_id VARCHAR(10) PRIMARY KEY,
+            last_pub_date TIMESTAMPTZ,
+            fingerprint TEXT,
+            unchanged_runs INTEGER NOT NULL DEFAULT 0,
+            next_poll_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+    """)
+
+    cursor.execute("SELECT to_regclass('prices_hourly') IS NULL")
+    backfill_rollups = cursor.fetchone()[0]
+
+    # OHLCV rollups, updated incrementally by the collector (see rollups.py)
+    for table in rollups.ROLLUP_TABLES:
+        print(f"[DB]  Creating '{table}' table...")
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                company_id VARCHAR(10) NOT NULL,
+                bucket TIMESTAMPTZ NOT NULL,
+                open FLOAT,
+                high FLOAT,
+                low FLOAT,
+                close FLOAT,
+                open_time TIMESTAMPTZ,
+                close_time TIMESTAMPTZ,
+                volume BIGINT,
+                samples INTEGER NOT NULL DEFAULT 0,
+                trend_changes INTEGER NOT NULL DEFAULT 0,
+                news_related_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (company_id, bucket)
+            );
+        """)
+
+    if backfill_rollups:
+        print("[DB]  Aggregating existing prices into rollups...")
+        rollups.aggregate_range(cursor)
+
+    # Start of the raw prices kept by rollups.prune; rollups before it cannot be rebuilt
+    print("[DB]  Creating 'prices_prune_state' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS prices_prune_state (
+            singleton BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+            pruned_before TIMESTAMPTZ NOT NULL
+        );
+    """)
+
+    # Symbols known to the collector: validation status, quote metadata, failure tracking
+    # (see ticker_registry.py)
+    print("[DB]  Creating 'tickers' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS tickers (
+            symbol VARCHAR(10) PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'pending',
+            name TEXT,
+            exchange TEXT,
+            currency TEXT,
+            quote_type TEXT,
+            validated_at TIMESTAMPTZ,
+            failure_count INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            last_failure_at TIMESTAMPTZ,
+            last_success_at TIMESTAMPTZ,
+            retry_after TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ DEFAULT NOW()
+        );
+    """)
+
+    # Adaptive price polling (see polling.py)
+    cursor.execute("""
+        ALTER TABLE tickers ADD COLUMN IF NOT EXISTS poll_interval_seconds INTEGER;
+        ALTER TABLE tickers ADD COLUMN IF NOT EXISTS next_poll_at TIMESTAMPTZ;
+    """)
+
     print("[DB]  Creating 'alerts' table...")
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS alerts (
@@ -67,6 +223,15 @@ def init_tables(conn):
         );
     """)
 
+    # Rule parameters (see rules.py): alert_type selects the condition,
+    # alert_condition is the direction, threshold its level
+    print("[DB]  Migrating 'alerts' to rule conditions...")
+    cursor.execute("""
+        ALTER TABLE alerts ADD COLUMN IF NOT EXISTS threshold FLOAT;
+        ALTER TABLE alerts ADD COLUMN IF NOT EXISTS news_only BOOLEAN NOT NULL DEFAULT FALSE;
+        CREATE INDEX IF NOT EXISTS idx_campaigns_company_active ON campaigns (company_id) WHERE is_active;
+    """)
+
     print("[DB]  Creating 'notifications' table...")
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS notifications (
@@ -77,6 +242,92 @@ def init_tables(conn):
         );
     """)
 
+    # Digest delivery: per user (window 0 = one digest per notificator run), overridable
+    # per alert. Matches waiting for their digest are notifications with sent_at NULL.
+    print("[DB]  Adding digest delivery settings...")
+    cursor.execute("""
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS delivery TEXT NOT NULL DEFAULT 'immediate';
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS digest_window_minutes INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE alerts ADD COLUMN IF NOT EXISTS delivery TEXT;
+        ALTER TABLE notifications ADD COLUMN IF NOT EXISTS created_at TIMESTAMPTZ DEFAULT NOW();
+        ALTER TABLE notifications ADD COLUMN IF NOT EXISTS reasons TEXT;
+        CREATE INDEX IF NOT EXISTS idx_notifications_pending ON notifications (user_id) WHERE sent_at IS NULL;
+    """)
+
+    # Months of raw data written to Parquet (see export.py); pruning stops at the first gap
+    print("[DB]  Creating 'export_archives' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS export_archives (
+            table_name TEXT NOT NULL,
+            month DATE NOT NULL,
+            path TEXT NOT NULL,
+            rows BIGINT NOT NULL,
+            archived_at TIMESTAMPTZ DEFAULT NOW(),
+            PRIMARY KEY (table_name, month)
+        );
+    """)
+
+    # Last price id evaluated by the notificator, per shard; starts at the current
+    # newest price so existing history is not re-alerted
+    print("[DB]  Creating 'notifier_state' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notifier_state (
+            shard INTEGER PRIMARY KEY,
+            last_price_id INTEGER NOT NULL
+        );
+        INSERT INTO notifier_state (shard, last_price_id)
+        SELECT s, COALESCE(
+            (SELECT min(last_price_id) FROM notifier_state),
+            (SELECT max(id) FROM prices),
+            0
+        )
+        FROM generate_series(0, %s - 1) AS s
+        ON CONFLICT (shard) DO NOTHING;
+    """, (config.NOTIFIER_SHARDS,))
+
+    # Live notifier workers (see notifier_worker.py)
+    print("[DB]  Creating 'notifier_workers' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS notifier_workers (
+            worker_id TEXT PRIMARY KEY,
+            started_at TIMESTAMPTZ DEFAULT NOW(),
+            heartbeat_at TIMESTAMPTZ DEFAULT NOW(),
+            shards INTEGER[] NOT NULL DEFAULT '{}'
+        );
+    """)
+
+    # On-demand collection jobs (see collect_jobs.py); at most one queued and one running
+    print("[DB]  Creating 'collect_jobs' table...")
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS collect_jobs (
+            id SERIAL PRIMARY KEY,
+            status TEXT NOT NULL DEFAULT 'queued',
+            requested_by TEXT,
+            triggers INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMPTZ DEFAULT NOW(),
+            started_at TIMESTAMPTZ,
+            updated_at TIMESTAMPTZ DEFAULT NOW(),
+            finished_at TIMESTAMPTZ,
+            tickers_total INTEGER NOT NULL DEFAULT 0,
+            tickers_done INTEGER NOT NULL DEFAULT 0,
+            tickers_failed INTEGER NOT NULL DEFAULT 0,
+            failures JSONB NOT NULL DEFAULT '{}',
+            error TEXT
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_collect_jobs_active ON collect_jobs (status)
+            WHERE status IN ('queued', 'running');
+    """)
+
+    # One notification per (price, user), whichever worker processes it
+    cursor.execute("SELECT to_regclass('idx_notifications_price_user') IS NULL")
+    if cursor.fetchone()[0]:
+        print("[DB]  Removing duplicate notifications...")
+        cursor.execute("""
+            DELETE FROM notifications a USING notifications b
+            WHERE a.price_id = b.price_id AND a.user_id = b.user_id AND a.id > b.id;
+            CREATE UNIQUE INDEX idx_notifications_price_user ON notifications (price_id, user_id);
+        """)
+
     conn.commit()
     cursor.close()
 
@@ -1,36 +1,29 @@
-import os
-import psycopg2
-from datetime import timedelta, datetime
+import time as time_module
 import logging
-import smtplib
-from email.message import EmailMessage
-from dotenv import load_dotenv
-
-# ⏬ Завантаження .env
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-SMTP_SERVER = os.getenv("SMTP_SERVER")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_USERNAME = os.getenv("SMTP_USERNAME")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-EMAIL_FROM = os.getenv("EMAIL_FROM")
-
-# 🔔 Логування
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("notificator.log", encoding="utf-8")
-    ]
-)
+import config
+import logs
+import metrics
+import rules
+import db
+from db import get_db_connection
+
+SMTP_SERVER = config.SMTP_SERVER
+SMTP_PORT = config.SMTP_PORT
+SMTP_USERNAME = config.SMTP_USERNAME
+SMTP_PASSWORD = config.SMTP_PASSWORD
+EMAIL_FROM = config.EMAIL_FROM
+
 logger = logging.getLogger("notificator")
 
-def get_db_connection():
-    return psycopg2.connect(DATABASE_URL)
 
-def render_email_template(company_id, trend, change_percent, time, news_items):
+def configure_logging():
+    """
+    🔔 Логування: console + notificator.log when run on its own.
+    """
+    logs.configure("notificator.log")
+
+
+def render_email_template(company_id, trend, change_percent, time, news_items, reasons=()):
     trend_color = "green" if trend == "up" else "red" if trend == "down" else "gray"
 
     news_html = ""
@@ -40,6 +33,11 @@ def render_email_template(company_id, trend, change_percent, time, news_items):
             news_html += f"<li><a href='{item['url']}' target='_blank'>{item['news_text']}</a></li>"
         news_html += "</ul>"
 
+    change_text = f"{change_percent:.2f}%" if change_percent is not None else "n/a"
+    reasons_html = ""
+    if reasons:
+        reasons_html = "<p><strong>Matched:</strong> " + "; ".join(reasons) + "</p>"
+
     return f"""
     <html>
   <body style="margin: 0; padding: 0; font-family: 'Segoe UI', sans-serif; background-color: #e6ecf0;">
@@ -56,9 +54,10 @@ def render_email_template(company_id, trend, change_percent, time, news_items):
     ">
       <div style="padding: 30px;">
         <h2 style="color: {trend_color};">📈 Alert: {company_id}</h2>
-        <p><strong>Trend:</strong> {trend.title()}</p>
-        <p><strong>Change:</strong> {change_percent:.2f}%</p>
+        <p><strong>Trend:</strong> {(trend or "n/a").title()}</p>
+        <p><strong>Change:</strong> {change_text}</p>
         <p><strong>Time:</strong> {time}</p>
+        {reasons_html}
         {news_html}
       </div>
       <div style="
@@ -77,8 +76,73 @@ def render_email_template(company_id, trend, change_percent, time, news_items):
     """
 
 
+def render_digest_template(items):
+    """
+    One email for several matched price events; items are dicts with company_id,
+    trend, change_percent, time, reasons and news_items.
+    """
+    rows_html = ""
+    for item in items:
+        trend = item["trend"]
+        trend_color = "green" if trend == "up" else "red" if trend == "down" else "gray"
+        change = item["change_percent"]
+        change_text = f"{change:.2f}%" if change is not None else "n/a"
+        news_html = "".join(
+            f"<br><a href='{news['url']}' target='_blank'>📰 {news['news_text']}</a>"
+            for news in item["news_items"]
+        )
+        rows_html += f"""
+          <tr style="border-bottom: 1px solid #eee;">
+            <td style="padding: 6px;"><strong>{item['company_id']}</strong></td>
+            <td style="padding: 6px; color: {trend_color};">{(trend or "n/a").title()}</td>
+            <td style="padding: 6px;">{change_text}</td>
+            <td style="padding: 6px;">{item['time']}</td>
+            <td style="padding: 6px; font-size: 0.9em;">{item['reasons'] or ''}{news_html}</td>
+          </tr>"""
+
+    tickers = sorted({item["company_id"] for item in items})
+    return f"""
+    <html>
+  <body style="margin: 0; padding: 0; font-family: 'Segoe UI', sans-serif; background-color: #e6ecf0;">
+    <div style="
+      max-width: 700px;
+      margin: 40px auto;
+      border-radius: 12px;
+      overflow: hidden;
+      box-shadow: 0 0 10px rgba(0,0,0,0.15);
+      background-color: white;
+    ">
+      <div style="padding: 30px;">
+        <h2>📈 Alert digest: {len(items)} event(s)</h2>
+        <table style="width: 100%; border-collapse: collapse; text-align: left;">
+          <tr><th>Ticker</th><th>Trend</th><th>Change</th><th>Time</th><th>Matched</th></tr>
+          {rows_html}
+        </table>
+      </div>
+      <div style="
+        background-color: #333;
+        color: white;
+        text-align: center;
+        font-size: 0.7em;
+        padding: 8px 12px;
+        border-top: 1px solid #222;
+      ">
+        You are receiving this digest because you're tracking <strong>{', '.join(tickers)}</strong>. Stay sharp. Stay informed. ⚡
+      </div>
+    </div>
+  </body>
+</html>
+    """
+
 
 def send_email(to_email, subject, html_body):
+    """
+    Sends an HTML email. Returns True on success, False otherwise.
+    """
+    import smtplib
+    from email.message import EmailMessage
+
+    start = time_module.perf_counter()
     try:
         msg = EmailMessage()
         msg['Subject'] = subject
@@ -92,83 +156,396 @@ def send_email(to_email, subject, html_body):
             server.login(SMTP_USERNAME, SMTP_PASSWORD)
             server.send_message(msg)
 
-        logger.info(f"📤 Email sent to {to_email}")
+        metrics.NOTIFICATIONS_SENT_OK.inc()
+        logs.sampled(logger, logging.INFO, "📤 Email sent to %s", to_email)
+        return True
     except Exception as e:
-        logger.error(f"❌ Failed to send email to {to_email}: {e}")
+        metrics.NOTIFICATIONS_SENT_FAILED.inc()
+        logger.error("❌ Failed to send email to %s: %s", to_email, e)
+        return False
+    finally:
+        metrics.SMTP_SEND_SECONDS.observe(time_module.perf_counter() - start)
+
+# Advisory lock namespace of the per-shard locks: pg_try_advisory_lock(NAMESPACE, shard)
+SHARD_LOCK_NAMESPACE = 7101
+WAKEUP_CHANNEL = "notifier_wakeup"
+
+
+def fetch_price_events(conn, after_id, up_to_id, tickers, batch_rows=None):
+    """
+    Yields lists of at most NOTIFIER_BATCH_ROWS price samples of the given tickers, in
+    id order, with the previous sample and the recent average volume that the rules
+    compare against: those with after_id < id <= up_to_id, plus those below the
+    watermark stored or linked to late news in the last NOTIFIER_RESCAN_MINUTES (an id
+    is taken before its insert commits, so a sample can appear behind the watermark).
+    Read through a server-side cursor, so only one batch is in memory; `conn` must not
+    be committed while the batches are consumed.
+    """
+    batch_rows = batch_rows or config.NOTIFIER_BATCH_ROWS
+    cursor = conn.cursor(name="notifier_price_events")
+    cursor.itersize = batch_rows
+    cursor.execute("""
+        WITH candidates AS (
+            SELECT id FROM prices
+            WHERE id > %(after_id)s AND id <= %(up_to_id)s
+            UNION
+            SELECT id FROM prices
+            WHERE company_id = ANY(%(tickers)s)
+              AND time >= NOW() - make_interval(mins => %(rescan)s)
+              AND id <= %(up_to_id)s
+            UNION
+            SELECT id FROM prices
+            WHERE news_linked_at >= NOW() - make_interval(mins => %(rescan)s)
+              AND id <= %(up_to_id)s
+        )
+        SELECT p.id, p.company_id, p.time, p.price, p.trend, p.change_percent, p.volume,
+               p.is_trend_change, p.news_related,
+               prev.price, prev.change_percent, vol.avg_volume
+        FROM candidates
+        JOIN prices p USING (id)
+        LEFT JOIN LATERAL (
+            SELECT q.price, q.change_percent FROM prices q
+            WHERE q.company_id = p.company_id AND q.time < p.time
+            ORDER BY q.time DESC
+            LIMIT 1
+        ) prev ON TRUE
+        LEFT JOIN LATERAL (
+            SELECT avg(v.volume)::float AS avg_volume FROM (
+                SELECT q.volume FROM prices q
+                WHERE q.company_id = p.company_id AND q.time < p.time AND q.volume IS NOT NULL
+                ORDER BY q.time DESC
+                LIMIT %(volume_samples)s
+            ) v
+        ) vol ON TRUE
+        WHERE p.company_id = ANY(%(tickers)s)
+        ORDER BY p.id
+    """, {
+        "after_id": after_id,
+        "up_to_id": up_to_id,
+        "tickers": list(tickers),
+        "rescan": config.NOTIFIER_RESCAN_MINUTES,
+        "volume_samples": config.VOLUME_AVERAGE_SAMPLES,
+    })
+    try:
+        while True:
+            rows = cursor.fetchmany(batch_rows)
+            if not rows:
+                break
+            yield [rules.PriceEvent(*row) for row in rows]
+    finally:
+        cursor.close()
+        conn.rollback()
+
+
+def load_rules(cursor, shard=0, shards=1):
+    """
+    Active alerts of active campaigns of the users in one shard (user_id mod shards),
+    compiled and indexed.
+    """
+    cursor.execute("""
+        SELECT a.id, a.user_id, u.email, c.company_id, a.alert_type, a.alert_condition,
+               a.threshold, a.news_only, COALESCE(a.delivery, u.delivery) = 'digest', a.created_at
+        FROM alerts a
+        JOIN campaigns c ON c.id = a.campaign_id
+        JOIN users u ON u.id = a.user_id
+        WHERE a.is_active = TRUE
+          AND c.is_active = TRUE
+          AND mod(a.user_id, %s) = %s
+    """, (shards, shard))
+
+    index = rules.RuleIndex()
+    for (alert_id, user_id, email, company_id, alert_type, direction, threshold, news_only, digest,
+         created_at) in cursor.fetchall():
+        alert_type = alert_type or "trend_change"
+        direction = direction or "all"
+        error = rules.validate_alert(alert_type, direction, threshold)
+        if error:
+            logger.warning("⚠️ Skipping alert %s: %s", alert_id, error)
+            continue
+        index.add(rules.Rule(
+            alert_id, user_id, email, company_id, alert_type, direction, threshold, news_only, digest,
+            created_at
+        ))
+    return index
+
+
+def fetch_related_news(cursor, price_ids):
+    """
+    price_id -> [{"news_text", "url"}] for the given prices, newest news first.
+    """
+    if not price_ids:
+        return {}
+    cursor.execute("""
+        SELECT pn.price_id, n.url, n.news_text
+        FROM price_news pn
+        JOIN news_data n ON n.id = pn.news_id
+        WHERE pn.price_id = ANY(%s)
+        ORDER BY n.time DESC
+    """, (list(price_ids),))
+    news = {}
+    for price_id, url, text in cursor.fetchall():
+        news.setdefault(price_id, []).append({"news_text": text, "url": url})
+    return news
+
+
+def send_due_digests(conn, shard=0, shards=1):
+    """
+    Sends one email per user of the shard whose pending digest matches are due: every
+    run for a window of 0, otherwise once the oldest pending match is older than the
+    window. Returns the number of digests sent.
+    """
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT n.user_id, u.email
+        FROM notifications n
+        JOIN users u ON u.id = n.user_id
+        WHERE n.sent_at IS NULL
+          AND mod(n.user_id, %s) = %s
+        GROUP BY n.user_id, u.email, u.digest_window_minutes
+        HAVING min(n.created_at) <= NOW() - make_interval(mins => u.digest_window_minutes)
+    """, (shards, shard))
+    due = cursor.fetchall()
+
+    sent = 0
+    for user_id, email in due:
+        cursor.execute("""
+            SELECT n.id, p.id, p.company_id, p.time, p.trend, p.change_percent, n.reasons
+            FROM notifications n
+            JOIN prices p ON p.id = n.price_id
+            WHERE n.user_id = %s AND n.sent_at IS NULL
+            ORDER BY p.time, p.company_id
+        """, (user_id,))
+        pending = cursor.fetchall()
+        news_by_price = fetch_related_news(cursor, {row[1] for row in pending})
+
+        html_body = render_digest_template([
+            {
+                "company_id": company_id,
+                "trend": trend,
+                "change_percent": change_percent,
+                "time": time.strftime("%Y-%m-%d %H:%M"),
+                "reasons": reasons,
+                "news_items": news_by_price.get(price_id, []),
+            }
+            for _, price_id, company_id, time, trend, change_percent, reasons in pending
+        ])
+        tickers = sorted({row[2] for row in pending})
+        subject = f"📈 Stock Alert digest: {len(pending)} event(s) for {', '.join(tickers[:5])}"
+        if len(tickers) > 5:
+            subject += f" +{len(tickers) - 5}"
+
+        # Left pending on failure, so the next run retries
+        if send_email(email, subject, html_body):
+            cursor.execute(
+                "UPDATE notifications SET sent_at = NOW() WHERE id = ANY(%s)",
+                ([row[0] for row in pending],),
+            )
+            sent += 1
+        conn.commit()
+
+    cursor.close()
+    return sent
+
+
+def try_lock_shard(cursor, shard):
+    """
+    Takes the session advisory lock of a shard without waiting; True if acquired.
+    """
+    cursor.execute("SELECT pg_try_advisory_lock(%s, %s)", (SHARD_LOCK_NAMESPACE, shard))
+    return cursor.fetchone()[0]
+
+
+def unlock_shard(cursor, shard):
+    cursor.execute("SELECT pg_advisory_unlock(%s, %s)", (SHARD_LOCK_NAMESPACE, shard))
+
+
+def wake_workers(conn):
+    """
+    Tells notifier workers (notifier_worker.py) that new prices were stored.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_notify(%s, '')", (WAKEUP_CHANNEL,))
+    conn.commit()
+    cursor.close()
+
 
 def check_and_notify():
+    """
+    Processes every shard in this process (shards owned by running notifier
+    workers are skipped). A failing shard is logged and the others still run.
+    """
+    conn = None
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
+        for shard in range(config.NOTIFIER_SHARDS):
+            if not try_lock_shard(cursor, shard):
+                logger.debug("Shard %d is owned by a notifier worker, skipped", shard)
+                continue
+            try:
+                # Profiled per shard: the same statements repeat once per shard by design
+                with db.profile(f"notificator shard {shard}", logging.DEBUG):
+                    notify_shard(conn, shard, config.NOTIFIER_SHARDS)
+            except Exception as e:
+                # Ends the failed transaction, so the lock can be released
+                conn.rollback()
+                logger.error("❌ Shard %d failed: %s", shard, e)
+            unlock_shard(cursor, shard)
+            conn.commit()
+        cursor.close()
+    except Exception as e:
+        logger.error("❌ Error in notificator: %s", e)
+    finally:
+        if conn is not None:
+            conn.close()
+
 
+def save_watermark(cursor, shard, last_price_id):
+    cursor.execute("""
+        INSERT INTO notifier_state (shard, last_price_id) VALUES (%s, %s)
+        ON CONFLICT (shard) DO UPDATE SET last_price_id = EXCLUDED.last_price_id
+    """, (shard, last_price_id))
+
+
+def notify_events(cursor, index, events, watermark=None):
+    """
+    Matches one batch of price events against the rules, records the notifications
+    and emails the immediate ones. Events at or below `watermark` are re-scanned ones
+    and only match alerts created no later than the price. Returns (matches, sent, digested).
+    """
+    # Re-scanned samples were mostly handled by an earlier run
+    cursor.execute(
+        "SELECT price_id, user_id FROM notifications WHERE price_id = ANY(%s)",
+        ([event.price_id for event in events],),
+    )
+    handled = set(cursor.fetchall())
+
+    # (price_id, user_id) -> (event, email, [matched rules])
+    matches = {}
+    for event in events:
+        rescanned = watermark is not None and event.price_id <= watermark
+        for rule in index.match(event):
+            key = (event.price_id, rule.user_id)
+            if key in handled:
+                continue
+            # A re-scanned sample predating the alert would otherwise fire a new alert on old prices
+            if rescanned and rule.created_at is not None and rule.created_at > event.time:
+                continue
+            if key not in matches:
+                matches[key] = (event, rule.email, [])
+            matches[key][2].append(rule)
+
+    news_by_price = fetch_related_news(
+        cursor, {event.price_id for event, _, _ in matches.values() if event.news_related}
+    )
+
+    sent = 0
+    digested = 0
+    for (price_id, user_id), (event, email, matched) in matches.items():
+        trend = event.trend or "n/a"
+        reasons = [rule.describe() for rule in matched]
+        # Queued for the user's digest unless one of the matched alerts is immediate
+        digest = all(rule.digest for rule in matched)
+
+        # Recorded as pending before sending; an existing row means this price was already handled
         cursor.execute("""
-            SELECT 
-                p.id, p.company_id, p.time, p.trend, p.change_percent,
-                a.user_id, u.email, p.news_related
-            FROM prices p
-            JOIN campaigns c ON c.company_id = p.company_id
-            JOIN alerts a ON a.campaign_id = c.id AND a.is_active = TRUE
-            JOIN users u ON a.user_id = u.id
-            WHERE p.is_trend_change = TRUE
-              AND c.is_active = TRUE
-              AND NOT EXISTS (
-                  SELECT 1 FROM notifications n WHERE n.price_id = p.id AND n.user_id = a.user_id
-              )
-                       AND (
-            a.alert_condition = 'all'
-            OR (a.alert_condition = 'up' AND p.trend = 'up')
-            OR (a.alert_condition = 'down' AND p.trend = 'down')
-        and p.news_related = True
-)
-        """)
-
-        results = cursor.fetchall()
-
-        for row in results:
-            price_id, company_id, time, trend, change_percent, user_id, email, news_related = row
-
-            logger.info(f"🔔 Alert: {company_id} trend → {trend} ({change_percent:.2f}%)")
-            logger.info(f"👤 Notify user: {email}")
-
-            news_rows = []
-            if news_related:
-                query = """
-                    SELECT url, news_text
-                    FROM news_data
-                    WHERE company_id = %s AND time BETWEEN %s AND %s
-                    ORDER BY time DESC
-                """
-
-                time_from = (time - timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
-                time_to = (time + timedelta(minutes=30)).strftime("%Y-%m-%d %H:%M:%S")
-
-                cursor.execute(query, (company_id, time_from, time_to))
-                news_rows = cursor.fetchall()
-
-
-            html_body = render_email_template(
-                company_id=company_id,
-                trend=trend,
-                change_percent=change_percent,
-                time=time.strftime("%Y-%m-%d %H:%M"),
-                news_items=[{"news_text": t, "url": u} for u, t in news_rows] if news_rows else []
-            )
-            print(html_body)
-            send_email(email, f"📈 Stock Alert: {company_id} → {trend.upper()}", html_body)
+            INSERT INTO notifications (price_id, user_id, sent_at, reasons)
+            VALUES (%s, %s, NULL, %s)
+            ON CONFLICT (price_id, user_id) DO NOTHING
+            RETURNING id
+        """, (price_id, user_id, "; ".join(reasons)))
+        row = cursor.fetchone()
+        if row is None:
+            continue
+        if digest:
+            digested += 1
+            continue
 
-            cursor.execute("""
-                INSERT INTO notifications (price_id, user_id)
-                VALUES (%s, %s)
-            """, (price_id, user_id))
+        logs.sampled(
+            logger, logging.INFO, "🔔 Alert: %s trend → %s (%s), notifying %s",
+            event.company_id, trend, "; ".join(reasons), email,
+        )
 
-        conn.commit()
-        cursor.close()
-        conn.close()
-        logger.info(f"✅ Sent {len(results)} notification(s)")
+        html_body = render_email_template(
+            company_id=event.company_id,
+            trend=event.trend,
+            change_percent=event.change_percent,
+            time=event.time.strftime("%Y-%m-%d %H:%M"),
+            news_items=news_by_price.get(price_id, []),
+            reasons=reasons,
+        )
+        # A failed send stays pending and goes out with the user's next digest (send_due_digests)
+        if send_email(email, f"📈 Stock Alert: {event.company_id} → {trend.upper()}", html_body):
+            cursor.execute("UPDATE notifications SET sent_at = NOW() WHERE id = %s", (row[0],))
+            sent += 1
+    return len(matches), sent, digested
+
+
+def notify_shard(conn, shard, shards):
+    """
+    Evaluates the prices stored since the shard's watermark (and the recent ones
+    behind it, see fetch_price_events) against the alert rules of the shard's users
+    and emails every matching user once per price.
+
+    Prices are streamed in NOTIFIER_BATCH_ROWS batches from a second connection, and
+    each batch's notifications are committed together with the watermark, so memory
+    does not grow with the backlog and an interrupted run resumes after the last
+    committed batch. The caller must hold the shard's advisory lock.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT last_price_id FROM notifier_state WHERE shard = %s FOR UPDATE", (shard,))
+    row = cursor.fetchone()
+    if row:
+        last_price_id = row[0]
+    else:
+        # Shard added by raising NOTIFIER_SHARDS: start from the slowest shard,
+        # notifications already sent are skipped by their unique index
+        cursor.execute("SELECT COALESCE(min(last_price_id), 0) FROM notifier_state")
+        last_price_id = cursor.fetchone()[0]
+    cursor.execute("SELECT COALESCE(max(id), %s) FROM prices", (last_price_id,))
+    up_to_id = cursor.fetchone()[0]
+
+    index = load_rules(cursor, shard, shards)
+
+    events = 0
+    sent = 0
+    digested = 0
+    if index.size:
+        # The server-side cursor lives in its own transaction, which the per-batch commits do not end
+        read_conn = get_db_connection()
+        batches = fetch_price_events(read_conn, last_price_id, up_to_id, index.tickers())
+        try:
+            for batch in batches:
+                matched, batch_sent, batch_digested = notify_events(cursor, index, batch, last_price_id)
+                # Re-scanned samples are behind the watermark; it only moves forward
+                save_watermark(cursor, shard, max(last_price_id, batch[-1].price_id))
+                conn.commit()
+                events += len(batch)
+                sent += batch_sent
+                digested += batch_digested
+                metrics.NOTIFICATIONS_EVALUATED_TOTAL.inc(len(batch))
+                metrics.NOTIFICATIONS_MATCHED_TOTAL.inc(matched)
+                metrics.NOTIFICATIONS_DIGESTED_TOTAL.inc(batch_digested)
+        finally:
+            # Closes the server-side cursor while its connection is still open
+            batches.close()
+            read_conn.close()
+
+    save_watermark(cursor, shard, up_to_id)
+    conn.commit()
+    cursor.close()
+
+    digests = send_due_digests(conn, shard, shards)
+    if events or digests:
+        logger.info(
+            "✅ Shard %d: sent %d notification(s) and %d digest(s) for %d price event(s), %d rule(s); "
+            "%d match(es) queued for digests",
+            shard, sent, digests, events, index.size, digested,
+        )
+    return sent + digests
 
-    except Exception as e:
-        logger.error(f"❌ Error in notificator: {e}")
 
 if __name__ == "__main__":
+    configure_logging()
     logger.info("🚀 Notificator started")
     check_and_notify()
@@ -0,0 +1,155 @@
+"""
+Sharded notificator worker. Run N of these to scale notification throughput:
+
+    python notifier_worker.py
+
+Users are split into NOTIFIER_SHARDS shards (user_id mod shards). Each worker
+heartbeats into notifier_workers and wants the shards that rendezvous hashing
+assigns to it among the live workers, so when a worker joins or leaves only
+its share of shards moves. A shard is processed only under its Postgres
+advisory lock (held by the worker's session), so two workers never process the
+same shard even while their views of the membership differ; a crashed worker's
+locks are released with its connection.
+
+Workers wake up on NOTIFY notifier_wakeup (sent by the pipeline after each
+collection with NOTIFIER_INLINE=0) or every NOTIFIER_POLL_SECONDS.
+"""
+import hashlib
+import logging
+import os
+import select
+import signal
+import socket
+import threading
+
+import config
+import db
+import notificator
+from db import get_db_connection
+
+logger = logging.getLogger("notifier_worker")
+
+stop_event = threading.Event()
+
+
+def shard_owner(shard, workers):
+    """
+    Rendezvous (highest random weight) hashing: the live worker that owns a shard.
+    """
+    return max(
+        workers,
+        key=lambda worker: hashlib.blake2b(f"{worker}:{shard}".encode(), digest_size=8).digest(),
+    )
+
+
+def wanted_shards(worker_id, workers, shards):
+    return {shard for shard in range(shards) if shard_owner(shard, workers) == worker_id}
+
+
+class NotifierWorker:
+    def __init__(self, worker_id=None, shards=None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.shards = shards or config.NOTIFIER_SHARDS
+        self.owned = set()
+        # Session that holds the shard locks, heartbeats and LISTENs
+        self.control = get_db_connection()
+        self.control.autocommit = True
+        # Session that does the notification work (transactions)
+        self.work = get_db_connection()
+
+    def heartbeat(self):
+        """
+        Records this worker as alive, forgets dead ones and returns the live worker ids.
+        """
+        cursor = self.control.cursor()
+        cursor.execute("""
+            INSERT INTO notifier_workers (worker_id, heartbeat_at, shards)
+            VALUES (%s, NOW(), %s)
+            ON CONFLICT (worker_id) DO UPDATE SET heartbeat_at = NOW(), shards = EXCLUDED.shards
+        """, (self.worker_id, sorted(self.owned)))
+        cursor.execute("""
+            DELETE FROM notifier_workers
+            WHERE heartbeat_at < NOW() - make_interval(secs => %s)
+        """, (config.NOTIFIER_WORKER_TTL_SECONDS * 10,))
+        cursor.execute("""
+            SELECT worker_id FROM notifier_workers
+            WHERE heartbeat_at >= NOW() - make_interval(secs => %s)
+        """, (config.NOTIFIER_WORKER_TTL_SECONDS,))
+        workers = [row[0] for row in cursor.fetchall()]
+        cursor.close()
+        return workers
+
+    def rebalance(self, workers):
+        """
+        Releases shards now assigned to other workers and locks newly assigned ones.
+        A shard whose previous owner has not released it yet is retried next loop.
+        """
+        wanted = wanted_shards(self.worker_id, workers, self.shards)
+        cursor = self.control.cursor()
+        for shard in sorted(self.owned - wanted):
+            notificator.unlock_shard(cursor, shard)
+            self.owned.discard(shard)
+        for shard in sorted(wanted - self.owned):
+            if notificator.try_lock_shard(cursor, shard):
+                self.owned.add(shard)
+        cursor.close()
+        if self.owned != wanted:
+            logger.info("Waiting for shards %s to be released", sorted(wanted - self.owned))
+
+    def process(self):
+        sent = 0
+        for shard in sorted(self.owned):
+            try:
+                with db.profile(f"notifier_worker shard {shard}", logging.DEBUG):
+                    sent += notificator.notify_shard(self.work, shard, self.shards)
+            except Exception as e:
+                self.work.rollback()
+                logger.error("❌ Shard %d failed: %s", shard, e)
+        return sent
+
+    def wait(self, timeout):
+        """
+        Blocks until a wakeup notification or the timeout.
+        """
+        if select.select([self.control], [], [], timeout) != ([], [], []):
+            self.control.poll()
+            self.control.notifies.clear()
+
+    def run(self):
+        cursor = self.control.cursor()
+        cursor.execute(f"LISTEN {notificator.WAKEUP_CHANNEL}")
+        cursor.close()
+        logger.info("🚀 Notifier worker %s started (%d shards)", self.worker_id, self.shards)
+        try:
+            while not stop_event.is_set():
+                before = set(self.owned)
+                self.rebalance(self.heartbeat())
+                if self.owned != before:
+                    logger.info("Owns shards %s", sorted(self.owned))
+                self.process()
+                self.wait(config.NOTIFIER_POLL_SECONDS)
+        finally:
+            self.stop()
+
+    def stop(self):
+        try:
+            cursor = self.control.cursor()
+            cursor.execute("DELETE FROM notifier_workers WHERE worker_id = %s", (self.worker_id,))
+            cursor.close()
+        finally:
+            # Closing the session releases the shard locks
+            self.control.close()
+            self.work.close()
+        logger.info("Notifier worker %s stopped", self.worker_id)
+
+
+def handle_stop(signum, frame):
+    logger.info("Received signal %s, stopping after the current pass", signum)
+    stop_event.set()
+
+
+if __name__ == "__main__":
+    notificator.configure_logging()
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    NotifierWorker().run()
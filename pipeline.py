@@ -0,0 +1,172 @@
+"""
+Dedicated pipeline process: runs the collector and the notificator on a schedule,
+separately from the API workers. Every PIPELINE_TICK_SECONDS it runs the queued
+on-demand collection job (POST /collect, see collect_jobs.py), or collects the
+tickers due for a poll under their adaptive intervals (polling.py).
+
+    python pipeline.py          # loop forever
+    python pipeline.py --once   # single collect + notify run of the due tickers (e.g. from cron)
+
+Tables must exist (python manage.py init-db).
+"""
+import argparse
+import logging
+import signal
+import threading
+import time as time_module
+from datetime import datetime
+
+import pytz
+from prometheus_client import start_http_server
+
+import collector
+import config
+import notificator
+import polling
+import price_cache
+import rollups
+from db import get_db_connection
+
+logger = logging.getLogger("pipeline")
+
+stop_event = threading.Event()
+
+
+def is_market_open():
+    # Задаємо часову зону ринку — Нью-Йорк
+    eastern = pytz.timezone('US/Eastern')
+    now = datetime.now(eastern)
+
+    # Перевірка чи це будній день (0=Пн, 6=Нд)
+    if now.weekday() >= 5:
+        return False
+
+    # Перевірка чи в межах робочих годин (9:30 – 16:00)
+    market_open = now.replace(hour=9, minute=30, second=0, microsecond=0)
+    market_close = now.replace(hour=16, minute=0, second=0, microsecond=0)
+
+    return market_open <= now <= market_close
+
+
+def run_once(market_open=True):
+    """
+    Runs the queued on-demand collection job (POST /collect) or, while the market is
+    open, collects the tickers due for a poll; then notifies about the new prices.
+    """
+    collected = collector.run_queued_job()
+    if collected is None and market_open:
+        collected = collector.main()
+    if not collected:
+        return
+    logger.info("✅ Collected %d ticker(s)", collected)
+    if config.NOTIFIER_INLINE:
+        logger.info("▶️ Sending notifications...")
+        notificator.check_and_notify()
+        logger.info("✅ Notifications sent")
+    else:
+        # Notifier workers (notifier_worker.py) pick the new prices up
+        conn = get_db_connection()
+        try:
+            notificator.wake_workers(conn)
+        finally:
+            conn.close()
+        logger.info("🔔 Notifier workers woken")
+
+
+def prune_old_prices():
+    """
+    Deletes raw prices past PRICE_RETENTION_DAYS (rollups are kept). Runs at most once a day.
+    With ARCHIVE_BEFORE_PRUNE, complete months are archived to Parquet first and only
+    archived months are deleted.
+    """
+    today = datetime.now(pytz.UTC).date()
+    if config.PRICE_RETENTION_DAYS <= 0 or getattr(prune_old_prices, "_last_run", None) == today:
+        return
+    prune_old_prices._last_run = today
+    conn = None
+    try:
+        conn = get_db_connection()
+        archived_until = None
+        if config.ARCHIVE_BEFORE_PRUNE:
+            import export
+
+            archived_until = export.archive_months(
+                conn, "prices", rollups.retention_horizon(config.PRICE_RETENTION_DAYS)
+            )
+        rollups.prune(conn, config.PRICE_RETENTION_DAYS, not_after=archived_until)
+    except Exception:
+        logger.exception("❌ Pruning failed")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def refresh_poll_intervals():
+    """
+    Recomputes the per-ticker polling intervals, at most every POLL_REFRESH_SECONDS.
+    """
+    now = time_module.monotonic()
+    last_run = getattr(refresh_poll_intervals, "_last_run", None)
+    if last_run is not None and now - last_run < config.POLL_REFRESH_SECONDS:
+        return
+    refresh_poll_intervals._last_run = now
+    conn = None
+    try:
+        conn = get_db_connection()
+        polling.refresh_intervals(conn)
+    except Exception:
+        logger.exception("❌ Refreshing poll intervals failed")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+def run_forever():
+    market_was_open = None
+    while not stop_event.is_set():
+        prune_old_prices()
+        market_open = is_market_open()
+        if market_open != market_was_open:
+            if market_open:
+                logger.info("Market is OPEN.")
+            else:
+                logger.info("⏸️ Market is CLOSED. Skipping scheduled runs (on-demand jobs still run).")
+            market_was_open = market_open
+        try:
+            if market_open:
+                refresh_poll_intervals()
+            run_once(market_open)
+        except Exception:
+            logger.exception("❌ Pipeline run failed")
+        # Tickers are collected when due (polling.py), so wake up often
+        stop_event.wait(config.PIPELINE_TICK_SECONDS)
+
+
+def handle_stop(signum, frame):
+    logger.info("Received signal %d, stopping after the current run", signum)
+    stop_event.set()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Collector + notificator pipeline")
+    arg_parser.add_argument("--once", action="store_true", help="run a single collect + notify pass and exit")
+    args = arg_parser.parse_args()
+
+    collector.configure_logging()
+    # Warms the in-memory price history and follows inserts made by other processes
+    price_cache.ensure_listener(price_cache.price_store, get_db_connection)
+    if args.once:
+        refresh_poll_intervals()
+        run_once()
+        return
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    # The pipeline has its own metrics endpoint, separate from the API's /metrics
+    start_http_server(config.PIPELINE_METRICS_PORT)
+    logger.info("Metrics on :%d/metrics", config.PIPELINE_METRICS_PORT)
+    run_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Adaptive per-ticker price polling cadence.
+
+Every ticker gets its own interval between POLL_MIN_SECONDS and
+POLL_MAX_SECONDS (tickers.poll_interval_seconds), shorter the more there is to
+catch. Over the last POLL_LOOKBACK_HOURS:
+
+    volatility     realized volatility per hour (% moves between samples,
+                   normalized by their spacing)
+    trend flips    trend changes per hour
+    subscribers    users with active alerts on the ticker
+
+    activity = (1 + volatility / POLL_VOLATILITY_REF_PERCENT) * (1 + flips) * sqrt(subscribers)
+    interval = POLL_MAX_SECONDS / activity, clamped to the bounds
+
+With POLL_REQUESTS_PER_HOUR set, all intervals are stretched by one common
+factor until the planned polls fit the budget, so the budget keeps going to
+the most active tickers. Tickers without history use COLLECT_INTERVAL_SECONDS.
+
+The pipeline ticks every PIPELINE_TICK_SECONDS and the collector only fetches
+tickers whose tickers.next_poll_at is due.
+"""
+import logging
+import math
+
+import config
+import metrics
+
+logger = logging.getLogger("polling")
+
+
+def activity(volatility, flips_per_hour, subscribers):
+    return (
+        (1 + (volatility or 0) / config.POLL_VOLATILITY_REF_PERCENT)
+        * (1 + (flips_per_hour or 0))
+        * math.sqrt(max(subscribers or 0, 1))
+    )
+
+
+def _clamp(seconds):
+    return min(max(seconds, config.POLL_MIN_SECONDS), config.POLL_MAX_SECONDS)
+
+
+def _polls_per_hour(intervals):
+    return sum(3600 / seconds for seconds in intervals.values())
+
+
+def assign_intervals(stats, budget_per_hour=None):
+    """
+    {ticker: interval seconds} for {ticker: (volatility, flips per hour, subscribers)}
+    (stats None for a ticker without history), within the request budget if any.
+    """
+    budget_per_hour = config.POLL_REQUESTS_PER_HOUR if budget_per_hour is None else budget_per_hour
+    base = {
+        ticker: config.POLL_MAX_SECONDS / activity(*values) if values else config.COLLECT_INTERVAL_SECONDS
+        for ticker, values in stats.items()
+    }
+    intervals = {ticker: _clamp(seconds) for ticker, seconds in base.items()}
+    if not budget_per_hour or _polls_per_hour(intervals) <= budget_per_hour:
+        return intervals
+
+    slowest = {ticker: config.POLL_MAX_SECONDS for ticker in base}
+    if _polls_per_hour(slowest) > budget_per_hour:
+        logger.warning(
+            "POLL_REQUESTS_PER_HOUR=%s is below one poll per POLL_MAX_SECONDS "
+            "for %d tickers, polling all at the maximum interval",
+            budget_per_hour, len(base),
+        )
+        return slowest
+
+    # The smallest common stretch factor that fits the budget (polls/hour only falls as it grows).
+    # At the upper bound every ticker is at POLL_MAX_SECONDS, which fits as checked above;
+    # it is taken from the unclamped intervals, which may be far below POLL_MIN_SECONDS
+    low, high = 1.0, max(1.0, config.POLL_MAX_SECONDS / min(base.values()))
+    for _ in range(40):
+        factor = (low + high) / 2
+        if _polls_per_hour({t: _clamp(s * factor) for t, s in base.items()}) > budget_per_hour:
+            low = factor
+        else:
+            high = factor
+    return {ticker: _clamp(seconds * high) for ticker, seconds in base.items()}
+
+
+def load_stats(cursor):
+    """
+    {ticker: (volatility %/hour, trend flips/hour, subscribers) or None} for the
+    tickers of active campaigns.
+    """
+    cursor.execute("""
+        WITH active AS (
+            SELECT c.company_id, count(DISTINCT a.user_id) AS subscribers
+            FROM campaigns c
+            LEFT JOIN alerts a ON a.campaign_id = c.id AND a.is_active
+            WHERE c.is_active
+            GROUP BY c.company_id
+        ),
+        steps AS (
+            SELECT p.company_id, p.is_trend_change,
+                   (p.price / NULLIF(lag(p.price) OVER w, 0) - 1) * 100 AS move,
+                   extract(epoch FROM p.time - lag(p.time) OVER w)::float / 3600 AS hours
+            FROM prices p
+            JOIN active USING (company_id)
+            WHERE p.time > NOW() - make_interval(hours => %s)
+            WINDOW w AS (PARTITION BY p.company_id ORDER BY p.time)
+        ),
+        history AS (
+            SELECT company_id,
+                   sqrt(sum(move * move) / NULLIF(sum(hours), 0)) AS volatility,
+                   count(*) FILTER (WHERE is_trend_change)::float / NULLIF(sum(hours), 0) AS flips_per_hour
+            FROM steps
+            WHERE hours > 0
+            GROUP BY company_id
+        )
+        SELECT a.company_id, h.volatility, h.flips_per_hour, a.subscribers, h.company_id IS NOT NULL
+        FROM active a
+        LEFT JOIN history h USING (company_id)
+    """, (config.POLL_LOOKBACK_HOURS,))
+    return {
+        ticker: (volatility, flips_per_hour, subscribers) if has_history else None
+        for ticker, volatility, flips_per_hour, subscribers, has_history in cursor.fetchall()
+    }
+
+
+def refresh_intervals(conn):
+    """
+    Recomputes and stores every active ticker's polling interval. Returns {ticker: seconds}.
+    """
+    cursor = conn.cursor()
+    intervals = assign_intervals(load_stats(cursor))
+    if intervals:
+        cursor.execute("""
+            INSERT INTO tickers AS t (symbol, poll_interval_seconds)
+            SELECT * FROM unnest(%s::text[], %s::int[])
+            ON CONFLICT (symbol) DO UPDATE SET
+                poll_interval_seconds = EXCLUDED.poll_interval_seconds,
+                -- A shorter interval applies right away, not after the old one ran out
+                -- (LEAST ignores NULL: a ticker never polled stays due)
+                next_poll_at = CASE WHEN t.next_poll_at IS NOT NULL THEN
+                    LEAST(t.next_poll_at, NOW() + make_interval(secs => EXCLUDED.poll_interval_seconds))
+                END
+        """, (list(intervals), [round(seconds) for seconds in intervals.values()]))
+    conn.commit()
+    cursor.close()
+
+    planned = _polls_per_hour(intervals)
+    metrics.POLL_PLANNED_REQUESTS_PER_HOUR.set(planned)
+    if intervals:
+        fastest = min(intervals, key=intervals.get)
+        logger.info(
+            "Polling %d tickers, %.0f price requests/hour planned (fastest %s every %.0fs)",
+            len(intervals), planned, fastest, intervals[fastest],
+        )
+    return intervals
+
+
+def schedule_next(conn, tickers):
+    """
+    Sets the next poll of the just collected tickers one interval from now.
+    Half a pipeline tick early, so a tick that starts slightly late does not skip one.
+    """
+    if not tickers:
+        return
+    cursor = conn.cursor()
+    cursor.execute("""
+        INSERT INTO tickers AS t (symbol, next_poll_at)
+        SELECT symbol, NOW() + make_interval(secs => %(default)s - %(slack)s)
+        FROM unnest(%(symbols)s::text[]) AS symbol
+        ON CONFLICT (symbol) DO UPDATE SET
+            next_poll_at = NOW() + make_interval(
+                secs => GREATEST(COALESCE(t.poll_interval_seconds, %(default)s) - %(slack)s, 0)
+            )
+    """, {
+        "symbols": list(tickers),
+        "default": config.COLLECT_INTERVAL_SECONDS,
+        "slack": config.PIPELINE_TICK_SECONDS / 2,
+    })
+    conn.commit()
+    cursor.close()
@@ -0,0 +1,320 @@
+"""
+In-process store of the last N price samples per ticker.
+
+Each ticker owns a ring buffer of preallocated typed arrays, so memory is fixed
+per ticker (about 34 bytes per sample) and latest-value / short-window lookups
+are plain memory reads instead of Postgres queries.
+
+The pipeline process updates its store directly on every insert. API workers
+keep theirs in sync by LISTENing to the `price_events` channel that
+store_price notifies on.
+"""
+import json
+import logging
+import math
+import os
+import select
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+from dateutil import parser
+
+import config
+
+logger = logging.getLogger("price_cache")
+
+CHANNEL = "price_events"
+
+TREND_CODES = {"flat": 0, "up": 1, "down": -1}
+TREND_NAMES = {code: name for name, code in TREND_CODES.items()}
+TREND_UNKNOWN = -128
+
+FLAG_TREND_CHANGE = 1
+FLAG_NEWS_RELATED = 2
+
+MISSING_VOLUME = -1
+
+
+class PriceSample:
+    __slots__ = ("time", "price", "volume", "change_percent", "trend", "is_trend_change", "news_related")
+
+    def __init__(self, time, price, volume, change_percent, trend, is_trend_change, news_related):
+        self.time = time
+        self.price = price
+        self.volume = volume
+        self.change_percent = change_percent
+        self.trend = trend
+        self.is_trend_change = is_trend_change
+        self.news_related = news_related
+
+
+class PriceHistory:
+    """
+    Fixed-size ring buffer of price samples for one ticker, oldest overwritten first.
+    """
+
+    __slots__ = ("size", "count", "head", "times", "prices", "volumes", "changes", "trends", "flags")
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self.head = 0  # index the next sample is written to
+        self.times = array("d", bytes(8 * size))
+        self.prices = array("d", bytes(8 * size))
+        self.volumes = array("q", bytes(8 * size))
+        self.changes = array("d", bytes(8 * size))
+        self.trends = array("b", bytes(size))
+        self.flags = array("B", bytes(size))
+
+    def append(self, ts, price, volume, change_percent, trend, is_trend_change, news_related):
+        """
+        Adds a sample; ts is a POSIX timestamp. Samples not newer than the latest are ignored.
+        """
+        if self.count and ts <= self.times[(self.head - 1) % self.size]:
+            return False
+        i = self.head
+        self.times[i] = ts
+        self.prices[i] = price if price is not None else math.nan
+        self.volumes[i] = volume if volume is not None else MISSING_VOLUME
+        self.changes[i] = change_percent if change_percent is not None else math.nan
+        self.trends[i] = TREND_CODES.get(trend, TREND_UNKNOWN)
+        self.flags[i] = (FLAG_TREND_CHANGE if is_trend_change else 0) | (FLAG_NEWS_RELATED if news_related else 0)
+        self.head = (i + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+        return True
+
+    def _index(self, age):
+        """
+        Array index of the sample `age` steps back from the latest (0 = latest).
+        """
+        return (self.head - 1 - age) % self.size
+
+    def sample(self, age=0):
+        if age >= self.count:
+            return None
+        i = self._index(age)
+        change = self.changes[i]
+        volume = self.volumes[i]
+        return PriceSample(
+            time=datetime.fromtimestamp(self.times[i], timezone.utc),
+            price=self.prices[i],
+            volume=None if volume == MISSING_VOLUME else volume,
+            change_percent=None if math.isnan(change) else change,
+            trend=TREND_NAMES.get(self.trends[i]),
+            is_trend_change=bool(self.flags[i] & FLAG_TREND_CHANGE),
+            news_related=bool(self.flags[i] & FLAG_NEWS_RELATED),
+        )
+
+    def latest(self):
+        return self.sample(0)
+
+    def recent_prices(self, n):
+        """
+        Up to n most recent prices, newest first.
+        """
+        return [self.prices[self._index(age)] for age in range(min(n, self.count))]
+
+    def mean_volume(self, n, skip=0):
+        """
+        Mean volume of up to n samples before the `skip` most recent ones, or None.
+        """
+        total = 0
+        samples = 0
+        for age in range(skip, min(skip + n, self.count)):
+            volume = self.volumes[self._index(age)]
+            if volume != MISSING_VOLUME:
+                total += volume
+                samples += 1
+        return total / samples if samples else None
+
+    def mark_news_related(self, ts):
+        for age in range(self.count):
+            i = self._index(age)
+            if self.times[i] == ts:
+                self.flags[i] |= FLAG_NEWS_RELATED
+                return True
+            if self.times[i] < ts:
+                return False
+        return False
+
+
+class PriceStore:
+    """
+    Ticker -> PriceHistory map shared by the threads of one process.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def __contains__(self, ticker):
+        return ticker in self._histories
+
+    def __len__(self):
+        return len(self._histories)
+
+    def get(self, ticker):
+        return self._histories.get(ticker)
+
+    def append(self, ticker, when, price, volume, change_percent, trend, is_trend_change, news_related):
+        with self._lock:
+            history = self._histories.get(ticker)
+            if history is None:
+                history = self._histories[ticker] = PriceHistory(self.size)
+            return history.append(
+                when.timestamp(), price, volume, change_percent, trend, is_trend_change, news_related
+            )
+
+    def latest(self, ticker):
+        with self._lock:
+            history = self._histories.get(ticker)
+            return history.latest() if history else None
+
+    def mean_volume(self, ticker, n, skip=0):
+        with self._lock:
+            history = self._histories.get(ticker)
+            return history.mean_volume(n, skip) if history else None
+
+    def mark_news_related(self, ticker, when):
+        with self._lock:
+            history = self._histories.get(ticker)
+            return history.mark_news_related(when.timestamp()) if history else False
+
+    def apply_event(self, event):
+        """
+        Applies a price_events notification payload.
+        """
+        when = parser.isoparse(event["time"])
+        if event.get("op") == "news_related":
+            self.mark_news_related(event["company_id"], when)
+        else:
+            self.append(
+                event["company_id"], when, event["price"], event["volume"], event["change_percent"],
+                event["trend"], event["is_trend_change"], event["news_related"]
+            )
+
+    def warm(self, conn, tickers=None):
+        """
+        Loads the last `size` samples per ticker from `prices` (only `tickers`, if given),
+        replacing any cached history of those tickers.
+        """
+        cursor = conn.cursor(name="price_cache_warm")
+        cursor.itersize = 10000
+        # Per ticker the newest rows of idx_prices_company_time; without a ticker list the
+        # tickers come from a skip scan of the same index instead of reading all of prices
+        cursor.execute("""
+            WITH RECURSIVE all_tickers AS (
+                SELECT min(company_id) AS company_id FROM prices
+                UNION ALL
+                SELECT (SELECT min(company_id) FROM prices WHERE company_id > t.company_id)
+                FROM all_tickers t
+                WHERE t.company_id IS NOT NULL
+            ),
+            wanted AS (
+                SELECT unnest(%s::text[]) AS company_id WHERE %s::text[] IS NOT NULL
+                UNION ALL
+                SELECT company_id FROM all_tickers WHERE %s::text[] IS NULL AND company_id IS NOT NULL
+            )
+            SELECT w.company_id, r.time, r.price, r.volume, r.change_percent, r.trend,
+                   r.is_trend_change, r.news_related
+            FROM wanted w
+            CROSS JOIN LATERAL (
+                SELECT p.time, p.price, p.volume, p.change_percent, p.trend, p.is_trend_change, p.news_related
+                FROM prices p
+                WHERE p.company_id = w.company_id
+                ORDER BY p.time DESC
+                LIMIT %s
+            ) r
+            ORDER BY w.company_id, r.time
+        """, (tickers, tickers, tickers, self.size))
+
+        histories = {}
+        for company_id, when, price, volume, change, trend, trend_change, news_related in cursor:
+            history = histories.get(company_id)
+            if history is None:
+                history = histories[company_id] = PriceHistory(self.size)
+            history.append(when.timestamp(), price, volume, change, trend, trend_change, news_related)
+        cursor.close()
+        conn.commit()
+
+        with self._lock:
+            for ticker, history in histories.items():
+                current = self._histories.get(ticker)
+                # Keep samples that arrived while warming
+                if current is not None:
+                    for age in range(current.count - 1, -1, -1):
+                        sample = current.sample(age)
+                        history.append(
+                            sample.time.timestamp(), sample.price, sample.volume, sample.change_percent,
+                            sample.trend, sample.is_trend_change, sample.news_related
+                        )
+                self._histories[ticker] = history
+        logger.info("Warmed price cache with %d tickers", len(histories))
+        return len(histories)
+
+
+def listen_forever(store, connect, reconnect_delay=5):
+    """
+    Keeps `store` in sync with price_events notifications. On (re)connect it
+    LISTENs first and then warms, so no insert falls between the two.
+    """
+    while True:
+        conn = None
+        try:
+            conn = connect()
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {CHANNEL}")
+            cursor.close()
+
+            warm_conn = connect()
+            try:
+                store.warm(warm_conn)
+            finally:
+                warm_conn.close()
+
+            while True:
+                if select.select([conn], [], [], 60) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            store.apply_event(json.loads(notify.payload))
+                        except Exception as e:
+                            logger.warning("Bad %s payload %r: %s", CHANNEL, notify.payload, e)
+        except Exception as e:
+            logger.error("Price cache listener failed: %s", e)
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            time.sleep(reconnect_delay)
+
+
+# Process-wide store (pipeline: updated on insert; API: updated by the listener)
+price_store = PriceStore(config.PRICE_CACHE_SIZE)
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def ensure_listener(store, connect):
+    """
+    Starts the listener thread once per process (safe to call on every request;
+    pre-forking servers need one thread per worker, not one in the master).
+    """
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        _listener_pid = os.getpid()
+        threading.Thread(
+            target=listen_forever, args=(store, connect), daemon=True, name="price-cache-listener"
+        ).start()
@@ -0,0 +1,345 @@
+"""
+Quote / news providers used by the collector.
+
+    yahoo    Yahoo Finance through yfinance
+    standin  local stand-in: STANDIN_SOURCE is a directory or an http(s) base URL
+             serving <TICKER>.json = {"quote": {...}, "news": [...]}
+
+A quote is {"price", "previous_close", "open_price", "day_low", "day_high",
+"change_percent", "volume"}; news items have Yahoo's raw shape
+({"id", "content": {"title", "pubDate", "canonicalUrl": {"url"}, ...}}).
+
+QUOTE_PROVIDERS is the chain, e.g. "yahoo,standin". A provider that fails
+falls back to the next one. With PROVIDER_HEDGING, a provider that has not
+answered within its rolling p95 latency gets a hedged request to the next
+provider, and whichever answers first wins. Every request is bounded by
+PROVIDER_TIMEOUT_SECONDS. Rolling p95/p99 per provider are exported as
+provider_latency_seconds.
+"""
+import json
+import logging
+import os
+import threading
+import time as time_module
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import config
+import metrics
+
+logger = logging.getLogger("providers")
+
+KINDS = ("quote", "news")
+QUOTE_FIELDS = ("price", "previous_close", "open_price", "day_low", "day_high", "change_percent", "volume")
+# Optional symbol metadata of a quote (stored by ticker_registry)
+QUOTE_METADATA = ("name", "exchange", "currency", "quote_type")
+
+
+class ProviderError(Exception):
+    pass
+
+
+class UnknownSymbol(ProviderError):
+    """
+    The source answered, but has no quote for the symbol (as opposed to an outage).
+    """
+
+
+def _is_not_found(error):
+    text = str(error)
+    return "404" in text or "Not Found" in text or "not found" in text
+
+
+def request_timeout():
+    """
+    Timeout of one HTTP request to a source, so a call the chain abandoned (deadline
+    passed, or a hedge won) frees its worker thread soon.
+    """
+    return min(config.PROVIDER_REQUEST_TIMEOUT_SECONDS, config.PROVIDER_TIMEOUT_SECONDS)
+
+
+class LatencyWindow:
+    """
+    The last PROVIDER_LATENCY_WINDOW successful request durations of one provider
+    and request kind. Pool threads (including abandoned hedged requests) add to it
+    while request() reads it, so both go through a lock.
+    """
+
+    def __init__(self, size=None):
+        self.samples = deque(maxlen=size or config.PROVIDER_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self.samples)
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, p):
+        with self._lock:
+            snapshot = list(self.samples)
+        if not snapshot:
+            return None
+        snapshot.sort()
+        return snapshot[min(len(snapshot) - 1, int(len(snapshot) * p))]
+
+    def hedge_after(self):
+        """
+        How long to wait for this provider before hedging: its rolling p95, or
+        PROVIDER_HEDGE_DEFAULT_SECONDS until there are enough samples.
+        """
+        if len(self) < config.PROVIDER_HEDGE_MIN_SAMPLES:
+            return config.PROVIDER_HEDGE_DEFAULT_SECONDS
+        return self.percentile(0.95)
+
+
+class Provider:
+    name = None
+
+    def __init__(self):
+        self.latency = {kind: LatencyWindow() for kind in KINDS}
+
+    def quote(self, ticker):
+        raise NotImplementedError
+
+    def news(self, ticker):
+        raise NotImplementedError
+
+
+class YahooProvider(Provider):
+    name = "yahoo"
+
+    def __init__(self):
+        super().__init__()
+        self._session = None
+
+    def session(self):
+        """
+        Shared HTTP session (keeps Yahoo's cookie and crumb) whose requests never wait
+        longer than request_timeout(); yfinance itself passes 30 seconds.
+        """
+        if self._session is None:
+            import requests
+
+            class CappedTimeoutSession(requests.Session):
+                def request(self, *args, timeout=None, **kwargs):
+                    cap = request_timeout()
+                    return super().request(*args, timeout=min(timeout or cap, cap), **kwargs)
+
+            self._session = CappedTimeoutSession()
+            self._session.headers.update({
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64)"
+            })
+        return self._session
+
+    def quote(self, ticker):
+        # yfinance pulls in pandas/NumPy; imported on first use only
+        import yfinance as yf
+
+        try:
+            with metrics.YAHOO_INFO_SECONDS.time():
+                info = yf.Ticker(ticker, session=self.session()).info
+        except Exception as e:
+            if _is_not_found(e):
+                raise UnknownSymbol(f"{ticker} not found") from e
+            metrics.YAHOO_INFO_ERRORS.inc()
+            raise
+        price = info.get("currentPrice", info.get("regularMarketPrice"))
+        if not info.get("quoteType") or price is None:
+            raise UnknownSymbol(f"no price for {ticker}")
+        return {
+            "price": float(price),
+            "previous_close": info.get("previousClose"),
+            "open_price": info.get("open"),
+            "day_low": info.get("dayLow"),
+            "day_high": info.get("dayHigh"),
+            "change_percent": info.get("regularMarketChangePercent"),
+            "volume": info.get("volume"),
+            "name": info.get("shortName") or info.get("longName"),
+            "exchange": info.get("exchange"),
+            "currency": info.get("currency"),
+            "quote_type": info.get("quoteType"),
+        }
+
+    def news(self, ticker):
+        import yfinance as yf
+
+        try:
+            with metrics.YAHOO_NEWS_SECONDS.time():
+                return yf.Ticker(ticker, session=self.session()).get_news()
+        except Exception:
+            metrics.YAHOO_NEWS_ERRORS.inc()
+            raise
+
+
+class StandInProvider(Provider):
+    """
+    Serves <TICKER>.json from a directory or an HTTP base URL (fixtures, a replay
+    server, an internal cache in front of the real source).
+    """
+    name = "standin"
+
+    def __init__(self, source=None):
+        super().__init__()
+        self.source = source or config.STANDIN_SOURCE
+
+    def _load(self, ticker):
+        if self.source.startswith(("http://", "https://")):
+            import requests
+
+            response = requests.get(f"{self.source.rstrip('/')}/{ticker}.json", timeout=request_timeout())
+            if response.status_code == 404:
+                raise UnknownSymbol(f"{ticker} not served by {self.source}")
+            response.raise_for_status()
+            return response.json()
+        path = os.path.join(self.source, f"{ticker}.json")
+        if not os.path.exists(path):
+            raise UnknownSymbol(f"no {path}")
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def quote(self, ticker):
+        quote = self._load(ticker).get("quote")
+        if not quote or quote.get("price") is None:
+            raise UnknownSymbol(f"no price for {ticker}")
+        return dict({field: quote.get(field) for field in QUOTE_FIELDS + QUOTE_METADATA}, price=float(quote["price"]))
+
+    def news(self, ticker):
+        return self._load(ticker).get("news", [])
+
+
+PROVIDERS = {
+    YahooProvider.name: YahooProvider,
+    StandInProvider.name: StandInProvider,
+}
+
+
+class ProviderChain:
+    """
+    Runs a request against the providers in order, with fallback and hedging.
+    """
+
+    def __init__(self, providers, hedging=None, timeout=None, max_workers=None):
+        if not providers:
+            raise ValueError("at least one provider is required")
+        self.providers = list(providers)
+        self.hedging = config.PROVIDER_HEDGING if hedging is None else hedging
+        self.timeout = timeout or config.PROVIDER_TIMEOUT_SECONDS
+        # Requests abandoned after the timeout or a faster hedge finish in the background
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers or config.PROVIDER_MAX_WORKERS, thread_name_prefix="provider"
+        )
+
+    def quote(self, ticker):
+        return self.request("quote", ticker)
+
+    def news(self, ticker):
+        return self.request("news", ticker)
+
+    @staticmethod
+    def _timed(provider, kind, ticker):
+        start = time_module.perf_counter()
+        try:
+            result = getattr(provider, kind)(ticker)
+        except Exception:
+            metrics.PROVIDER_ERRORS_TOTAL.labels(provider.name, kind).inc()
+            raise
+        elapsed = time_module.perf_counter() - start
+        provider.latency[kind].add(elapsed)
+        metrics.PROVIDER_REQUEST_SECONDS.labels(provider.name, kind).observe(elapsed)
+        return result
+
+    def request(self, kind, ticker):
+        """
+        The first successful answer. Raises ProviderError when every provider failed
+        or none answered within the timeout.
+        """
+        deadline = time_module.monotonic() + self.timeout
+        pending = {}
+        errors = []
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            provider = self.providers[launched]
+            launched += 1
+            pending[self._pool.submit(self._timed, provider, kind, ticker)] = provider
+
+        launch()
+        while pending:
+            remaining = deadline - time_module.monotonic()
+            if remaining <= 0:
+                break
+            can_hedge = self.hedging and len(pending) == 1 and launched < len(self.providers)
+            if can_hedge:
+                waiting_for = next(iter(pending.values()))
+                remaining = min(remaining, waiting_for.latency[kind].hedge_after())
+
+            done, _ = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                if can_hedge:
+                    metrics.PROVIDER_HEDGES_TOTAL.labels(kind).inc()
+                    launch()
+                continue
+
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append((provider.name, e))
+                    continue
+                if provider is not self.providers[0]:
+                    metrics.PROVIDER_FALLBACK_WINS_TOTAL.labels(provider.name, kind).inc()
+                return result
+            # Every outstanding request failed: fall back to the next provider
+            if not pending and launched < len(self.providers):
+                launch()
+
+        message = "; ".join(f"{name}: {error}" for name, error in errors)
+        if pending:
+            waited_for = ", ".join(provider.name for provider in pending.values())
+            message = "; ".join(filter(None, [message, f"no answer within {self.timeout:g}s from {waited_for}"]))
+        elif errors and all(isinstance(error, UnknownSymbol) for _, error in errors):
+            # Every source answered that it has no quote for the symbol
+            raise UnknownSymbol(f"{kind} for {ticker}: {message}")
+        raise ProviderError(f"{kind} for {ticker} failed: {message}")
+
+    def latency_stats(self):
+        """
+        {provider: {kind: {"samples", "p50", "p95", "p99"}}} of the rolling windows;
+        also updates the provider_latency_seconds gauges.
+        """
+        stats = {}
+        for provider in self.providers:
+            for kind in KINDS:
+                window = provider.latency[kind]
+                entry = {"samples": len(window)}
+                for name, p in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                    entry[name] = window.percentile(p)
+                    if entry[name] is not None and name != "p50":
+                        metrics.PROVIDER_LATENCY_SECONDS.labels(provider.name, kind, name).set(entry[name])
+                stats.setdefault(provider.name, {})[kind] = entry
+        return stats
+
+
+_chain = None
+_chain_lock = threading.Lock()
+
+
+def get_chain():
+    """
+    The process-wide chain configured by QUOTE_PROVIDERS, built on first use.
+    """
+    global _chain
+    with _chain_lock:
+        if _chain is None:
+            names = [name.strip() for name in config.QUOTE_PROVIDERS.split(",") if name.strip()]
+            unknown = [name for name in names if name not in PROVIDERS]
+            if unknown:
+                raise ValueError(f"Unknown QUOTE_PROVIDERS {unknown}, expected some of {sorted(PROVIDERS)}")
+            _chain = ProviderChain([PROVIDERS[name]() for name in names])
+            logger.info("Quote providers: %s (hedging %s)", " → ".join(names), "on" if _chain.hedging else "off")
+        return _chain
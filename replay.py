@@ -0,0 +1,310 @@
+"""
+Replay / backtest of trend detection and alert matching over stored history.
+
+Stored `prices` are fed, ticker by ticker in time order, through the same trend
+detection as collector.store_price (rules.detect_trend) and the same rule index
+as the notificator (rules.RuleIndex). Everything runs in memory against a read
+snapshot: nothing is written to the database and no email is sent. News
+relatedness is recomputed from `news_tickers` (±NEWS_PROXIMITY_MINUTES, late
+news included), the average volume from the previous VOLUME_AVERAGE_SAMPLES.
+
+    python replay.py --from 2024-01-01 --to 2025-01-01 [--ticker AAPL ...] [--rules rules.json] [--out fired.jsonl]
+
+Without --rules the active alerts are replayed; --rules takes a JSON list of
+alert definitions to try instead:
+
+    [{"user_id": 1, "company_id": "AAPL", "alert_type": "change_threshold",
+      "alert_condition": "down", "threshold": 3, "news_only": false}]
+
+Prints the alerts that would have fired per user (one email per price and user,
+as the notificator sends) and the replay throughput.
+"""
+import argparse
+import json
+import logging
+import time as time_module
+from bisect import bisect_left
+from collections import deque
+from datetime import timedelta
+
+import config
+import rules
+
+logger = logging.getLogger("replay")
+
+FETCH_ROWS = 50000
+
+
+class _TickerState:
+    __slots__ = ("price", "trend", "change_percent", "volumes", "volume_sum")
+
+    def __init__(self):
+        self.price = None
+        self.trend = None
+        self.change_percent = None
+        self.volumes = deque()
+        self.volume_sum = 0
+
+
+class Replay:
+    """
+    Feeds price samples through trend detection and the rule index. Samples of one
+    ticker must be fed in time order; tickers are independent of each other.
+    """
+
+    def __init__(self, index, news_times=None, proximity_minutes=None):
+        self.index = index
+        self.news_times = news_times or {}
+        self.proximity = timedelta(minutes=config.NEWS_PROXIMITY_MINUTES if proximity_minutes is None
+                                   else proximity_minutes)
+        self.states = {}
+        self.events = 0
+        self.trend_changes = 0
+        self.fired = []
+
+    def _news_related(self, company_id, when):
+        times = self.news_times.get(company_id)
+        if not times:
+            return False
+        i = bisect_left(times, when - self.proximity)
+        return i < len(times) and times[i] <= when + self.proximity
+
+    def warm_up(self, company_id, price, trend, change_percent, volume):
+        """
+        Seeds a ticker's state with a sample from before the replayed period.
+        """
+        state = self.states.get(company_id)
+        if state is None:
+            state = self.states[company_id] = _TickerState()
+        state.price = price
+        state.trend = trend
+        state.change_percent = change_percent
+        self._push_volume(state, volume)
+
+    @staticmethod
+    def _push_volume(state, volume):
+        if volume is None:
+            return
+        state.volumes.append(volume)
+        state.volume_sum += volume
+        if len(state.volumes) > config.VOLUME_AVERAGE_SAMPLES:
+            state.volume_sum -= state.volumes.popleft()
+
+    def feed(self, price_id, company_id, when, price, stored_change_percent, volume):
+        """
+        Processes one sample and returns the rules that fire for it.
+        """
+        state = self.states.get(company_id)
+        if state is None:
+            state = self.states[company_id] = _TickerState()
+
+        change_percent, trend, is_trend_change = rules.detect_trend(state.price, state.trend, price)
+        # As stored live: the quote source's change when it has one
+        if stored_change_percent is not None:
+            change_percent = stored_change_percent
+
+        event = rules.PriceEvent(
+            price_id, company_id, when, price, trend, change_percent, volume, is_trend_change,
+            self._news_related(company_id, when), state.price, state.change_percent,
+            state.volume_sum / len(state.volumes) if state.volumes else None,
+        )
+        matched = self.index.match(event)
+
+        self.events += 1
+        if is_trend_change:
+            self.trend_changes += 1
+        for rule in matched:
+            self.fired.append((event, rule))
+
+        state.price = price
+        state.trend = trend
+        state.change_percent = change_percent
+        self._push_volume(state, volume)
+        return matched
+
+    def per_user(self):
+        """
+        user_id -> {"email", "notifications", "matches", "alerts": {alert_id: matches}}.
+        A price matching several rules of a user is one notification, as live.
+        """
+        users = {}
+        notified = set()
+        for event, rule in self.fired:
+            user = users.setdefault(rule.user_id, {"email": rule.email, "notifications": 0, "matches": 0, "alerts": {}})
+            user["matches"] += 1
+            user["alerts"][rule.alert_id] = user["alerts"].get(rule.alert_id, 0) + 1
+            if (event.price_id, rule.user_id) not in notified:
+                notified.add((event.price_id, rule.user_id))
+                user["notifications"] += 1
+        return users
+
+
+def rules_from_file(path):
+    """
+    RuleIndex of the alert definitions in a JSON file (see the module docstring).
+    """
+    with open(path) as f:
+        definitions = json.load(f)
+    index = rules.RuleIndex()
+    for i, alert in enumerate(definitions, start=1):
+        alert_type = alert.get("alert_type") or "trend_change"
+        direction = alert.get("alert_condition") or "all"
+        error = rules.validate_alert(alert_type, direction, alert.get("threshold"))
+        if error:
+            raise ValueError(f"Rule {i}: {error}")
+        index.add(rules.Rule(
+            alert.get("alert_id", i), alert["user_id"], alert.get("email"), alert["company_id"].upper(),
+            alert_type, direction, alert.get("threshold"), alert.get("news_only", False),
+        ))
+    return index
+
+
+def load_news_times(cursor, tickers, start, end, proximity_minutes):
+    """
+    ticker -> sorted publication times of its news around [start, end).
+    """
+    margin = timedelta(minutes=proximity_minutes)
+    news_from = start - margin if start else None
+    news_to = end + margin if end else None
+    cursor.execute("""
+        SELECT company_id, time FROM news_tickers
+        WHERE company_id = ANY(%s)
+          AND (%s::timestamptz IS NULL OR time >= %s)
+          AND (%s::timestamptz IS NULL OR time < %s)
+        ORDER BY company_id, time
+    """, (list(tickers), news_from, news_from, news_to, news_to))
+    news_times = {}
+    for company_id, when in cursor.fetchall():
+        news_times.setdefault(company_id, []).append(when)
+    return news_times
+
+
+def warm_up(cursor, replay, tickers, start):
+    """
+    Seeds each ticker with its last VOLUME_AVERAGE_SAMPLES samples before `start`.
+    """
+    if start is None:
+        return
+    cursor.execute("""
+        SELECT t.company_id, s.price, s.trend, s.change_percent, s.volume
+        FROM unnest(%s::text[]) AS t(company_id)
+        CROSS JOIN LATERAL (
+            SELECT p.time, p.id, p.price, p.trend, p.change_percent, p.volume FROM prices p
+            WHERE p.company_id = t.company_id AND p.time < %s
+            ORDER BY p.time DESC
+            LIMIT %s
+        ) s
+        ORDER BY t.company_id, s.time, s.id
+    """, (list(tickers), start, config.VOLUME_AVERAGE_SAMPLES))
+    for company_id, price, trend, change_percent, volume in cursor.fetchall():
+        replay.warm_up(company_id, price, trend, change_percent, volume)
+
+
+def run(conn, index, start=None, end=None, tickers=None):
+    """
+    Replays the prices in [start, end) of the index's tickers (or of those among
+    `tickers`). Returns the Replay.
+    """
+    tickers = sorted(set(index.tickers()) & set(tickers) if tickers else index.tickers())
+    cursor = conn.cursor()
+    news_times = load_news_times(cursor, tickers, start, end, config.NEWS_PROXIMITY_MINUTES)
+    replay = Replay(index, news_times)
+    warm_up(cursor, replay, tickers, start)
+    cursor.close()
+
+    # Ticker by ticker follows idx_prices_company_time, so nothing is sorted server-side
+    prices = conn.cursor(name="replay_prices")
+    prices.itersize = FETCH_ROWS
+    prices.execute("""
+        SELECT id, company_id, time, price, change_percent, volume FROM prices
+        WHERE company_id = ANY(%s)
+          AND (%s::timestamptz IS NULL OR time >= %s)
+          AND (%s::timestamptz IS NULL OR time < %s)
+        ORDER BY company_id, time, id
+    """, (tickers, start, start, end, end))
+    feed = replay.feed
+    try:
+        while True:
+            rows = prices.fetchmany(FETCH_ROWS)
+            if not rows:
+                break
+            for price_id, company_id, when, price, change_percent, volume in rows:
+                feed(price_id, company_id, when, price, change_percent, volume)
+    finally:
+        prices.close()
+        conn.rollback()
+    return replay
+
+
+def write_fired(replay, path):
+    with open(path, "w") as f:
+        for event, rule in sorted(replay.fired, key=lambda item: (item[0].time, item[0].price_id)):
+            f.write(json.dumps({
+                "time": event.time.isoformat(),
+                "price_id": event.price_id,
+                "company_id": event.company_id,
+                "price": event.price,
+                "change_percent": event.change_percent,
+                "trend": event.trend,
+                "news_related": event.news_related,
+                "user_id": rule.user_id,
+                "alert_id": rule.alert_id,
+                "rule": rule.describe(),
+            }) + "\n")
+
+
+if __name__ == "__main__":
+    import pytz
+    from dateutil import parser
+
+    import notificator
+    from db import get_db_connection
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+
+    def to_utc(value):
+        dt = parser.isoparse(value)
+        return pytz.UTC.localize(dt) if dt.tzinfo is None else dt
+
+    arg_parser = argparse.ArgumentParser(description="Replay stored prices through trend detection and alert rules")
+    arg_parser.add_argument("--from", dest="start")
+    arg_parser.add_argument("--to", dest="end")
+    arg_parser.add_argument("--ticker", action="append", help="only these tickers (repeatable)")
+    arg_parser.add_argument("--rules", help="JSON file of alert definitions instead of the active alerts")
+    arg_parser.add_argument("--out", help="write every fired alert as JSON lines")
+    arg_parser.add_argument("--top", type=int, default=20, help="users to list (most notified first)")
+    args = arg_parser.parse_args()
+
+    conn = get_db_connection()
+    if args.rules:
+        index = rules_from_file(args.rules)
+    else:
+        cursor = conn.cursor()
+        index = notificator.load_rules(cursor)
+        cursor.close()
+        conn.rollback()
+    started = time_module.perf_counter()
+    replay = run(
+        conn, index,
+        to_utc(args.start) if args.start else None,
+        to_utc(args.end) if args.end else None,
+        [ticker.upper() for ticker in args.ticker] if args.ticker else None,
+    )
+    elapsed = time_module.perf_counter() - started
+    conn.close()
+
+    users = replay.per_user()
+    print(f"{index.size} rule(s), {len(replay.states)} ticker(s) replayed")
+    print(f"{len(users)} user(s) would have been notified "
+          f"{sum(user['notifications'] for user in users.values())} time(s)")
+    for user_id, user in sorted(users.items(), key=lambda item: -item[1]["notifications"])[:args.top]:
+        alerts = ", ".join(f"#{alert_id}: {count}" for alert_id, count in sorted(user["alerts"].items()))
+        email = f" {user['email']}" if user["email"] else ""
+        print(f"  user {user_id}{email}: {user['notifications']} notification(s), "
+              f"{user['matches']} match(es) [{alerts}]")
+    print(f"{replay.events} price event(s), {replay.trend_changes} trend change(s), "
+          f"{len(replay.fired)} match(es) in {elapsed:.2f}s "
+          f"({replay.events / elapsed if elapsed else 0:,.0f} events/s)")
+    if args.out:
+        write_fired(replay, args.out)
+        print(f"Fired alerts written to {args.out}")
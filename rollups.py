@@ -0,0 +1,230 @@
+"""
+Hourly and daily OHLCV rollups of `prices`, maintained incrementally on insert.
+
+    python rollups.py rebuild --from 2024-01-01 --to 2024-02-01 [--ticker AAPL]
+    python rollups.py prune --days 90
+
+Volume is the highest cumulative day volume Yahoo reported within the bucket.
+Daily buckets follow the US/Eastern trading day.
+"""
+import argparse
+import logging
+from datetime import datetime, timedelta
+
+import pytz
+
+logger = logging.getLogger("rollups")
+
+MARKET_TZ = "US/Eastern"
+
+# table -> SQL expression that maps a timestamp to its bucket
+ROLLUP_TABLES = {
+    "prices_hourly": "date_trunc('hour', {ts})",
+    "prices_daily": f"date_trunc('day', {{ts}}, '{MARKET_TZ}')",
+}
+
+PRUNE_BATCH_SIZE = 10000
+
+
+def _bucket(table, ts):
+    return ROLLUP_TABLES[table].format(ts=ts)
+
+
+def _upsert_sql(table):
+    return f"""
+        INSERT INTO {table} AS r (
+            company_id, bucket, open, high, low, close, open_time, close_time,
+            volume, samples, trend_changes, news_related_count
+        ) VALUES (
+            %(company_id)s, {_bucket(table, "%(time)s::timestamptz")},
+            %(price)s, %(price)s, %(price)s, %(price)s, %(time)s, %(time)s,
+            %(volume)s, 1, %(trend_change)s, %(news_related)s
+        )
+        ON CONFLICT (company_id, bucket) DO UPDATE SET
+            open = CASE WHEN EXCLUDED.open_time < r.open_time THEN EXCLUDED.open ELSE r.open END,
+            open_time = LEAST(r.open_time, EXCLUDED.open_time),
+            close = CASE WHEN EXCLUDED.close_time >= r.close_time THEN EXCLUDED.close ELSE r.close END,
+            close_time = GREATEST(r.close_time, EXCLUDED.close_time),
+            high = GREATEST(r.high, EXCLUDED.high),
+            low = LEAST(r.low, EXCLUDED.low),
+            volume = GREATEST(r.volume, EXCLUDED.volume),
+            samples = r.samples + 1,
+            trend_changes = r.trend_changes + EXCLUDED.trend_changes,
+            news_related_count = r.news_related_count + EXCLUDED.news_related_count
+    """
+
+
+_RECORD_PRICE_SQL = ";".join(_upsert_sql(table) for table in ROLLUP_TABLES)
+
+
+def record_price(cursor, company_id, time, price, volume, is_trend_change, news_related):
+    """
+    Folds one new price sample into the hourly and daily rollups (one round trip).
+    """
+    cursor.execute(_RECORD_PRICE_SQL, {
+        "company_id": company_id,
+        "time": time,
+        "price": price,
+        "volume": volume,
+        "trend_change": int(bool(is_trend_change)),
+        "news_related": int(bool(news_related)),
+    })
+
+
+def record_news_related(cursor, company_id, times):
+    """
+    Counts stored prices that became news-related after the fact (late news).
+    """
+    if not times:
+        return
+    statements = []
+    params = []
+    for table in ROLLUP_TABLES:
+        statements.append(f"""
+            UPDATE {table} r SET news_related_count = r.news_related_count + u.n
+            FROM (
+                SELECT {_bucket(table, "t")} AS bucket, count(*) AS n
+                FROM unnest(%s::timestamptz[]) AS t
+                GROUP BY 1
+            ) u
+            WHERE r.company_id = %s AND r.bucket = u.bucket
+        """)
+        params += [list(times), company_id]
+    cursor.execute(";".join(statements), params)
+
+
+def aggregate_range(cursor, start=None, end=None, company_id=None):
+    """
+    (Re)computes rollup rows from raw prices in [start, end) (unbounded when None).
+    Existing rows of the affected buckets must have been deleted first.
+    """
+    for table in ROLLUP_TABLES:
+        bucket = _bucket(table, "time")
+        cursor.execute(f"""
+            INSERT INTO {table} (
+                company_id, bucket, open, high, low, close, open_time, close_time,
+                volume, samples, trend_changes, news_related_count
+            )
+            SELECT company_id, {bucket},
+                   (array_agg(price ORDER BY time))[1], max(price), min(price),
+                   (array_agg(price ORDER BY time DESC))[1], min(time), max(time),
+                   max(volume), count(*),
+                   count(*) FILTER (WHERE is_trend_change),
+                   count(*) FILTER (WHERE news_related)
+            FROM prices
+            WHERE time IS NOT NULL
+              AND (%s::timestamptz IS NULL OR time >= %s)
+              AND (%s::timestamptz IS NULL OR time < %s)
+              AND (%s::text IS NULL OR company_id = %s)
+            GROUP BY company_id, {bucket}
+        """, (start, start, end, end, company_id, company_id))
+
+
+def _day_bounds(start, end):
+    """
+    Widens [start, end) to whole US/Eastern days so no daily bucket is half rebuilt.
+    """
+    tz = pytz.timezone(MARKET_TZ)
+
+    def day_start(dt, days=0):
+        local = dt.astimezone(tz)
+        return tz.localize(datetime(local.year, local.month, local.day) + timedelta(days=days))
+
+    end_day = day_start(end)
+    return day_start(start), end_day if end_day >= end else day_start(end, days=1)
+
+
+def rebuild(conn, start, end, company_id=None):
+    """
+    Re-aggregates rollups for a corrected time range from raw prices.
+    Refuses ranges whose raw data has already been pruned (see prune).
+    """
+    start, end = _day_bounds(start, end)
+    cursor = conn.cursor()
+    # No marker means nothing was pruned. The widened start is compared, so a day only
+    # partly pruned is not rebuilt from what is left
+    cursor.execute("SELECT pruned_before FROM prices_prune_state")
+    row = cursor.fetchone()
+    if row and start < row[0]:
+        cursor.close()
+        raise ValueError(f"Raw prices before {row[0].isoformat()} were pruned; cannot rebuild from {start.isoformat()}")
+
+    for table in ROLLUP_TABLES:
+        cursor.execute(f"""
+            DELETE FROM {table}
+            WHERE bucket >= %s AND bucket < %s
+              AND (%s::text IS NULL OR company_id = %s)
+        """, (start, end, company_id, company_id))
+    aggregate_range(cursor, start, end, company_id)
+    conn.commit()
+    cursor.close()
+    logger.info("Rebuilt rollups for %s in [%s, %s)", company_id or "all tickers", start.isoformat(), end.isoformat())
+
+
+def retention_horizon(retention_days):
+    """
+    Start of the oldest US/Eastern day kept by a retention of `retention_days`.
+    """
+    horizon, _ = _day_bounds(datetime.now(pytz.UTC) - timedelta(days=retention_days), datetime.now(pytz.UTC))
+    return horizon
+
+
+def prune(conn, retention_days, not_after=None):
+    """
+    Deletes raw prices older than the retention horizon (whole days), in batches,
+    but never at or after `not_after` (e.g. the first month not archived yet).
+    Rollups are kept. Notifications of pruned prices are removed with them (ON DELETE CASCADE).
+    """
+    horizon = retention_horizon(retention_days)
+    if not_after is not None and not_after < horizon:
+        horizon = not_after
+    cursor = conn.cursor()
+    total = 0
+    while True:
+        cursor.execute("""
+            DELETE FROM prices
+            WHERE id IN (SELECT id FROM prices WHERE time < %s LIMIT %s)
+        """, (horizon, PRUNE_BATCH_SIZE))
+        deleted = cursor.rowcount
+        conn.commit()
+        total += deleted
+        if deleted < PRUNE_BATCH_SIZE:
+            break
+    # Marker for rebuild: raw data before the horizon is gone
+    cursor.execute("""
+        INSERT INTO prices_prune_state (pruned_before) VALUES (%s)
+        ON CONFLICT (singleton) DO UPDATE
+        SET pruned_before = GREATEST(prices_prune_state.pruned_before, EXCLUDED.pruned_before)
+    """, (horizon,))
+    conn.commit()
+    cursor.close()
+    logger.info("Pruned %d raw prices older than %s", total, horizon.isoformat())
+    return total
+
+
+if __name__ == "__main__":
+    from dateutil import parser
+
+    from db import get_db_connection
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+    arg_parser = argparse.ArgumentParser(description="Maintain price rollups")
+    commands = arg_parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = commands.add_parser("rebuild", help="re-aggregate a time range from raw prices")
+    rebuild_parser.add_argument("--from", dest="start", required=True)
+    rebuild_parser.add_argument("--to", dest="end", required=True)
+    rebuild_parser.add_argument("--ticker")
+    prune_parser = commands.add_parser("prune", help="delete raw prices past the retention horizon")
+    prune_parser.add_argument("--days", type=int, required=True)
+    args = arg_parser.parse_args()
+
+    conn = get_db_connection()
+    if args.command == "rebuild":
+        def to_utc(value):
+            dt = parser.isoparse(value)
+            return pytz.UTC.localize(dt) if dt.tzinfo is None else dt
+
+        rebuild(conn, to_utc(args.start), to_utc(args.end), args.ticker.upper() if args.ticker else None)
+    else:
+        prune(conn, args.days)
+    conn.close()
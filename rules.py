@@ -0,0 +1,298 @@
+"""
+Alert rule engine.
+
+Every alert is compiled into a Rule and indexed by ticker, alert type,
+direction and news_only flag. Threshold-like rules are kept sorted by their
+threshold, so a price event only touches the index lists that can match it and
+finds the matching rules by bisection instead of scanning all alerts.
+
+Alert types (alerts.alert_type) and the meaning of alerts.threshold:
+
+    trend_change      the trend flipped (threshold unused)
+    change_threshold  |change_percent| crossed threshold (%) since the previous sample
+    volume_spike      volume >= threshold x average volume of recent samples
+    price_cross       price crossed the threshold level since the previous sample
+
+alert_condition is the direction (all / up / down); news_only restricts an
+alert to news-related price events. delivery (immediate / digest, NULL = the
+user's setting) only affects how the notificator sends a match.
+"""
+from bisect import bisect_right
+
+ALERT_TYPES = ("trend_change", "change_threshold", "volume_spike", "price_cross")
+DIRECTIONS = ("all", "up", "down")
+DELIVERY_MODES = ("immediate", "digest")
+
+
+def validate_alert(alert_type, direction, threshold):
+    """
+    Returns an error message for an invalid alert definition, or None.
+    """
+    if alert_type not in ALERT_TYPES:
+        return f"Invalid alert_type. Must be one of: {', '.join(ALERT_TYPES)}"
+    if direction not in DIRECTIONS:
+        return f"Invalid alert_condition. Must be one of: {', '.join(DIRECTIONS)}"
+    if alert_type == "trend_change":
+        return None
+    if threshold is None:
+        return f"threshold is required for {alert_type} alerts"
+    try:
+        threshold = float(threshold)
+    except (TypeError, ValueError):
+        return "threshold must be a number"
+    if threshold <= 0:
+        return "threshold must be positive"
+    return None
+
+
+def detect_trend(prev_price, prev_trend, price):
+    """
+    (change_percent, trend, is_trend_change) of a new price sample given the previous
+    one (prev_price None for a ticker's first sample).
+    """
+    if not prev_price:
+        return None, "flat", False
+    prev_price = float(prev_price)
+    change_percent = ((price - prev_price) / prev_price) * 100
+    trend = "up" if change_percent > 0 else "down" if change_percent < 0 else "flat"
+    return change_percent, trend, trend != prev_trend
+
+
+class PriceEvent:
+    """
+    A stored price sample together with what rule evaluation needs from its past.
+    """
+
+    __slots__ = (
+        "price_id", "company_id", "time", "price", "trend", "change_percent", "volume",
+        "is_trend_change", "news_related", "prev_price", "prev_change_percent", "avg_volume",
+    )
+
+    def __init__(self, price_id, company_id, time, price, trend, change_percent, volume,
+                 is_trend_change, news_related, prev_price=None, prev_change_percent=None, avg_volume=None):
+        self.price_id = price_id
+        self.company_id = company_id
+        self.time = time
+        self.price = price
+        self.trend = trend
+        self.change_percent = change_percent
+        self.volume = volume
+        self.is_trend_change = is_trend_change
+        self.news_related = news_related
+        self.prev_price = prev_price
+        self.prev_change_percent = prev_change_percent
+        self.avg_volume = avg_volume
+
+    def direction(self, alert_type):
+        """
+        "up" / "down" / None as seen by rules of the given type.
+        """
+        if alert_type == "trend_change":
+            return self.trend if self.trend in ("up", "down") else None
+        if alert_type == "price_cross":
+            if self.prev_price is None or self.price is None or self.price == self.prev_price:
+                return None
+            return "up" if self.price > self.prev_price else "down"
+        if self.change_percent is None or self.change_percent == 0:
+            return None
+        return "up" if self.change_percent > 0 else "down"
+
+
+def _crossed_magnitude(event):
+    """
+    (previous |change|, current |change|) or None when the change is unknown.
+    """
+    if event.change_percent is None:
+        return None
+    previous = abs(event.prev_change_percent) if event.prev_change_percent is not None else 0.0
+    return previous, abs(event.change_percent)
+
+
+def compile_predicate(alert_type, direction, threshold, news_only):
+    """
+    Compiles an alert definition into a predicate over PriceEvent.
+    Used for single-rule checks and as the reference for the index.
+    """
+    def direction_ok(event):
+        return direction == "all" or event.direction(alert_type) == direction
+
+    def news_ok(event):
+        return not news_only or bool(event.news_related)
+
+    if alert_type == "trend_change":
+        def predicate(event):
+            return bool(event.is_trend_change) and news_ok(event) and direction_ok(event)
+    elif alert_type == "change_threshold":
+        def predicate(event):
+            magnitude = _crossed_magnitude(event)
+            return (
+                magnitude is not None and magnitude[0] < threshold <= magnitude[1]
+                and news_ok(event) and direction_ok(event)
+            )
+    elif alert_type == "volume_spike":
+        def predicate(event):
+            return (
+                event.volume is not None and event.avg_volume
+                and event.volume >= threshold * event.avg_volume
+                and news_ok(event) and direction_ok(event)
+            )
+    elif alert_type == "price_cross":
+        def predicate(event):
+            if event.prev_price is None or event.price is None:
+                return False
+            low, high = sorted((event.prev_price, event.price))
+            return low < threshold <= high and news_ok(event) and direction_ok(event)
+    else:
+        raise ValueError(f"Unknown alert type: {alert_type}")
+    return predicate
+
+
+class Rule:
+    __slots__ = ("alert_id", "user_id", "email", "company_id", "alert_type", "direction",
+                 "threshold", "news_only", "digest", "created_at", "predicate")
+
+    def __init__(self, alert_id, user_id, email, company_id, alert_type="trend_change",
+                 direction="all", threshold=None, news_only=False, digest=False, created_at=None):
+        self.alert_id = alert_id
+        self.user_id = user_id
+        self.email = email
+        self.company_id = company_id
+        self.alert_type = alert_type or "trend_change"
+        self.direction = direction or "all"
+        self.threshold = float(threshold) if threshold is not None else None
+        self.news_only = bool(news_only)
+        self.digest = bool(digest)
+        self.created_at = created_at
+        self.predicate = compile_predicate(self.alert_type, self.direction, self.threshold, self.news_only)
+
+    def matches(self, event):
+        return self.company_id == event.company_id and self.predicate(event)
+
+    def describe(self):
+        if self.alert_type == "trend_change":
+            text = f"trend change ({self.direction})"
+        elif self.alert_type == "change_threshold":
+            text = f"|change| ≥ {self.threshold:g}% ({self.direction})"
+        elif self.alert_type == "volume_spike":
+            text = f"volume ≥ {self.threshold:g}× average ({self.direction})"
+        else:
+            text = f"price crossed {self.threshold:g} ({self.direction})"
+        return text + (", news only" if self.news_only else "")
+
+
+class _SortedRules:
+    """
+    Rules sorted by threshold, with a parallel key list for bisection.
+    Additions are appended and sorted once, on the first lookup after them.
+    """
+
+    __slots__ = ("keys", "rules", "_dirty")
+
+    def __init__(self):
+        self.keys = []
+        self.rules = []
+        self._dirty = False
+
+    def add(self, rule):
+        self.rules.append(rule)
+        self._dirty = True
+
+    def _sort(self):
+        self.rules.sort(key=lambda rule: rule.threshold)
+        self.keys = [rule.threshold for rule in self.rules]
+        self._dirty = False
+
+    def in_range(self, low, high):
+        """
+        Rules with low < threshold <= high.
+        """
+        if self._dirty:
+            self._sort()
+        return self.rules[bisect_right(self.keys, low):bisect_right(self.keys, high)]
+
+    def at_most(self, value):
+        """
+        Rules with threshold <= value.
+        """
+        if self._dirty:
+            self._sort()
+        return self.rules[:bisect_right(self.keys, value)]
+
+    def __len__(self):
+        return len(self.rules)
+
+
+class RuleIndex:
+    """
+    ticker -> (alert_type, direction, news_only) -> rules.
+    trend_change rules are plain lists; the other types are _SortedRules.
+    """
+
+    def __init__(self, rules=()):
+        self._by_ticker = {}
+        self.size = 0
+        for rule in rules:
+            self.add(rule)
+
+    def add(self, rule):
+        buckets = self._by_ticker.setdefault(rule.company_id, {})
+        key = (rule.alert_type, rule.direction, rule.news_only)
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = [] if rule.alert_type == "trend_change" else _SortedRules()
+        if rule.alert_type == "trend_change":
+            bucket.append(rule)
+        else:
+            bucket.add(rule)
+        self.size += 1
+
+    def tickers(self):
+        return self._by_ticker.keys()
+
+    def match(self, event):
+        """
+        All rules that fire for the event.
+        """
+        buckets = self._by_ticker.get(event.company_id)
+        if not buckets:
+            return []
+
+        news_flags = (False, True) if event.news_related else (False,)
+        matched = []
+        for alert_type in ALERT_TYPES:
+            candidates = self._candidates(alert_type, event)
+            if candidates is None:
+                continue
+            direction = event.direction(alert_type)
+            directions = ("all", direction) if direction else ("all",)
+            for dir_key in directions:
+                for news_only in news_flags:
+                    bucket = buckets.get((alert_type, dir_key, news_only))
+                    if bucket:
+                        matched.extend(candidates(bucket))
+        return matched
+
+    @staticmethod
+    def _candidates(alert_type, event):
+        """
+        Returns a function selecting matching rules from one bucket, or None if
+        no rule of this type can match the event.
+        """
+        if alert_type == "trend_change":
+            return (lambda bucket: bucket) if event.is_trend_change else None
+        if alert_type == "change_threshold":
+            magnitude = _crossed_magnitude(event)
+            if magnitude is None or magnitude[1] <= magnitude[0]:
+                return None
+            return lambda bucket: bucket.in_range(*magnitude)
+        if alert_type == "volume_spike":
+            if event.volume is None or not event.avg_volume:
+                return None
+            ratio = event.volume / event.avg_volume
+            return lambda bucket: bucket.at_most(ratio)
+        if alert_type == "price_cross":
+            if event.prev_price is None or event.price is None or event.prev_price == event.price:
+                return None
+            low, high = sorted((event.prev_price, event.price))
+            return lambda bucket: bucket.in_range(low, high)
+        return None
@@ -0,0 +1,67 @@
+"""
+64-bit SimHash for near-duplicate news detection.
+
+Syndicated copies of one article differ in URL and a few words; their SimHash
+fingerprints differ in a handful of bits, while unrelated texts differ in ~32.
+"""
+import hashlib
+import re
+
+BITS = 64
+_MASK = (1 << BITS) - 1
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def _features(text):
+    """
+    Words of the normalized text with their counts. Titles and summaries are short,
+    so single words give a more stable fingerprint than shingles.
+    """
+    counts = {}
+    for word in _WORD_RE.findall(text.lower()):
+        counts[word] = counts.get(word, 0) + 1
+    return counts
+
+
+def _hash64(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text):
+    """
+    Returns the unsigned 64-bit SimHash of text, or None if it has no words.
+    """
+    features = _features(text or "")
+    if not features:
+        return None
+
+    weights = [0] * BITS
+    for feature, weight in features.items():
+        h = _hash64(feature)
+        for bit in range(BITS):
+            if h >> bit & 1:
+                weights[bit] += weight
+            else:
+                weights[bit] -= weight
+
+    fingerprint = 0
+    for bit in range(BITS):
+        if weights[bit] > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def distance(a, b):
+    """
+    Hamming distance between two fingerprints.
+    """
+    return bin((a ^ b) & _MASK).count("1")
+
+
+def to_signed(fingerprint):
+    """
+    Maps an unsigned 64-bit fingerprint to the signed range of a Postgres BIGINT.
+    """
+    if fingerprint is None:
+        return None
+    return fingerprint - (1 << BITS) if fingerprint >= 1 << (BITS - 1) else fingerprint
@@ -0,0 +1,139 @@
+import contextlib
+import io
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Database tests run against a scratch database whose tables are dropped and recreated;
+# without TEST_DATABASE_URL they are skipped
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture
+def db_conn(monkeypatch):
+    """
+    Connection to a freshly initialized TEST_DATABASE_URL; get_db_connection() uses it too.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    import psycopg2
+
+    import config
+    from db import get_db_connection
+    from models import init_tables
+
+    try:
+        psycopg2.connect(TEST_DATABASE_URL).close()
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"TEST_DATABASE_URL is not reachable: {e}")
+
+    monkeypatch.setattr(config, "DATABASE_URL", TEST_DATABASE_URL)
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("DROP SCHEMA public CASCADE; CREATE SCHEMA public")
+    conn.commit()
+    cursor.close()
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_tables(conn)
+    try:
+        yield conn
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+@pytest.fixture
+def add_alert(db_conn):
+    """
+    add_alert(username, company_id, **alert columns) -> (user_id, alert_id), each alert in a
+    new active campaign; the user is created on first use.
+    """
+    def add(username, company_id, **fields):
+        cursor = db_conn.cursor()
+        cursor.execute("""
+            INSERT INTO users (username, password_hash, email) VALUES (%s, 'x', %s)
+            ON CONFLICT (username) DO UPDATE SET email = EXCLUDED.email
+            RETURNING id
+        """, (username, f"{username}@example.com"))
+        user_id = cursor.fetchone()[0]
+        cursor.execute(
+            "INSERT INTO campaigns (created_by, company_id) VALUES (%s, %s) RETURNING id",
+            (username, company_id),
+        )
+        campaign_id = cursor.fetchone()[0]
+        columns = ["campaign_id", "user_id", *fields]
+        cursor.execute(
+            f"INSERT INTO alerts ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) RETURNING id",
+            (campaign_id, user_id, *fields.values()),
+        )
+        alert_id = cursor.fetchone()[0]
+        db_conn.commit()
+        cursor.close()
+        return user_id, alert_id
+
+    return add
+
+
+@pytest.fixture
+def add_price(db_conn):
+    """
+    add_price(company_id, price, **price columns) -> id; time defaults to now.
+    """
+    def add(company_id, price, **fields):
+        fields.setdefault("time", datetime.now(timezone.utc))
+        columns = ["company_id", "price", *fields]
+        cursor = db_conn.cursor()
+        cursor.execute(
+            f"INSERT INTO prices ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))}) RETURNING id",
+            (company_id, price, *fields.values()),
+        )
+        price_id = cursor.fetchone()[0]
+        db_conn.commit()
+        cursor.close()
+        return price_id
+
+    return add
+
+
+@pytest.fixture
+def api(db_conn, monkeypatch):
+    """
+    (Flask test client, Authorization headers of the registered user "tester").
+    """
+    import price_cache
+    from app import create_app
+
+    # The price cache listener thread is not needed by the routes under test
+    monkeypatch.setattr(price_cache, "ensure_listener", lambda store, connect: None)
+    client = create_app().test_client()
+    credentials = {"username": "tester", "password": "secret", "email": "tester@example.com"}
+    assert client.post("/register", json=credentials).status_code == 201
+    token = client.post("/login", json=credentials).get_json()["token"]
+    return client, {"Authorization": f"Basic {token}"}
+
+
+@pytest.fixture
+def standin(tmp_path, monkeypatch):
+    """
+    standin(ticker, **quote) serves a quote from <tmp_path>/<TICKER>.json through the
+    standin provider, the only one configured; the price cache starts empty.
+    """
+    import config
+    import price_cache
+    import providers
+
+    monkeypatch.setattr(config, "QUOTE_PROVIDERS", "standin")
+    monkeypatch.setattr(config, "STANDIN_SOURCE", str(tmp_path))
+    monkeypatch.setattr(providers, "_chain", None)
+    monkeypatch.setattr(price_cache, "price_store", price_cache.PriceStore(8))
+
+    def serve(ticker, **quote):
+        (tmp_path / f"{ticker}.json").write_text(json.dumps({"quote": quote, "news": []}))
+
+    return serve
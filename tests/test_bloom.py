@@ -0,0 +1,56 @@
+import pytest
+
+from bloom import BloomFilter, news_key
+
+
+@pytest.fixture
+def bloom_path(tmp_path):
+    return str(tmp_path / "news.bloom")
+
+
+def test_added_keys_are_present(bloom_path):
+    bloom = BloomFilter.create(bloom_path, capacity=1000, error_rate=0.01)
+    try:
+        keys = [news_key("AAPL", i) for i in range(500)]
+        for key in keys:
+            assert bloom.add(key)
+        assert all(key in bloom for key in keys)
+        assert not bloom.add(keys[0])
+        assert bloom.count == 500
+        assert not bloom.saturated
+    finally:
+        bloom.close()
+
+
+def test_survives_reopen(bloom_path):
+    bloom = BloomFilter.open(bloom_path, capacity=1000, error_rate=0.01)
+    bloom.add(news_key("AAPL", 1))
+    bloom.flush()
+    bloom.close()
+
+    bloom = BloomFilter.open(bloom_path, capacity=10, error_rate=0.5)
+    try:
+        # The stored parameters win over the ones passed to open()
+        assert bloom.capacity == 1000
+        assert bloom.count == 1
+        assert news_key("AAPL", 1) in bloom
+    finally:
+        bloom.close()
+
+
+def test_false_positive_rate(bloom_path):
+    bloom = BloomFilter.create(bloom_path, capacity=5000, error_rate=0.01)
+    try:
+        for i in range(5000):
+            bloom.add(news_key("AAPL", i))
+        false_positives = sum(news_key("MSFT", i) in bloom for i in range(20000))
+        assert false_positives / 20000 < 0.02
+    finally:
+        bloom.close()
+
+
+def test_rejects_foreign_file(bloom_path):
+    with open(bloom_path, "wb") as f:
+        f.write(b"\0" * 64)
+    with pytest.raises(ValueError):
+        BloomFilter(bloom_path)
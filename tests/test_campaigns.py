@@ -0,0 +1,116 @@
+def _tickers(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT symbol FROM tickers ORDER BY symbol")
+    rows = [row[0] for row in cursor.fetchall()]
+    conn.commit()
+    cursor.close()
+    return rows
+
+
+def test_create_campaign(api, db_conn):
+    client, headers = api
+    response = client.post("/campaigns", json={"company_id": " aapl ", "alert_condition": "up"}, headers=headers)
+    assert response.status_code == 201
+    assert _tickers(db_conn) == ["AAPL"]
+
+    response = client.post("/campaigns", json={"company_id": "AAPL"}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Campaign already exists"
+
+
+def test_create_campaign_rejects_malformed_ticker(api, db_conn):
+    client, headers = api
+    for company_id in ("AAPL; DROP", "TOO-LONG-TICKER", "AA PL", "BRK/B"):
+        response = client.post("/campaigns", json={"company_id": company_id}, headers=headers)
+        assert response.status_code == 400, company_id
+        assert response.get_json()["message"] == "Invalid company_id"
+    assert client.post("/campaigns", json={}, headers=headers).status_code == 400
+    # Nothing was registered with the ticker registry
+    assert _tickers(db_conn) == []
+
+
+def test_create_campaign_rejects_known_invalid_ticker(api, db_conn):
+    cursor = db_conn.cursor()
+    cursor.execute("""
+        INSERT INTO tickers (symbol, status, last_error, retry_after)
+        VALUES ('NOPE', 'invalid', 'not found', NOW() + INTERVAL '1 day')
+    """)
+    db_conn.commit()
+    cursor.close()
+    client, headers = api
+    response = client.post("/campaigns", json={"company_id": "nope"}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()["message"] == "Unknown ticker NOPE (not found)"
+
+
+def _bulk(api, items):
+    client, headers = api
+    response = client.post("/campaigns/bulk", json={"items": items}, headers=headers)
+    return response.status_code, response.get_json()
+
+
+def test_bulk_reports_each_item_in_order(api, db_conn):
+    api[0].post("/campaigns", json={"company_id": "MSFT"}, headers=api[1])
+
+    status, body = _bulk(api, [
+        {"company_id": "aapl", "alert_condition": "up"},
+        {"company_id": "MSFT"},
+        {"company_id": "AAPL"},
+        {"company_id": "NVDA", "alert_type": "price_cross", "threshold": 500},
+        {"company_id": "bad ticker"},
+        {"company_id": "TSLA", "alert_type": "volume_spike"},
+        "not an object",
+    ])
+    assert status == 201
+    assert body["created"] == 2
+    assert [result["status"] for result in body["results"]] == [
+        "created", "exists", "duplicate", "created", "invalid", "invalid", "invalid",
+    ]
+    assert [result["company_id"] for result in body["results"]][:4] == ["AAPL", "MSFT", "AAPL", "NVDA"]
+
+    cursor = db_conn.cursor()
+    cursor.execute("""
+        SELECT c.company_id, a.id, a.alert_type, a.alert_condition, a.threshold
+        FROM campaigns c JOIN alerts a ON a.campaign_id = c.id
+        WHERE c.company_id IN ('AAPL', 'NVDA')
+        ORDER BY c.company_id
+    """)
+    rows = cursor.fetchall()
+    db_conn.commit()
+    cursor.close()
+    aapl, nvda = body["results"][0], body["results"][3]
+    assert rows == [
+        ("AAPL", aapl["alert_id"], "trend_change", "up", None),
+        ("NVDA", nvda["alert_id"], "price_cross", "all", 500.0),
+    ]
+
+
+def test_bulk_repeat_creates_nothing(api):
+    items = [{"company_id": "AAPL"}, {"company_id": "NVDA"}]
+    assert _bulk(api, items)[1]["created"] == 2
+    status, body = _bulk(api, items)
+    assert status == 200
+    assert body["created"] == 0
+    assert {result["status"] for result in body["results"]} == {"exists"}
+
+
+def test_bulk_rejects_known_invalid_tickers(api, db_conn):
+    cursor = db_conn.cursor()
+    cursor.execute("""
+        INSERT INTO tickers (symbol, status, retry_after) VALUES ('NOPE', 'invalid', NOW() + INTERVAL '1 day')
+    """)
+    db_conn.commit()
+    cursor.close()
+    status, body = _bulk(api, [{"company_id": "NOPE"}, {"company_id": "AAPL"}])
+    assert status == 201
+    assert [result["status"] for result in body["results"]] == ["invalid", "created"]
+    assert _tickers(db_conn) == ["AAPL", "NOPE"]
+
+
+def test_bulk_rejects_malformed_requests(api, monkeypatch):
+    import app
+
+    assert _bulk(api, [])[0] == 400
+    assert _bulk(api, {"company_id": "AAPL"})[0] == 400
+    monkeypatch.setattr(app, "BULK_CAMPAIGNS_MAX_ITEMS", 2)
+    assert _bulk(api, [{"company_id": "A"}, {"company_id": "B"}, {"company_id": "C"}])[0] == 400
@@ -0,0 +1,129 @@
+import os
+import subprocess
+import sys
+
+import collect_jobs
+import collector
+import config
+
+
+def _job(conn, job_id):
+    cursor = conn.cursor()
+    job = collect_jobs.get(cursor, job_id)
+    conn.commit()
+    cursor.close()
+    return job
+
+
+def _enqueue(conn, requested_by="tester"):
+    cursor = conn.cursor()
+    job = collect_jobs.enqueue(cursor, requested_by)
+    conn.commit()
+    cursor.close()
+    return job
+
+
+def test_triggers_are_coalesced_into_the_queued_job(api):
+    client, headers = api
+    first = client.post("/collect", headers=headers)
+    assert first.status_code == 202
+    job_id = first.get_json()["job_id"]
+    assert first.headers["Location"] == f"/collect/{job_id}"
+    assert first.get_json()["coalesced"] is False
+
+    second = client.post("/collect", headers=headers).get_json()
+    assert (second["job_id"], second["coalesced"]) == (job_id, True)
+
+    job = client.get(f"/collect/{job_id}", headers=headers).get_json()
+    assert (job["status"], job["triggers"], job["requested_by"]) == ("queued", 2, "tester")
+    assert client.get("/collect/999", headers=headers).status_code == 404
+
+
+def _queue_directly(conn):
+    """
+    A queued job next to a running one (enqueue would join the running job).
+    """
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO collect_jobs (requested_by) VALUES ('tester') RETURNING id")
+    job_id = cursor.fetchone()[0]
+    conn.commit()
+    cursor.close()
+    return job_id
+
+
+def test_one_job_runs_at_a_time(db_conn):
+    first, _, created = _enqueue(db_conn)
+    assert created
+    assert collect_jobs.claim(db_conn) == first
+    assert _job(db_conn, first)["status"] == "running"
+
+    # A trigger while the job runs joins it
+    assert _enqueue(db_conn) == (first, "running", False)
+    assert _job(db_conn, first)["triggers"] == 2
+
+    second = _queue_directly(db_conn)
+    assert collect_jobs.claim(db_conn) is None
+    collect_jobs.JobProgress(db_conn, first).finish()
+    assert collect_jobs.claim(db_conn) == second
+
+
+def test_stalled_job_is_failed(db_conn):
+    stalled, _, _ = _enqueue(db_conn)
+    collect_jobs.claim(db_conn)
+    cursor = db_conn.cursor()
+    cursor.execute("UPDATE collect_jobs SET updated_at = NOW() - INTERVAL '1 hour' WHERE id = %s", (stalled,))
+    db_conn.commit()
+    cursor.close()
+
+    queued = _queue_directly(db_conn)
+    assert collect_jobs.claim(db_conn) == queued
+    job = _job(db_conn, stalled)
+    assert job["status"] == "failed"
+    assert job["error"].startswith("stalled")
+
+
+def test_progress_is_written_at_most_every_interval(db_conn, monkeypatch):
+    monkeypatch.setattr(config, "COLLECT_JOB_PROGRESS_SECONDS", 3600)
+    job_id, _, _ = _enqueue(db_conn)
+    collect_jobs.claim(db_conn)
+    progress = collect_jobs.JobProgress(db_conn, job_id)
+    progress.start(3)
+    progress.advance("AAPL")
+    progress.advance("MSFT", "no price data")
+    assert _job(db_conn, job_id)["tickers_done"] == 0
+
+    progress.advance("NVDA")
+    progress.finish()
+    job = _job(db_conn, job_id)
+    assert (job["status"], job["tickers_total"], job["tickers_done"], job["tickers_failed"]) == ("done", 3, 3, 1)
+    assert job["failures"] == {"MSFT": "no price data"}
+    assert job["finished_at"] is not None
+
+
+def test_run_queued_job_collects_every_active_ticker(db_conn, add_alert, standin):
+    standin("AAPL", price=190.0, volume=1000)
+    add_alert("ann", "AAPL")
+    add_alert("ann", "MSFT")
+    cursor = db_conn.cursor()
+    # Not due for a poll: an on-demand job collects them anyway
+    cursor.execute("""
+        INSERT INTO tickers (symbol, status, next_poll_at)
+        VALUES ('AAPL', 'valid', NOW() + INTERVAL '1 hour'), ('MSFT', 'valid', NOW() + INTERVAL '1 hour')
+    """)
+    db_conn.commit()
+    cursor.close()
+
+    assert collector.run_queued_job() is None
+    job_id, _, _ = _enqueue(db_conn)
+    assert collector.run_queued_job() == 2
+
+    job = _job(db_conn, job_id)
+    assert (job["status"], job["tickers_done"], job["tickers_failed"]) == ("done", 2, 1)
+    assert job["failures"] == {"MSFT": "no price data"}
+
+
+def test_api_side_does_not_load_the_collector():
+    code = "import sys, collect_jobs; print(sorted({'collector', 'providers', 'yfinance'} & set(sys.modules)))"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                         cwd=os.path.dirname(os.path.abspath(collect_jobs.__file__)))
+    assert out.stdout.strip() == "[]"
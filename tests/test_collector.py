@@ -0,0 +1,28 @@
+import collector
+import price_cache
+
+
+def _tickers(conn):
+    cursor = conn.cursor()
+    cursor.execute("SELECT symbol, failure_count, last_success_at IS NOT NULL FROM tickers ORDER BY symbol")
+    rows = cursor.fetchall()
+    conn.commit()
+    cursor.close()
+    return rows
+
+
+def test_failed_insert_is_not_reported_as_success(db_conn, standin):
+    standin("AAPL", price=190.0, volume=1000)
+    # Out of BIGINT range: the insert fails
+    standin("MSFT", price=410.0, volume=10 ** 20)
+    cursor = db_conn.cursor()
+    cursor.execute("INSERT INTO tickers (symbol, status) VALUES ('AAPL', 'valid'), ('MSFT', 'valid')")
+    db_conn.commit()
+    cursor.close()
+
+    collected = collector._collect([{"ticker": "AAPL", "status": "valid"}, {"ticker": "MSFT", "status": "valid"}])
+    assert collected == 2
+    # Neither a success nor a failure of the symbol itself
+    assert _tickers(db_conn) == [("AAPL", 0, True), ("MSFT", 0, False)]
+    assert price_cache.price_store.latest("MSFT") is None
+    assert price_cache.price_store.latest("AAPL").price == 190.0
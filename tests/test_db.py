@@ -0,0 +1,111 @@
+import logging
+
+import pytest
+
+import db
+
+
+class _Records(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+@pytest.fixture
+def slow_log(monkeypatch):
+    """
+    Logs every statement as slow and explains all eligible ones; yields the logged messages.
+    """
+    monkeypatch.setattr(db, "SLOW_QUERY_MS", 0)
+    monkeypatch.setattr(db, "EXPLAIN_SAMPLE_RATE", 1.0)
+    handler = _Records()
+    # Collected here instead of written to slow_query.log
+    monkeypatch.setattr(db.slow_logger, "handlers", [handler])
+    yield handler.messages
+
+
+def test_statement_name():
+    assert db.statement_name("SELECT id FROM prices WHERE x = %s") == "SELECT prices"
+    assert db.statement_name("  insert into News_Data (id) VALUES (%s)") == "INSERT news_data"
+    assert db.statement_name("UPDATE tickers SET x = 1") == "UPDATE tickers"
+    assert db.statement_name("CREATE TABLE IF NOT EXISTS users (id INT)") == "CREATE users"
+    assert db.statement_name("SELECT 1") == "SELECT"
+
+
+@pytest.mark.parametrize("query, safe", [
+    ("SELECT * FROM prices WHERE company_id = %s", True),
+    ("SELECT pg_notify('price_events', %s)", False),
+    ("SELECT pg_try_advisory_lock(%s, %s)", False),
+    ("SELECT pg_advisory_unlock_all()", False),
+    ("SELECT id FROM collect_jobs WHERE status = 'queued' FOR UPDATE SKIP LOCKED", False),
+    ("SELECT * FROM notifier_state FOR NO KEY UPDATE", False),
+    ("SELECT * FROM users FOR SHARE", False),
+    ("SELECT nextval('prices_id_seq')", False),
+    ("UPDATE prices SET trend = 'up'", False),
+    ("WITH x AS (DELETE FROM prices RETURNING id) SELECT count(*) FROM x", False),
+])
+def test_explain_safe(query, safe):
+    assert db.explain_safe(query) is safe
+
+
+def test_profile_flags_n_plus_one(monkeypatch):
+    monkeypatch.setattr(db, "N_PLUS_ONE_THRESHOLD", 3)
+    with db.profile("test") as profile:
+        for _ in range(4):
+            profile.record("SELECT prices", "collector.py:10 store_price", 0.002, 1)
+        profile.record("INSERT news_data", "collector.py:20 store_news", 0.010, 5)
+    assert profile.total_queries == 5
+    assert profile.total_seconds == pytest.approx(0.018)
+    assert profile.suspected_n_plus_one() == [("SELECT prices", "collector.py:10 store_price", 4)]
+    summary = profile.summary()
+    assert "5 queries" in summary
+    assert "possible N+1: SELECT prices @ collector.py:10 store_price executed 4 times" in summary
+
+
+def test_cursor_records_into_active_profile(db_conn):
+    cursor = db_conn.cursor()
+    with db.profile("test") as profile:
+        for _ in range(3):
+            cursor.execute("SELECT count(*) FROM prices")
+    db_conn.commit()
+    ((statement, site), (count, _, _)), = profile.stats.items()
+    assert statement == "SELECT prices"
+    assert site.startswith("test_db.py:")
+    assert count == 3
+
+
+def _bump_counter(conn):
+    cursor = conn.cursor()
+    cursor.execute("CREATE TABLE explain_runs (n INT)")
+    # A SELECT with a side effect the unsafe-statement filter does not know about
+    cursor.execute("""
+        CREATE FUNCTION bump() RETURNS INT LANGUAGE sql AS
+        'INSERT INTO explain_runs VALUES (1) RETURNING n'
+    """)
+    conn.commit()
+    return cursor
+
+
+def test_explain_is_rolled_back(db_conn, slow_log):
+    cursor = _bump_counter(db_conn)
+    cursor.execute("SELECT bump()")
+    db_conn.commit()
+    assert any("Execution Time" in message for message in slow_log)
+
+    cursor.execute("SELECT count(*) FROM explain_runs")
+    assert cursor.fetchone()[0] == 1
+    db_conn.commit()
+
+
+def test_no_explain_on_autocommit_or_unsafe_statements(db_conn, slow_log):
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(1, 2)")
+    cursor.execute("SELECT pg_advisory_unlock(1, 2)")
+    db_conn.commit()
+    db_conn.autocommit = True
+    cursor.execute("SELECT count(*) FROM prices")
+    assert slow_log
+    assert not any("EXPLAIN" in message or "Execution Time" in message for message in slow_log)
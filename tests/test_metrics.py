@@ -0,0 +1,73 @@
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from prometheus_client import REGISTRY
+
+import metrics
+import notificator
+import price_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _value(name, labels=None):
+    return REGISTRY.get_sample_value(name, labels or {}) or 0.0
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from app import create_app
+
+    # No price cache listener thread: these tests do not need a database
+    monkeypatch.setattr(price_cache, "ensure_listener", lambda store, connect: None)
+    return create_app().test_client()
+
+
+def test_render_exposes_metrics():
+    before = _value("notifications_sent_total", {"result": "ok"})
+    metrics.NOTIFICATIONS_SENT_OK.inc()
+    body, content_type = metrics.render()
+    assert content_type.startswith("text/plain")
+    assert b"# TYPE collector_stage_seconds histogram" in body
+    assert _value("notifications_sent_total", {"result": "ok"}) == before + 1
+
+
+def test_metrics_endpoint_labels_requests_by_route(client):
+    client.get("/test")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("text/plain")
+    assert b'api_request_seconds_count{method="GET",route="/test",status="200"}' in response.data
+
+
+def test_metrics_are_merged_across_worker_processes(tmp_path, monkeypatch):
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+    for _ in range(2):
+        subprocess.run(
+            [sys.executable, "-c", "import metrics; metrics.NOTIFICATIONS_SENT_OK.inc(3)"],
+            cwd=ROOT, env=env, check=True,
+        )
+    monkeypatch.setenv("PROMETHEUS_MULTIPROC_DIR", str(tmp_path))
+    body, _ = metrics.render()
+    assert b'notifications_sent_total{result="ok"} 6.0' in body
+
+
+def test_notificator_counts_evaluated_events_and_matches(db_conn, add_alert, add_price, monkeypatch):
+    sent = []
+    monkeypatch.setattr(notificator, "send_email", lambda to, subject, body: sent.append(to) or True)
+    add_alert("ann", "AAPL", alert_type="price_cross", threshold=100)
+    add_alert("bob", "AAPL", alert_type="price_cross", threshold=100)
+    now = datetime.now(timezone.utc)
+    add_price("AAPL", 98.0, time=now - timedelta(minutes=3))
+    add_price("AAPL", 99.0, time=now - timedelta(minutes=2))
+    add_price("AAPL", 101.0, time=now - timedelta(minutes=1))
+
+    evaluated = _value("notifications_evaluated_total")
+    matched = _value("notifications_matched_total")
+    notificator.notify_shard(db_conn, 0, 1)
+    assert _value("notifications_evaluated_total") == evaluated + 3
+    assert _value("notifications_matched_total") == matched + 2
+    assert sorted(sent) == ["ann@example.com", "bob@example.com"]
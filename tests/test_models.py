@@ -0,0 +1,39 @@
+import contextlib
+import io
+from datetime import datetime, timedelta, timezone
+
+import config
+from models import init_tables
+
+
+def _init(conn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_tables(conn)
+
+
+def test_init_tables_is_idempotent(db_conn):
+    _init(db_conn)
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT count(*) FROM notifier_state")
+    assert cursor.fetchone()[0] == config.NOTIFIER_SHARDS
+    db_conn.commit()
+
+
+def test_price_news_backfill_uses_news_proximity(db_conn, add_price, monkeypatch):
+    monkeypatch.setattr(config, "NEWS_PROXIMITY_MINUTES", 10)
+    sampled = datetime(2024, 5, 1, 15, tzinfo=timezone.utc)
+    price_id = add_price("AAPL", 190.0, time=sampled)
+    cursor = db_conn.cursor()
+    for news_id, minutes in (("near", 8), ("far", 20)):
+        cursor.execute("INSERT INTO news_data (id, company_id, time) VALUES (%s, 'AAPL', %s)",
+                       (news_id, sampled + timedelta(minutes=minutes)))
+        cursor.execute("INSERT INTO news_tickers (news_id, company_id, time) VALUES (%s, 'AAPL', %s)",
+                       (news_id, sampled + timedelta(minutes=minutes)))
+    # Links of an install upgraded from before price_news are computed by init_tables
+    cursor.execute("DROP TABLE price_news")
+    db_conn.commit()
+
+    _init(db_conn)
+    cursor.execute("SELECT news_id FROM price_news WHERE price_id = %s", (price_id,))
+    assert cursor.fetchall() == [("near",)]
+    db_conn.commit()
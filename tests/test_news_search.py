@@ -0,0 +1,82 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+DAY = datetime(2024, 5, 1, 12, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def news(db_conn):
+    articles = [
+        ("n1", "Apple earnings beat estimates", "iPhone sales grew in every region", DAY, ["AAPL"]),
+        ("n2", "Chip stocks rally", "Apple suppliers gained after strong earnings", DAY + timedelta(days=1), ["NVDA", "AAPL"]),
+        ("n3", "Microsoft earnings in line", "Cloud revenue grew", DAY + timedelta(days=2), ["MSFT"]),
+        ("n4", "Oil slips", "Crude fell on supply news", DAY, ["XOM"]),
+    ]
+    cursor = db_conn.cursor()
+    for news_id, title, summary, time, tickers in articles:
+        cursor.execute(
+            "INSERT INTO news_data (id, company_id, news_text, summary, time, url, provider) "
+            "VALUES (%s, %s, %s, %s, %s, %s, 'test')",
+            (news_id, tickers[0], title, summary, time, f"https://example.com/{news_id}"),
+        )
+        for ticker in tickers:
+            cursor.execute(
+                "INSERT INTO news_tickers (news_id, company_id, time) VALUES (%s, %s, %s)",
+                (news_id, ticker, time),
+            )
+    db_conn.commit()
+    cursor.close()
+
+
+def _search(api, **params):
+    client, headers = api
+    response = client.get("/news/search", query_string=params, headers=headers)
+    return response.status_code, response.get_json()
+
+
+def test_title_matches_rank_first(api, news):
+    status, body = _search(api, q="earnings")
+    assert status == 200
+    ids = [result["id"] for result in body["results"]]
+    assert set(ids) == {"n1", "n2", "n3"}
+    # A title hit (weight A) outranks a summary-only hit (weight B)
+    assert ids[-1] == "n2"
+    assert body["next_cursor"] is None
+
+
+def test_filters_by_ticker_and_time(api, news):
+    _, body = _search(api, q="earnings", ticker="aapl")
+    assert {result["id"] for result in body["results"]} == {"n1", "n2"}
+    assert next(r for r in body["results"] if r["id"] == "n2")["tickers"] == ["AAPL", "NVDA"]
+
+    _, body = _search(api, q="earnings", **{"from": (DAY + timedelta(hours=1)).isoformat()})
+    assert {result["id"] for result in body["results"]} == {"n2", "n3"}
+
+    _, body = _search(api, q="earnings", to=(DAY + timedelta(days=2)).isoformat())
+    assert {result["id"] for result in body["results"]} == {"n1", "n2"}
+
+
+def test_cursor_pages_through_all_results(api, news):
+    seen = []
+    cursor = None
+    while True:
+        params = {"q": "earnings OR grew", "limit": 1}
+        if cursor:
+            params["cursor"] = cursor
+        status, body = _search(api, **params)
+        assert status == 200
+        seen += [result["id"] for result in body["results"]]
+        cursor = body["next_cursor"]
+        if not cursor:
+            break
+    assert sorted(seen) == ["n1", "n2", "n3"]
+
+
+def test_rejects_bad_parameters(api, news):
+    assert _search(api, q=" ")[0] == 400
+    assert _search(api, q="earnings", limit=0)[0] == 400
+    assert _search(api, q="earnings", limit="many")[0] == 400
+    assert _search(api, q="earnings", cursor="not-a-cursor")[0] == 400
+    client, _ = api
+    assert client.get("/news/search", query_string={"q": "earnings"}).status_code == 401
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import notificator
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    sent = []
+    monkeypatch.setattr(notificator, "send_email", lambda to, subject, body: sent.append(to) or True)
+    return sent
+
+
+def test_rescan_skips_alerts_created_after_the_price(db_conn, add_alert, add_price, outbox):
+    now = datetime.now(timezone.utc)
+    add_alert("ann", "AAPL", alert_type="price_cross", threshold=100, created_at=now - timedelta(hours=1))
+    add_price("AAPL", 98.0, time=now - timedelta(minutes=3))
+    add_price("AAPL", 101.0, time=now - timedelta(minutes=2))
+    notificator.notify_shard(db_conn, 0, 1)
+    assert outbox == ["ann@example.com"]
+
+    # Created after the crossing, which is still within the rescan window
+    add_alert("bob", "AAPL", alert_type="price_cross", threshold=100)
+    notificator.notify_shard(db_conn, 0, 1)
+    assert outbox == ["ann@example.com"]
+
+    # New samples are evaluated against every active alert
+    add_price("AAPL", 99.0, time=now - timedelta(minutes=1))
+    notificator.notify_shard(db_conn, 0, 1)
+    assert sorted(outbox) == ["ann@example.com", "ann@example.com", "bob@example.com"]
+
+
+def test_failing_shard_does_not_stop_the_others(db_conn, add_alert, add_price, outbox, monkeypatch):
+    import config
+    from db import get_db_connection
+
+    monkeypatch.setattr(config, "NOTIFIER_SHARDS", 2)
+    # user ids 1 and 2: shards 1 and 0
+    add_alert("ann", "AAPL", alert_type="price_cross", threshold=100)
+    add_alert("bob", "AAPL", alert_type="price_cross", threshold=100)
+    now = datetime.now(timezone.utc)
+    add_price("AAPL", 98.0, time=now - timedelta(minutes=2))
+    add_price("AAPL", 101.0, time=now - timedelta(minutes=1))
+
+    notify_shard = notificator.notify_shard
+
+    def failing_shard_zero(conn, shard, shards):
+        if shard == 0:
+            # Leaves the transaction aborted, like a failed statement inside notify_shard
+            conn.cursor().execute("SELECT 1 / 0")
+        return notify_shard(conn, shard, shards)
+
+    connections = []
+
+    def tracked_connection():
+        connections.append(get_db_connection())
+        return connections[-1]
+
+    monkeypatch.setattr(notificator, "notify_shard", failing_shard_zero)
+    monkeypatch.setattr(notificator, "get_db_connection", tracked_connection)
+    notificator.check_and_notify()
+
+    assert outbox == ["ann@example.com"]
+    assert all(conn.closed for conn in connections)
+    # Both shard locks were released
+    cursor = db_conn.cursor()
+    cursor.execute("SELECT pg_try_advisory_lock(%s, 0) AND pg_try_advisory_lock(%s, 1)",
+                   (notificator.SHARD_LOCK_NAMESPACE, notificator.SHARD_LOCK_NAMESPACE))
+    assert cursor.fetchone()[0]
+    cursor.execute("SELECT pg_advisory_unlock_all()")
+    db_conn.commit()
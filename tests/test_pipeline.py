@@ -0,0 +1,56 @@
+import logging
+
+import pytest
+
+import config
+import pipeline
+from db import get_db_connection
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+
+    def tracked_connection():
+        opened.append(get_db_connection())
+        return opened[-1]
+
+    monkeypatch.setattr(pipeline, "get_db_connection", tracked_connection)
+    return opened
+
+
+def _drop(conn, table):
+    cursor = conn.cursor()
+    cursor.execute(f"DROP TABLE {table} CASCADE")
+    conn.commit()
+    cursor.close()
+
+
+def test_failed_prune_is_logged_and_closes_its_connection(db_conn, connections, monkeypatch, caplog):
+    monkeypatch.setattr(config, "PRICE_RETENTION_DAYS", 30)
+    monkeypatch.setattr(config, "ARCHIVE_BEFORE_PRUNE", False)
+    monkeypatch.setattr(pipeline.prune_old_prices, "_last_run", None, raising=False)
+    _drop(db_conn, "prices_prune_state")
+
+    with caplog.at_level(logging.ERROR, logger="pipeline"):
+        pipeline.prune_old_prices()
+    record, = [r for r in caplog.records if r.name == "pipeline"]
+    assert record.getMessage() == "❌ Pruning failed"
+    assert record.exc_info is not None
+    assert len(connections) == 1 and connections[0].closed
+
+    # At most once a day
+    pipeline.prune_old_prices()
+    assert len(connections) == 1
+
+
+def test_failed_poll_refresh_is_logged_and_closes_its_connection(db_conn, connections, monkeypatch, caplog):
+    monkeypatch.setattr(pipeline.refresh_poll_intervals, "_last_run", None, raising=False)
+    _drop(db_conn, "alerts")
+
+    with caplog.at_level(logging.ERROR, logger="pipeline"):
+        pipeline.refresh_poll_intervals()
+    assert [r.getMessage() for r in caplog.records if r.name == "pipeline"] == [
+        "❌ Refreshing poll intervals failed"
+    ]
+    assert len(connections) == 1 and connections[0].closed
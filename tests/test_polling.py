@@ -0,0 +1,60 @@
+import pytest
+
+import config
+import polling
+
+
+@pytest.fixture(autouse=True)
+def poll_settings(monkeypatch):
+    monkeypatch.setattr(config, "POLL_MIN_SECONDS", 60)
+    monkeypatch.setattr(config, "POLL_MAX_SECONDS", 3600)
+    monkeypatch.setattr(config, "POLL_VOLATILITY_REF_PERCENT", 0.5)
+    monkeypatch.setattr(config, "POLL_REQUESTS_PER_HOUR", 0)
+    monkeypatch.setattr(config, "COLLECT_INTERVAL_SECONDS", 1800)
+
+
+STATS = {
+    "QUIET": (0.0, 0.0, 1),
+    "BUSY": (2.0, 1.0, 4),
+    "WILD": (20.0, 5.0, 100),
+    "NEW": None,
+}
+
+
+def test_intervals_are_clamped():
+    intervals = polling.assign_intervals(STATS)
+    assert intervals["QUIET"] == 3600
+    assert intervals["WILD"] == 60
+    assert 60 < intervals["BUSY"] < 3600
+    assert intervals["NEW"] == 1800
+
+
+def test_more_activity_polls_more_often():
+    intervals = polling.assign_intervals({"A": (0.5, 0.0, 1), "B": (1.0, 0.0, 1), "C": (1.0, 1.0, 1)})
+    assert intervals["A"] > intervals["B"] > intervals["C"]
+
+
+def test_budget_stretches_intervals():
+    unbounded = polling.assign_intervals(STATS)
+    assert polling._polls_per_hour(unbounded) > 40
+
+    stretched = polling.assign_intervals(STATS, budget_per_hour=40)
+    assert polling._polls_per_hour(stretched) <= 40
+    assert polling._polls_per_hour(stretched) > 39
+    # One common factor: no ticker gets faster, and the order is kept
+    assert all(stretched[t] >= unbounded[t] for t in STATS)
+    assert stretched["WILD"] <= stretched["BUSY"] <= stretched["NEW"] <= stretched["QUIET"]
+
+
+def test_budget_that_already_fits_changes_nothing():
+    assert polling.assign_intervals(STATS, budget_per_hour=10_000) == polling.assign_intervals(STATS)
+
+
+def test_budget_below_minimum_polls_all_at_max():
+    intervals = polling.assign_intervals(STATS, budget_per_hour=2)
+    assert intervals == {ticker: 3600 for ticker in STATS}
+
+
+def test_budget_defaults_to_config(monkeypatch):
+    monkeypatch.setattr(config, "POLL_REQUESTS_PER_HOUR", 2)
+    assert set(polling.assign_intervals(STATS).values()) == {3600}
@@ -0,0 +1,81 @@
+from datetime import datetime, timezone
+
+from price_cache import PriceHistory, PriceStore
+
+
+def _fill(history, count, start=1000):
+    for i in range(count):
+        history.append(start + i, 100.0 + i, 10 * i, 0.5, "up", i % 2 == 0, False)
+
+
+def test_latest_and_recent_prices():
+    history = PriceHistory(4)
+    assert history.latest() is None
+    _fill(history, 3)
+
+    latest = history.latest()
+    assert latest.price == 102.0
+    assert latest.time == datetime.fromtimestamp(1002, timezone.utc)
+    assert latest.trend == "up"
+    assert latest.is_trend_change
+    assert history.recent_prices(10) == [102.0, 101.0, 100.0]
+
+
+def test_ring_overwrites_oldest():
+    history = PriceHistory(4)
+    _fill(history, 10)
+    assert history.count == 4
+    assert history.recent_prices(10) == [109.0, 108.0, 107.0, 106.0]
+    assert history.sample(3).price == 106.0
+    assert history.sample(4) is None
+
+
+def test_older_samples_are_ignored():
+    history = PriceHistory(4)
+    _fill(history, 2)
+    assert not history.append(1001, 50.0, 1, None, "down", False, False)
+    assert not history.append(1000, 50.0, 1, None, "down", False, False)
+    assert history.latest().price == 101.0
+    assert history.count == 2
+
+
+def test_missing_values_round_trip():
+    history = PriceHistory(2)
+    history.append(1000, 100.0, None, None, None, False, True)
+    sample = history.latest()
+    assert sample.volume is None
+    assert sample.change_percent is None
+    assert sample.trend is None
+    assert sample.news_related
+
+
+def test_mean_volume_skips_missing():
+    history = PriceHistory(8)
+    for i, volume in enumerate([100, None, 300, 500]):
+        history.append(1000 + i, 1.0, volume, None, "flat", False, False)
+    assert history.mean_volume(3) == 400
+    assert history.mean_volume(3, skip=1) == 200
+    assert history.mean_volume(5, skip=10) is None
+
+
+def test_mark_news_related():
+    history = PriceHistory(4)
+    _fill(history, 3)
+    assert history.mark_news_related(1001)
+    assert history.sample(1).news_related
+    assert not history.sample(0).news_related
+    assert not history.mark_news_related(1001.5)
+    assert not history.mark_news_related(5000)
+
+
+def test_store_applies_events():
+    store = PriceStore(4)
+    store.apply_event({
+        "company_id": "AAPL", "time": "2024-05-01T10:00:00+00:00", "price": 190.5, "volume": 1200,
+        "change_percent": 0.4, "trend": "up", "is_trend_change": True, "news_related": False,
+    })
+    store.apply_event({"op": "news_related", "company_id": "AAPL", "time": "2024-05-01T10:00:00+00:00"})
+    latest = store.latest("AAPL")
+    assert latest.price == 190.5
+    assert latest.news_related
+    assert store.latest("MSFT") is None
@@ -0,0 +1,163 @@
+import threading
+import time
+
+import pytest
+
+import config
+from providers import LatencyWindow, Provider, ProviderChain, ProviderError, UnknownSymbol
+
+
+class FakeProvider(Provider):
+    """
+    Answers quotes after `delay` seconds with {"source": name}, or raises `error`.
+    """
+
+    def __init__(self, name, delay=0.0, error=None):
+        super().__init__()
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self._release = threading.Event()
+
+    def quote(self, ticker):
+        self.calls += 1
+        self._release.wait(self.delay)
+        if self.error is not None:
+            raise self.error
+        return {"source": self.name, "ticker": ticker}
+
+    news = quote
+
+    def release(self):
+        self._release.set()
+
+
+@pytest.fixture
+def hedge_settings(monkeypatch):
+    monkeypatch.setattr(config, "PROVIDER_HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(config, "PROVIDER_HEDGE_DEFAULT_SECONDS", 0.05)
+
+
+@pytest.fixture
+def chains():
+    created = []
+
+    def make(providers, **kwargs):
+        chain = ProviderChain(providers, **kwargs)
+        created.append((chain, providers))
+        return chain
+
+    yield make
+    for chain, providers in created:
+        for provider in providers:
+            provider.release()
+        chain._pool.shutdown(wait=True)
+
+
+def test_primary_answers(chains):
+    primary, backup = FakeProvider("primary"), FakeProvider("backup")
+    chain = chains([primary, backup], hedging=False, timeout=1)
+    assert chain.quote("AAPL") == {"source": "primary", "ticker": "AAPL"}
+    assert backup.calls == 0
+    assert len(primary.latency["quote"]) == 1
+
+
+def test_falls_back_on_error(chains):
+    primary = FakeProvider("primary", error=ProviderError("HTTP 500"))
+    backup = FakeProvider("backup")
+    chain = chains([primary, backup], hedging=False, timeout=1)
+    assert chain.quote("AAPL")["source"] == "backup"
+    assert primary.calls == 1
+
+
+def test_hedges_slow_primary(chains, hedge_settings):
+    primary, backup = FakeProvider("primary", delay=5), FakeProvider("backup")
+    chain = chains([primary, backup], hedging=True, timeout=2)
+    start = time.monotonic()
+    assert chain.quote("AAPL")["source"] == "backup"
+    assert time.monotonic() - start < 1
+
+
+def test_hedge_waits_for_rolling_p95(chains, hedge_settings):
+    primary, backup = FakeProvider("primary", delay=0.2), FakeProvider("backup")
+    for _ in range(10):
+        primary.latency["quote"].add(0.5)
+    chain = chains([primary, backup], hedging=True, timeout=2)
+    # 0.2s is within the primary's usual 0.5s, so no hedge is sent
+    assert chain.quote("AAPL")["source"] == "primary"
+    assert backup.calls == 0
+
+
+def test_no_hedge_when_disabled(chains, hedge_settings):
+    primary, backup = FakeProvider("primary", delay=0.2), FakeProvider("backup")
+    chain = chains([primary, backup], hedging=False, timeout=2)
+    assert chain.quote("AAPL")["source"] == "primary"
+    assert backup.calls == 0
+
+
+def test_timeout_raises_provider_error(chains):
+    primary = FakeProvider("primary", delay=5)
+    chain = chains([primary], hedging=False, timeout=0.1)
+    start = time.monotonic()
+    with pytest.raises(ProviderError) as excinfo:
+        chain.quote("AAPL")
+    assert time.monotonic() - start < 1
+    assert not isinstance(excinfo.value, UnknownSymbol)
+    assert "no answer within" in str(excinfo.value)
+
+
+def test_all_unknown_raises_unknown_symbol(chains):
+    providers = [FakeProvider(name, error=UnknownSymbol("not found")) for name in ("primary", "backup")]
+    chain = chains(providers, hedging=False, timeout=1)
+    with pytest.raises(UnknownSymbol):
+        chain.quote("NOPE")
+    assert all(provider.calls == 1 for provider in providers)
+
+
+def test_mixed_failures_are_not_unknown_symbol(chains):
+    providers = [
+        FakeProvider("primary", error=UnknownSymbol("not found")),
+        FakeProvider("backup", error=ProviderError("HTTP 503")),
+    ]
+    chain = chains(providers, hedging=False, timeout=1)
+    with pytest.raises(ProviderError) as excinfo:
+        chain.quote("AAPL")
+    assert not isinstance(excinfo.value, UnknownSymbol)
+
+
+def test_latency_window_percentiles(hedge_settings):
+    window = LatencyWindow(size=100)
+    assert window.percentile(0.95) is None
+    assert window.hedge_after() == 0.05
+    for ms in range(1, 201):
+        window.add(ms / 1000)
+    # Only the last 100 samples are kept
+    assert min(window.samples) == 0.101
+    assert window.hedge_after() == pytest.approx(0.196)
+
+
+def test_latency_window_is_read_while_pool_threads_add(hedge_settings):
+    window = LatencyWindow(size=50)
+    window.add(0.01)
+    stop = threading.Event()
+
+    def add():
+        i = 0
+        while not stop.is_set():
+            window.add(i % 100 / 1000)
+            i += 1
+
+    writers = [threading.Thread(target=add) for _ in range(4)]
+    for writer in writers:
+        writer.start()
+    try:
+        deadline = time.monotonic() + 0.3
+        while time.monotonic() < deadline:
+            assert 0 <= window.percentile(0.95) < 0.1
+            assert window.hedge_after() < 0.1
+    finally:
+        stop.set()
+        for writer in writers:
+            writer.join()
+    assert len(window) == 50
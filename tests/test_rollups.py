@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+
+import pytest
+import pytz
+
+import rollups
+
+UTC = pytz.UTC
+
+
+def _insert_prices(conn, rows):
+    cursor = conn.cursor()
+    for company_id, time, price in rows:
+        cursor.execute(
+            "INSERT INTO prices (company_id, time, price, volume, is_trend_change, news_related) "
+            "VALUES (%s, %s, %s, 100, FALSE, FALSE)",
+            (company_id, time, price),
+        )
+    conn.commit()
+    cursor.close()
+
+
+def _daily(conn, company_id):
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT open, high, low, close, samples FROM prices_daily WHERE company_id = %s ORDER BY bucket",
+        (company_id,),
+    )
+    rows = cursor.fetchall()
+    conn.commit()
+    cursor.close()
+    return rows
+
+
+def test_rebuild_from_first_day_of_history(db_conn):
+    first = UTC.localize(datetime(2024, 3, 5, 14, 30))
+    _insert_prices(db_conn, [
+        ("AAPL", first, 170.0),
+        ("AAPL", first + timedelta(hours=1), 172.5),
+        ("AAPL", first + timedelta(hours=2), 169.0),
+    ])
+
+    # Never pruned: a range starting before the first sample of that day is fine
+    rollups.rebuild(db_conn, UTC.localize(datetime(2024, 3, 5)), UTC.localize(datetime(2024, 3, 6)))
+    assert _daily(db_conn, "AAPL") == [(170.0, 172.5, 169.0, 169.0, 3)]
+
+
+def test_rebuild_refuses_pruned_range(db_conn):
+    _insert_prices(db_conn, [("AAPL", UTC.localize(datetime(2024, 3, 5, 14, 30)), 170.0)])
+    cursor = db_conn.cursor()
+    # prune() horizons are US/Eastern midnights
+    cursor.execute("INSERT INTO prices_prune_state (pruned_before) VALUES (%s)",
+                   (UTC.localize(datetime(2024, 3, 6, 5)),))
+    db_conn.commit()
+    cursor.close()
+
+    with pytest.raises(ValueError, match="pruned"):
+        rollups.rebuild(db_conn, UTC.localize(datetime(2024, 3, 5, 12)), UTC.localize(datetime(2024, 3, 6)))
+    rollups.rebuild(db_conn, UTC.localize(datetime(2024, 3, 6, 12)), UTC.localize(datetime(2024, 3, 7)))
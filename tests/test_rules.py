@@ -0,0 +1,87 @@
+import random
+
+from rules import ALERT_TYPES, PriceEvent, Rule, RuleIndex
+
+
+def _random_rules(rng, tickers, count):
+    rules = []
+    for alert_id in range(count):
+        alert_type = rng.choice(ALERT_TYPES)
+        if alert_type == "trend_change":
+            threshold = None
+        elif alert_type == "volume_spike":
+            threshold = rng.choice([1.5, 2, 3, 5])
+        elif alert_type == "price_cross":
+            threshold = rng.choice([90, 95, 100, 105, 110])
+        else:
+            threshold = rng.choice([0.5, 1, 2, 5])
+        rules.append(Rule(
+            alert_id, alert_id % 50, f"user{alert_id % 50}@example.com", rng.choice(tickers),
+            alert_type=alert_type, direction=rng.choice(["all", "up", "down"]),
+            threshold=threshold, news_only=rng.random() < 0.3,
+        ))
+    return rules
+
+
+def _random_event(rng, price_id, tickers):
+    prev_price = rng.choice([None, round(rng.uniform(85, 115), 2)])
+    price = round(rng.uniform(85, 115), 2)
+    change = (price - prev_price) / prev_price * 100 if prev_price else None
+    return PriceEvent(
+        price_id, rng.choice(tickers), None, price,
+        trend=rng.choice(["up", "down", "flat"]), change_percent=change,
+        volume=rng.choice([None, rng.randint(0, 10_000)]),
+        is_trend_change=rng.random() < 0.3, news_related=rng.random() < 0.3,
+        prev_price=prev_price, prev_change_percent=rng.choice([None, rng.uniform(-6, 6)]),
+        avg_volume=rng.choice([None, 0, rng.randint(500, 3000)]),
+    )
+
+
+def test_index_matches_full_scan():
+    rng = random.Random(42)
+    tickers = ["AAPL", "MSFT", "TSLA", "NVDA"]
+    rules = _random_rules(rng, tickers, 2000)
+    index = RuleIndex(rules)
+    assert index.size == len(rules)
+
+    fired = 0
+    for price_id in range(3000):
+        event = _random_event(rng, price_id, tickers)
+        expected = sorted(rule.alert_id for rule in rules if rule.matches(event))
+        assert sorted(rule.alert_id for rule in index.match(event)) == expected
+        fired += bool(expected)
+    assert fired > 0
+
+
+def test_index_thresholds_are_half_open():
+    index = RuleIndex([
+        Rule(1, 1, "a@example.com", "AAPL", "price_cross", threshold=100),
+        Rule(2, 1, "a@example.com", "AAPL", "change_threshold", threshold=2),
+    ])
+    crossed = PriceEvent(1, "AAPL", None, 100.0, "up", 2.0, None, False, False,
+                         prev_price=98.0, prev_change_percent=1.0)
+    assert sorted(rule.alert_id for rule in index.match(crossed)) == [1, 2]
+
+    # Starting exactly at the level is not a new crossing
+    stayed = PriceEvent(2, "AAPL", None, 101.0, "up", 1.0, None, False, False,
+                        prev_price=100.0, prev_change_percent=2.0)
+    assert index.match(stayed) == []
+
+
+def test_index_respects_direction_and_news_only():
+    index = RuleIndex([
+        Rule(1, 1, "a@example.com", "AAPL", direction="up"),
+        Rule(2, 1, "a@example.com", "AAPL", direction="down"),
+        Rule(3, 1, "a@example.com", "AAPL", news_only=True),
+    ])
+    event = PriceEvent(1, "AAPL", None, 101.0, "up", 1.0, None, True, False)
+    assert [rule.alert_id for rule in index.match(event)] == [1]
+
+    event.news_related = True
+    assert sorted(rule.alert_id for rule in index.match(event)) == [1, 3]
+
+
+def test_index_ignores_other_tickers():
+    index = RuleIndex([Rule(1, 1, "a@example.com", "AAPL")])
+    event = PriceEvent(1, "MSFT", None, 101.0, "up", 1.0, None, True, False)
+    assert index.match(event) == []
@@ -0,0 +1,52 @@
+import config
+from simhash import BITS, distance, simhash, to_signed
+
+# Title and summary, as the collector fingerprints them
+ARTICLE = (
+    "Apple shares rise after record iPhone sales "
+    "Apple shares rose 3% on Tuesday after the company reported record iPhone sales in the "
+    "holiday quarter and raised its quarterly dividend, beating analyst expectations for revenue "
+    "and earnings. Services revenue also hit a new high, driven by App Store and subscription growth, "
+    "while the company guided for steady margins in the current quarter despite supply constraints."
+)
+
+
+def test_identical_text_has_distance_zero():
+    assert distance(simhash(ARTICLE), simhash(ARTICLE)) == 0
+
+
+def test_case_and_punctuation_are_ignored():
+    assert simhash(ARTICLE) == simhash(ARTICLE.upper().replace(",", " ;"))
+
+
+def test_near_duplicates_are_close():
+    for syndicated in (
+        "UPDATE 1-" + ARTICLE,
+        ARTICLE + " (Reuters)",
+        ARTICLE.replace("on Tuesday", "on Tuesday morning"),
+    ):
+        assert distance(simhash(ARTICLE), simhash(syndicated)) <= config.NEAR_DUPLICATE_MAX_DISTANCE
+
+
+def test_unrelated_texts_are_far():
+    other = (
+        "Oil prices slipped as OPEC members signalled higher output, while "
+        "natural gas futures climbed on colder weather forecasts in Europe"
+    )
+    assert distance(simhash(ARTICLE), simhash(other)) > 12
+
+
+def test_empty_text_has_no_fingerprint():
+    assert simhash("") is None
+    assert simhash(None) is None
+    assert simhash("  ...  ") is None
+
+
+def test_to_signed_fits_bigint():
+    assert to_signed(None) is None
+    assert to_signed(5) == 5
+    assert to_signed((1 << BITS) - 1) == -1
+    for fingerprint in (simhash(ARTICLE), 1 << (BITS - 1)):
+        signed = to_signed(fingerprint)
+        assert -(1 << 63) <= signed < 1 << 63
+        assert signed % (1 << BITS) == fingerprint
@@ -0,0 +1,172 @@
+"""
+Registry of ticker symbols (`tickers` table) the collector may spend Yahoo requests on.
+
+    pending    seen in a campaign, not checked against the quote source yet
+    valid      the quote source returned a price; exchange / currency cached
+    invalid    unknown to the quote source; rechecked after TICKER_INVALID_TTL_SECONDS
+    suspended  failed TICKER_MAX_FAILURES collections in a row; retried after
+               TICKER_SUSPEND_SECONDS (a success makes it valid again)
+
+The API only reads the registry: it rejects symbols cached as invalid and adds
+new ones as pending. Validation against the quote providers (providers.py) runs in
+the collector, before a ticker's first collection, so API workers never load yfinance.
+
+    python ticker_registry.py validate AAPL MSFT
+"""
+import logging
+
+import config
+import metrics
+
+logger = logging.getLogger("ticker_registry")
+
+STATUSES = ("pending", "valid", "invalid", "suspended")
+
+
+def lookup_quote(symbol):
+    """
+    Quote metadata for a symbol from the quote providers (providers.py), or None if
+    every source says it is unknown or has no price. Raises on service / network
+    errors, which say nothing about the symbol.
+    """
+    import providers
+
+    try:
+        quote = providers.get_chain().quote(symbol)
+    except providers.UnknownSymbol:
+        return None
+    return {field: quote.get(field) for field in providers.QUOTE_METADATA}
+
+
+def admit(cursor, symbols):
+    """
+    Registers unknown symbols as pending and returns {symbol: message} for those
+    that must be rejected (cached as invalid and not due for a recheck).
+    """
+    cursor.execute("""
+        WITH input AS (
+            SELECT DISTINCT unnest(%s::text[]) AS symbol
+        ),
+        registered AS (
+            INSERT INTO tickers (symbol)
+            SELECT symbol FROM input
+            ON CONFLICT (symbol) DO NOTHING
+        )
+        SELECT t.symbol, t.last_error
+        FROM tickers t
+        JOIN input i ON i.symbol = t.symbol
+        WHERE t.status = 'invalid' AND t.retry_after > NOW()
+    """, (list(symbols),))
+    return {
+        symbol: f"Unknown ticker {symbol}" + (f" ({error})" if error else "")
+        for symbol, error in cursor.fetchall()
+    }
+
+
+def validate(conn, symbols):
+    """
+    Checks symbols against the quote providers and stores the outcome. Returns the set of valid
+    symbols. A lookup error counts as a failure (see record_fetches), not as invalid.
+    """
+    valid = set()
+    failed = []
+    cursor = conn.cursor()
+    for symbol in symbols:
+        try:
+            quote = lookup_quote(symbol)
+        except Exception as e:
+            logger.warning("Could not validate %s: %s", symbol, e)
+            metrics.TICKER_VALIDATIONS_TOTAL.labels("error").inc()
+            failed.append(symbol)
+            continue
+
+        if quote is None:
+            logger.warning("%s is unknown to the quote source, skipped for %ds", symbol, config.TICKER_INVALID_TTL_SECONDS)
+            metrics.TICKER_VALIDATIONS_TOTAL.labels("invalid").inc()
+            cursor.execute("""
+                INSERT INTO tickers (symbol, status, validated_at, retry_after, last_error, updated_at)
+                VALUES (%(symbol)s, 'invalid', NOW(), NOW() + make_interval(secs => %(ttl)s), 'no quote data', NOW())
+                ON CONFLICT (symbol) DO UPDATE SET
+                    status = 'invalid', validated_at = NOW(), retry_after = EXCLUDED.retry_after,
+                    last_error = EXCLUDED.last_error, updated_at = NOW()
+            """, {"symbol": symbol, "ttl": config.TICKER_INVALID_TTL_SECONDS})
+        else:
+            metrics.TICKER_VALIDATIONS_TOTAL.labels("valid").inc()
+            cursor.execute("""
+                INSERT INTO tickers (symbol, status, name, exchange, currency, quote_type, validated_at, updated_at)
+                VALUES (%(symbol)s, 'valid', %(name)s, %(exchange)s, %(currency)s, %(quote_type)s, NOW(), NOW())
+                ON CONFLICT (symbol) DO UPDATE SET
+                    status = 'valid', name = EXCLUDED.name, exchange = EXCLUDED.exchange,
+                    currency = EXCLUDED.currency, quote_type = EXCLUDED.quote_type,
+                    validated_at = NOW(), retry_after = NULL, failure_count = 0, last_error = NULL,
+                    updated_at = NOW()
+            """, dict(quote, symbol=symbol))
+            valid.add(symbol)
+    conn.commit()
+    cursor.close()
+
+    if failed:
+        record_fetches(conn, [], {symbol: "validation failed" for symbol in failed})
+    return valid
+
+
+def record_fetches(conn, succeeded, failed):
+    """
+    Stores the outcome of a collection run: succeeded symbols are reset to valid,
+    failed ones ({symbol: error}) count a failure and are suspended after
+    TICKER_MAX_FAILURES in a row. Returns the newly suspended symbols.
+    """
+    cursor = conn.cursor()
+    if succeeded:
+        cursor.execute("""
+            UPDATE tickers
+            SET status = 'valid', failure_count = 0, retry_after = NULL, last_error = NULL,
+                last_success_at = NOW(), updated_at = NOW()
+            WHERE symbol = ANY(%s)
+        """, (list(succeeded),))
+
+    suspended = []
+    if failed:
+        cursor.execute("""
+            INSERT INTO tickers AS t (symbol, failure_count, last_error, last_failure_at)
+            SELECT symbol, 1, error, NOW()
+            FROM unnest(%(symbols)s::text[], %(errors)s::text[]) AS f(symbol, error)
+            ON CONFLICT (symbol) DO UPDATE SET
+                failure_count = t.failure_count + 1,
+                last_error = EXCLUDED.last_error,
+                last_failure_at = NOW(),
+                status = CASE WHEN t.failure_count + 1 >= %(max_failures)s THEN 'suspended' ELSE t.status END,
+                retry_after = CASE WHEN t.failure_count + 1 >= %(max_failures)s
+                                   THEN NOW() + make_interval(secs => %(suspend)s) ELSE t.retry_after END,
+                updated_at = NOW()
+            RETURNING symbol, status, failure_count
+        """, {
+            "symbols": list(failed),
+            "errors": list(failed.values()),
+            "max_failures": config.TICKER_MAX_FAILURES,
+            "suspend": config.TICKER_SUSPEND_SECONDS,
+        })
+        suspended = [symbol for symbol, status, failures in cursor.fetchall()
+                     if status == "suspended" and failures >= config.TICKER_MAX_FAILURES]
+        for symbol in suspended:
+            logger.warning("%s suspended after %d+ failed runs: %s", symbol, config.TICKER_MAX_FAILURES, failed[symbol])
+    conn.commit()
+    cursor.close()
+    return suspended
+
+
+if __name__ == "__main__":
+    import sys
+
+    from db import get_db_connection
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] %(levelname)s - %(message)s')
+    if len(sys.argv) < 3 or sys.argv[1] != "validate":
+        print("Usage: python ticker_registry.py validate SYMBOL [SYMBOL ...]")
+        sys.exit(1)
+    conn = get_db_connection()
+    symbols = [symbol.upper() for symbol in sys.argv[2:]]
+    valid = validate(conn, symbols)
+    for symbol in symbols:
+        print(f"{symbol}: {'valid' if symbol in valid else 'not valid'}")
+    conn.close()